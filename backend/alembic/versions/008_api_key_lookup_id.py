@@ -0,0 +1,27 @@
+"""add indexed api key lookup id
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # New keys are issued as wvr_<lookup_id>_<secret>; existing rows keep NULL
+    # and are verified through the legacy scan until they are rotated.
+    op.add_column('api_keys', sa.Column('lookup_id', sa.String(32), nullable=True))
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_lookup_id
+        ON api_keys (lookup_id)
+    """)
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_api_keys_lookup_id")
+    op.drop_column('api_keys', 'lookup_id')
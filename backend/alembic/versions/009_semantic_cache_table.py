@@ -0,0 +1,61 @@
+"""move semantic cache out of bot_queries
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from pgvector.sqlalchemy import Vector
+
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'semantic_cache',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True, server_default=sa.text('uuid_generate_v4()')),
+        sa.Column('tenant_id', UUID(as_uuid=True), sa.ForeignKey('tenants.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('query', sa.Text(), nullable=False),
+        sa.Column('answer', sa.Text(), nullable=False),
+        sa.Column('answer_hash', sa.String(32), nullable=False),
+        sa.Column('sources', JSONB(), server_default='[]'),
+        sa.Column('embedding', Vector(1536), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.func.now()),
+        sa.Column('last_used_at', sa.TIMESTAMP(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('tenant_id', 'answer_hash', name='uq_semantic_cache_tenant_answer'),
+    )
+    # Lookups are an exact scan of one tenant's (capped) rows; eviction walks
+    # the same index in last-used order
+    op.create_index('idx_semantic_cache_tenant_last_used', 'semantic_cache', ['tenant_id', 'last_used_at'])
+
+    # Seed with the newest high-confidence question per distinct answer
+    op.execute("""
+        INSERT INTO semantic_cache (tenant_id, query, answer, answer_hash, sources, embedding, created_at, last_used_at)
+        SELECT DISTINCT ON (tenant_id, md5(answer))
+            tenant_id, query, answer, md5(answer), sources, query_embedding, created_at, created_at
+        FROM bot_queries
+        WHERE confidence = 'high'
+          AND query_embedding IS NOT NULL
+          AND created_at > now() - interval '7 days'
+        ORDER BY tenant_id, md5(answer), created_at DESC
+    """)
+
+    # The query log no longer serves lookups or stores new embeddings
+    op.execute("DROP INDEX IF EXISTS idx_bot_queries_semantic_cache")
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bot_queries_semantic_cache
+        ON bot_queries
+        USING hnsw (query_embedding vector_cosine_ops)
+        WITH (m = 16, ef_construction = 64)
+        WHERE confidence = 'high'
+    """)
+    op.drop_index('idx_semantic_cache_tenant_last_used', table_name='semantic_cache')
+    op.drop_table('semantic_cache')
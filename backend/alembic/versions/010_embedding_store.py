@@ -0,0 +1,32 @@
+"""add content-addressed embedding store
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Keyed by sha256 of the exact chunk text plus model and dimensions, so
+    # re-ingesting the same content never pays for the provider again.
+    # The vector column is unsized: different models/dimensions share the table.
+    op.create_table(
+        'embedding_store',
+        sa.Column('content_hash', sa.String(64), nullable=False),
+        sa.Column('model', sa.String(100), nullable=False),
+        sa.Column('dimensions', sa.Integer(), nullable=False),
+        sa.Column('embedding', Vector(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('content_hash', 'model', 'dimensions'),
+    )
+
+def downgrade() -> None:
+    op.drop_table('embedding_store')
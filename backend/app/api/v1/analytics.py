@@ -4,7 +4,7 @@ from uuid import UUID
 from datetime import datetime, timedelta
 
 from app.auth.oauth import get_current_user, User
-from app.db.repositories import AnalyticsRepository
+from app.services.container import ServiceContainer, get_services
 
 router = APIRouter()
 
@@ -15,11 +15,12 @@ async def get_query_analytics(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     if user.tenant_id != tenant_id:
         raise HTTPException(status_code=403, detail="Tenant ID mismatch")
     
-    analytics_repo = AnalyticsRepository()
+    analytics_repo = services.analytics_repo
     
     if start_date:
         start = datetime.fromisoformat(start_date)
@@ -41,11 +42,12 @@ async def get_top_queries(
     tenant_id: UUID,
     limit: int = 10,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     if user.tenant_id != tenant_id:
         raise HTTPException(status_code=403, detail="Tenant ID mismatch")
     
-    analytics_repo = AnalyticsRepository()
+    analytics_repo = services.analytics_repo
     top_queries = await analytics_repo.get_top_queries(tenant_id, limit)
     
     return {"queries": top_queries}
@@ -56,11 +58,12 @@ async def get_unanswered_queries(
     tenant_id: UUID,
     limit: int = 20,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     if user.tenant_id != tenant_id:
         raise HTTPException(status_code=403, detail="Tenant ID mismatch")
     
-    analytics_repo = AnalyticsRepository()
+    analytics_repo = services.analytics_repo
     unanswered = await analytics_repo.get_unanswered_queries(tenant_id, limit)
     
     return {"queries": unanswered}
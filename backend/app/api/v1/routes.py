@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query, Response
 from fastapi.responses import StreamingResponse
 from typing import Optional
 from uuid import UUID
 
 from app.api.v1.schemas import (
     QueryRequest,
+    BatchQueryRequest,
     QueryResponse,
     APIKeyCreate,
     APIKeyResponse,
@@ -21,17 +24,15 @@ from app.api.v1.schemas import (
 )
 from app.auth.api_key import verify_api_key
 from app.auth.types import APIKeyData
-from app.auth.oauth import get_current_user, verify_supabase_token, require_admin_or_owner, User
-from app.services.query import QueryService
-from app.services.ingestion import IngestionService
-from app.db.repositories import (
-    APIKeyRepository,
-    DocumentRepository,
-    BotRepository,
-    TenantRepository,
-    ProfileRepository,
+from app.auth.oauth import (
+    get_current_user,
+    verify_supabase_token,
+    require_admin_or_owner,
+    User,
 )
-from app.middleware.rate_limit import check_rate_limit
+from app.services.bot_config_cache import bot_config_cache
+from app.services.container import ServiceContainer, get_services
+from app.middleware.rate_limit import enforce_rate_limits, max_request_cost
 from app.services.cache import cache_service
 from app.services.rate_limit import daily_limit_service
 from app.config import settings
@@ -44,13 +45,26 @@ router.include_router(analytics.router, tags=["analytics"])
 
 from sqlalchemy.exc import IntegrityError
 
+
+def _check_query_access(tenant_id: UUID, api_key_data: APIKeyData) -> None:
+    """Allow access to demo bot OR user's own tenant"""
+    demo_bot_id = UUID(settings.DEMO_BOT_TENANT_ID) if settings.DEMO_BOT_ENABLED else None
+    
+    if tenant_id != api_key_data.tenant_id:
+        # Check if querying demo bot
+        if not (demo_bot_id and tenant_id == demo_bot_id):
+            raise HTTPException(status_code=403, detail="Access denied. You can only query your own bot or the demo bot.")
+
 @router.post("/auth/complete-signup", response_model=SignupResponse)
-async def complete_signup(auth_data: dict = Depends(verify_supabase_token)):
+async def complete_signup(
+    auth_data: dict = Depends(verify_supabase_token),
+    services: ServiceContainer = Depends(get_services),
+):
     """
     Complete signup after OAuth - creates tenant, user profile, and bot if first time
     Called by frontend after successful Supabase OAuth
     """
-    profile_repo = ProfileRepository()
+    profile_repo = services.profile_repo
     
     user_id = auth_data["id"]
     email = auth_data["email"]
@@ -97,63 +111,94 @@ async def get_current_user_info(user: User = Depends(get_current_user)):
 async def query_bot(
     tenant_id: UUID,
     request: QueryRequest,
+    response: Response,
     api_key_data: APIKeyData = Depends(verify_api_key),
+    services: ServiceContainer = Depends(get_services),
 ):
-    # Allow access to demo bot OR user's own tenant
-    demo_bot_id = UUID(settings.DEMO_BOT_TENANT_ID) if settings.DEMO_BOT_ENABLED else None
-    
-    if tenant_id != api_key_data.tenant_id:
-        # Check if querying demo bot
-        if not (demo_bot_id and tenant_id == demo_bot_id):
-            raise HTTPException(status_code=403, detail="Access denied. You can only query your own bot or the demo bot.")
-    
-    # Check rate limit (per minute)
-    await check_rate_limit(api_key_data)
+    _check_query_access(tenant_id, api_key_data)
     
-    # Check daily query limit - ALWAYS use user's tenant_id (not demo bot's)
-    limit_info = await daily_limit_service.check_and_increment(api_key_data.tenant_id)
+    # Per-minute and daily limits in one round trip
+    # Daily quota ALWAYS uses user's tenant_id (not demo bot's)
+    limits = await enforce_rate_limits(api_key_data, api_key_data.tenant_id)
+    response.headers.update(limits.headers())
     
-    query_service = QueryService()
+    query_service = services.query_service
     result = await query_service.query(
         tenant_id=tenant_id,  # Can be demo bot or user's own bot
         query=request.query,
         api_key_id=api_key_data.key_id,
+        quota_tenant_id=api_key_data.tenant_id,
     )
     
     # Add limit info to response
-    result.daily_usage = limit_info
+    result.daily_usage = limits.daily_usage
     
     return result
 
 
+@router.post("/tenants/{tenant_id}/query:batch")
+async def query_bot_batch(
+    tenant_id: UUID,
+    request: BatchQueryRequest,
+    api_key_data: APIKeyData = Depends(verify_api_key),
+    services: ServiceContainer = Depends(get_services),
+):
+    """
+    Answer up to 100 questions in one request. Results stream back as NDJSON,
+    one {"index", "query", "answer", ...} object per line in completion order.
+    """
+    _check_query_access(tenant_id, api_key_data)
+    
+    max_cost = max_request_cost(api_key_data)
+    if len(request.queries) > max_cost:
+        # Retrying can't help - the batch is bigger than the whole budget
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Batch of {len(request.queries)} questions exceeds this key's limit of "
+                f"{max_cost} questions per request (per-minute and daily budgets)."
+            ),
+        )
+    
+    # The batch is charged per question against both limits, up front
+    limits = await enforce_rate_limits(
+        api_key_data, api_key_data.tenant_id, cost=len(request.queries)
+    )
+    
+    async def ndjson():
+        async for item in services.query_service.query_batch(
+            tenant_id=tenant_id,
+            queries=request.queries,
+            api_key_id=api_key_data.key_id,
+            quota_tenant_id=api_key_data.tenant_id,
+        ):
+            yield json.dumps(item) + "\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=limits.headers())
+
+
 @router.get("/tenants/{tenant_id}/query/stream")
 async def query_bot_stream(
     tenant_id: UUID,
     query: str,
     api_key_data: APIKeyData = Depends(verify_api_key),
+    services: ServiceContainer = Depends(get_services),
 ):
-    # Allow access to demo bot OR user's own tenant
-    demo_bot_id = UUID(settings.DEMO_BOT_TENANT_ID) if settings.DEMO_BOT_ENABLED else None
+    _check_query_access(tenant_id, api_key_data)
     
-    if tenant_id != api_key_data.tenant_id:
-        # Check if querying demo bot
-        if not (demo_bot_id and tenant_id == demo_bot_id):
-            raise HTTPException(status_code=403, detail="Access denied. You can only query your own bot or the demo bot.")
-    
-    # Check rate limit (per minute)
-    await check_rate_limit(api_key_data)
+    # Per-minute and daily limits in one round trip
+    # Daily quota ALWAYS uses user's tenant_id (not demo bot's)
+    limits = await enforce_rate_limits(api_key_data, api_key_data.tenant_id)
     
-    # Check daily query limit - ALWAYS use user's tenant_id (not demo bot's)
-    await daily_limit_service.check_and_increment(api_key_data.tenant_id)
-    
-    query_service = QueryService()
+    query_service = services.query_service
     stream = query_service.query_stream(
         tenant_id=tenant_id,  # Can be demo bot or user's own bot
         query=query,
         api_key_id=api_key_data.key_id,
+        quota_tenant_id=api_key_data.tenant_id,
     )
     
-    return StreamingResponse(stream, media_type="text/event-stream")
+    return StreamingResponse(stream, media_type="text/event-stream", headers=limits.headers())
 
 
 @router.post("/tenants/{tenant_id}/docs:upload", response_model=DocumentUploadResponse)
@@ -161,11 +206,12 @@ async def upload_document(
     tenant_id: UUID,
     file: UploadFile = File(...),
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     if user.tenant_id != tenant_id:
         raise HTTPException(status_code=403, detail="Tenant ID mismatch")
     
-    ingestion_service = IngestionService()
+    ingestion_service = services.ingestion_service
     result = await ingestion_service.upload_document(
         tenant_id=tenant_id,
         file=file,
@@ -181,12 +227,13 @@ async def list_documents(
     offset: int = Query(0, ge=0),
     status: Optional[str] = Query(None, description="Filter by document status"),
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     """List all documents for a tenant"""
     if user.tenant_id != tenant_id:
         raise HTTPException(status_code=403, detail="Tenant ID mismatch")
     
-    doc_repo = DocumentRepository()
+    doc_repo = services.doc_repo
     repo_data = await doc_repo.list_by_tenant(
         tenant_id,
         limit=limit,
@@ -207,11 +254,12 @@ async def list_documents(
 async def get_bot_config(
     tenant_id: UUID,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     if user.tenant_id != tenant_id:
         raise HTTPException(status_code=403, detail="Tenant ID mismatch")
     
-    bot_repo = BotRepository()
+    bot_repo = services.bot_repo
     bot = await bot_repo.get_by_tenant_id(tenant_id)
     
     if not bot:
@@ -225,10 +273,11 @@ async def create_api_key(
     tenant_id: UUID,
     request: APIKeyCreate,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     require_admin_or_owner(user, tenant_id)
     
-    api_key_repo = APIKeyRepository()
+    api_key_repo = services.api_key_repo
     result = await api_key_repo.create_key(
         tenant_id=tenant_id,
         name=request.name,
@@ -242,10 +291,11 @@ async def create_api_key(
 async def list_api_keys(
     tenant_id: UUID,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     require_admin_or_owner(user, tenant_id)
     
-    api_key_repo = APIKeyRepository()
+    api_key_repo = services.api_key_repo
     keys = await api_key_repo.list_keys(tenant_id)
     
     return {"keys": keys}
@@ -256,10 +306,11 @@ async def revoke_api_key(
     tenant_id: UUID,
     key_id: UUID,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     require_admin_or_owner(user, tenant_id)
     
-    api_key_repo = APIKeyRepository()
+    api_key_repo = services.api_key_repo
     await api_key_repo.revoke_key(tenant_id, key_id)
     
     return {"status": "revoked"}
@@ -270,7 +321,7 @@ async def get_cache_stats(user: User = Depends(get_current_user)):
     """
     Get cache statistics (admin/monitoring endpoint)
     """
-    stats = cache_service.get_stats()
+    stats = await cache_service.get_stats()
     return stats
 
 
@@ -294,15 +345,14 @@ async def generate_system_prompt(
     tenant_id: UUID,
     request: BusinessInfoRequest,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     """
     Generate optimal system prompt from business information using LLM
     """
     require_admin_or_owner(user, tenant_id)
     
-    from app.services.prompt_generator import PromptGeneratorService
-    
-    generator = PromptGeneratorService()
+    generator = services.prompt_generator
     system_prompt = await generator.generate_from_business_info(
         business_name=request.business_name,
         industry=request.industry,
@@ -323,13 +373,14 @@ async def update_bot_config(
     tenant_id: UUID,
     request: BotConfigUpdate,
     user: User = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services),
 ):
     """
     Update bot configuration (system prompt, business info, etc.)
     """
     require_admin_or_owner(user, tenant_id)
     
-    bot_repo = BotRepository()
+    bot_repo = services.bot_repo
     
     # Get existing bot
     bot = await bot_repo.get_by_tenant(tenant_id)
@@ -351,8 +402,16 @@ async def update_bot_config(
     if request.business_info is not None:
         current_config["business_info"] = request.business_info
     
-    # Update bot in database
+    # Update context_token_budget if provided (0 = use the default)
+    if request.context_token_budget is not None:
+        if request.context_token_budget > 0:
+            current_config["context_token_budget"] = request.context_token_budget
+        else:
+            current_config.pop("context_token_budget", None)
+    
+    # Update bot in database, then write through to the config cache
     await bot_repo.update_config(tenant_id, current_config)
+    await bot_config_cache.set(tenant_id, current_config)
     
     # Return updated config
     updated_bot = await bot_repo.get_by_tenant(tenant_id)
@@ -361,6 +420,7 @@ async def update_bot_config(
         name=updated_bot["name"],
         system_prompt=updated_bot["config"].get("system_prompt"),
         business_info=updated_bot["config"].get("business_info"),
+        context_token_budget=updated_bot["config"].get("context_token_budget"),
         using_default_prompt=("system_prompt" not in updated_bot["config"]),
         created_at=updated_bot["created_at"].isoformat(),
         updated_at=updated_bot["updated_at"].isoformat(),
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, List, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -24,6 +24,13 @@ class QueryRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=1000)
 
 
+class BatchQueryRequest(BaseModel):
+    # Each question counts against the rate limit and daily quota
+    queries: List[Annotated[str, Field(min_length=1, max_length=1000)]] = Field(
+        ..., min_length=1, max_length=100
+    )
+
+
 class Source(BaseModel):
     doc_id: str
     page: Optional[int] = None
@@ -121,6 +128,8 @@ class GeneratedPromptResponse(BaseModel):
 class BotConfigUpdate(BaseModel):
     system_prompt: Optional[str] = Field(None, max_length=2000)
     business_info: Optional[dict] = None
+    # Estimated tokens of retrieved context per answer; 0 restores the default
+    context_token_budget: Optional[int] = Field(None, ge=0, le=32000)
 
 
 class BotSettingsResponse(BaseModel):
@@ -128,6 +137,7 @@ class BotSettingsResponse(BaseModel):
     name: str
     system_prompt: Optional[str] = None
     business_info: Optional[dict] = None
+    context_token_budget: Optional[int] = None
     using_default_prompt: bool
     created_at: str
     updated_at: str
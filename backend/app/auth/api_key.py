@@ -7,7 +7,9 @@ from pydantic import BaseModel
 
 from app.auth.utils import verify_key_hash
 from app.auth.types import APIKeyData
+from app.auth.key_cache import api_key_cache
 from app.db.repositories import APIKeyRepository
+from app.services.last_used import last_used_tracker
 
 
 async def verify_api_key(
@@ -25,12 +27,19 @@ async def verify_api_key(
         raise HTTPException(status_code=401, detail="Invalid API key format")
     
     api_key_repo = APIKeyRepository()
-    key_data = await api_key_repo.verify_key(api_key)
     
+    # Hot keys are served from the verified-key cache without DB or Argon2 work
+    key_data = await api_key_cache.get(api_key)
     if not key_data:
-        raise HTTPException(status_code=401, detail="Invalid or revoked API key")
+        key_data = await api_key_repo.verify_key(api_key)
+        
+        if not key_data:
+            raise HTTPException(status_code=401, detail="Invalid or revoked API key")
+        
+        await api_key_cache.set(api_key, key_data)
     
-    await api_key_repo.update_last_used(key_data.key_id)
+    # Buffered and flushed in batches off the request path
+    last_used_tracker.record(key_data.key_id)
     
     return key_data
 
@@ -0,0 +1,125 @@
+"""
+Two-tier cache of verified API keys (in-process -> Redis)
+"""
+import hashlib
+import logging
+from typing import Dict, Optional, Set
+from uuid import UUID
+
+from app.auth.types import APIKeyData
+from app.config import settings
+from app.services.cache import cache_service, LocalTTLCache
+from app.services.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+
+class APIKeyCache:
+    """
+    Caches APIKeyData by a SHA-256 digest of the presented key, so a hot key
+    skips both the database and Argon2. Revocations are broadcast on the
+    invalidation bus and drop the entry on every replica.
+
+    A revocation also leaves a tombstone for API_KEY_CACHE_TTL. A request that
+    read the key from the database just before it was revoked checks the
+    tombstone after writing, so it can't put the revoked key back.
+    """
+
+    NAMESPACE = "apikey"
+
+    def __init__(self):
+        self._local = LocalTTLCache(ttl=settings.API_KEY_CACHE_LOCAL_TTL, on_evict=self._forget)
+        # key_id -> digests, so a revocation (which only knows the id) can find local entries
+        self._digests_by_key_id: Dict[str, Set[str]] = {}
+        # key_ids revoked recently, for when Redis (and with it the bus) is down
+        self._revoked = LocalTTLCache(ttl=settings.API_KEY_CACHE_TTL)
+        invalidation_bus.subscribe(self.NAMESPACE, self._drop_local)
+
+    @staticmethod
+    def digest(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    @staticmethod
+    def _entry_key(digest: str) -> str:
+        return f"apikey:{digest}"
+
+    @staticmethod
+    def _digest_key(key_id: str) -> str:
+        return f"apikey_digest:{key_id}"
+
+    @staticmethod
+    def _revoked_key(key_id: str) -> str:
+        return f"apikey_revoked:{key_id}"
+
+    def _remember(self, digest: str, key_data: APIKeyData) -> None:
+        self._local.set(digest, key_data)
+        self._digests_by_key_id.setdefault(str(key_data.key_id), set()).add(digest)
+
+    def _forget(self, digest: str, key_data: APIKeyData) -> None:
+        """Keep the key_id index in step with entries the local tier expires or evicts"""
+        key_id = str(key_data.key_id)
+        digests = self._digests_by_key_id.get(key_id)
+        if digests is None:
+            return
+        digests.discard(digest)
+        if not digests:
+            del self._digests_by_key_id[key_id]
+
+    def _drop_local(self, key_id: Optional[str]) -> None:
+        if key_id is None:
+            self._local.clear()
+            self._digests_by_key_id.clear()
+            return
+        self._revoked.set(key_id, True)
+        for digest in self._digests_by_key_id.pop(key_id, set()):
+            self._local.delete(digest)
+
+    async def get(self, api_key: str) -> Optional[APIKeyData]:
+        digest = self.digest(api_key)
+
+        key_data = self._local.get(digest)
+        if key_data is not None:
+            return key_data
+
+        cached = await cache_service.get(self._entry_key(digest))
+        if cached:
+            key_data = APIKeyData(**cached)
+            self._remember(digest, key_data)
+            return key_data
+
+        return None
+
+    async def set(self, api_key: str, key_data: APIKeyData) -> None:
+        digest = self.digest(api_key)
+        key_id = str(key_data.key_id)
+
+        ttl = settings.API_KEY_CACHE_TTL
+        await cache_service.set(self._entry_key(digest), key_data.model_dump(mode="json"), ttl)
+        await cache_service.set(self._digest_key(key_id), digest, ttl)
+
+        # Checked after the write: a revocation that raced the database read has
+        # either deleted the entry already or left a tombstone we see here
+        if self._revoked.get(key_id) or await cache_service.get(self._revoked_key(key_id)):
+            await cache_service.delete(self._entry_key(digest))
+            logger.info(f"Not caching API key {key_id}, it was revoked during verification")
+            return
+        self._remember(digest, key_data)
+
+    async def invalidate(self, key_id: UUID) -> None:
+        """Drop a key everywhere: Redis, this process and every other replica"""
+        # Tombstone first, so a concurrent set() either sees it or is deleted below
+        await cache_service.set(self._revoked_key(str(key_id)), 1, settings.API_KEY_CACHE_TTL)
+        self._revoked.set(str(key_id), True)
+
+        digest_key = self._digest_key(str(key_id))
+        digest = await cache_service.get(digest_key)
+        if digest:
+            await cache_service.delete(self._entry_key(digest))
+        await cache_service.delete(digest_key)
+
+        await invalidation_bus.publish(self.NAMESPACE, str(key_id))
+        logger.info(f"Invalidated cached API key {key_id}")
+
+
+# Singleton instance
+api_key_cache = APIKeyCache()
@@ -1,12 +1,19 @@
+import asyncio
+import logging
 from typing import Optional
 from uuid import UUID
 from fastapi import HTTPException, Header, Depends
+from jose import JWTError
 from pydantic import BaseModel
 from supabase import create_client, Client
 
+from app.auth.profile_cache import profile_cache
+from app.auth.supabase_jwt import supabase_token_verifier, LocalVerificationUnavailable
 from app.config import settings
 from app.db.repositories import ProfileRepository
 
+logger = logging.getLogger(__name__)
+
 
 class User(BaseModel):
     id: UUID
@@ -15,25 +22,38 @@ class User(BaseModel):
     role: str
 
 
+_supabase_client: Optional[Client] = None
+
+
 def get_supabase_client() -> Client:
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    global _supabase_client
+    if _supabase_client is None:
+        _supabase_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    return _supabase_client
 
 
-async def verify_supabase_token(
-    authorization: Optional[str] = Header(None),
-) -> dict:
-    """Verify Supabase JWT token without database lookup - for signup flow"""
+def _extract_token(authorization: Optional[str]) -> str:
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing authorization token")
     
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid authorization header")
     
-    token = authorization.replace("Bearer ", "")
+    return authorization.replace("Bearer ", "")
+
+
+async def _authenticate(token: str) -> dict:
+    """Verify the token locally, falling back to Supabase only when we can't"""
+    try:
+        return await supabase_token_verifier.verify(token)
+    except LocalVerificationUnavailable as e:
+        logger.debug(f"Local token verification unavailable, asking Supabase: {e}")
+    except (JWTError, KeyError, ValueError) as e:
+        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
     
     try:
         supabase = get_supabase_client()
-        user_response = supabase.auth.get_user(token)
+        user_response = await asyncio.to_thread(supabase.auth.get_user, token)
         
         if not user_response or not user_response.user:
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -42,35 +62,33 @@ async def verify_supabase_token(
             "id": UUID(user_response.user.id),
             "email": user_response.user.email
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
 
 
+async def verify_supabase_token(
+    authorization: Optional[str] = Header(None),
+) -> dict:
+    """Verify Supabase JWT token without database lookup - for signup flow"""
+    token = _extract_token(authorization)
+    return await _authenticate(token)
+
+
 async def get_current_user(
     authorization: Optional[str] = Header(None),
 ) -> User:
     """Get current user with tenant mapping from our database"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization token")
-    
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    token = _extract_token(authorization)
+    auth_data = await _authenticate(token)
+    user_id = auth_data["id"]
     
-    token = authorization.replace("Bearer ", "")
-    
-    try:
-        supabase = get_supabase_client()
-        user_response = supabase.auth.get_user(token)
-        
-        if not user_response or not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_id = user_response.user.id
-        email = user_response.user.email
-        
+    profile = profile_cache.get(str(user_id))
+    if profile is None:
         # Look up user's tenant mapping in our application database
         profile_repo = ProfileRepository()
-        app_user = await profile_repo.get_by_id(UUID(user_id))
+        app_user = await profile_repo.get_by_id(user_id)
         
         if not app_user:
             # User authenticated with Supabase but not set up in our app yet
@@ -78,17 +96,16 @@ async def get_current_user(
                 status_code=404, 
                 detail="User not found in application. Please complete signup."
             )
+        
+        profile = {"tenant_id": app_user["tenant_id"], "role": app_user["role"]}
+        profile_cache.set(str(user_id), profile)
 
-        return User(
-            id=UUID(user_id),
-            email=email,
-            tenant_id=app_user["tenant_id"],
-            role=app_user["role"],
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
+    return User(
+        id=user_id,
+        email=auth_data["email"],
+        tenant_id=profile["tenant_id"],
+        role=profile["role"],
+    )
 
 
 def require_admin_or_owner(user: User, tenant_id: UUID) -> None:
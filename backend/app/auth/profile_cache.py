@@ -0,0 +1,32 @@
+"""
+In-process cache of user profiles (user_id -> tenant_id, role)
+"""
+from typing import Optional
+from uuid import UUID
+
+from app.config import settings
+from app.services.cache import LocalTTLCache
+from app.services.invalidation import invalidation_bus
+
+PROFILE_CACHE_NAMESPACE = "profile"
+
+# Profiles are only ever inserted by the app (at signup) and misses aren't
+# cached, so nothing needs invalidating today. Tenant/role edits made directly
+# in the database apply within PROFILE_CACHE_TTL; any code path that adds such
+# an edit must call invalidate_user_profile so every replica drops its copy.
+profile_cache = LocalTTLCache(ttl=settings.PROFILE_CACHE_TTL)
+
+
+def _drop_cached_profile(user_id: Optional[str]) -> None:
+    if user_id is None:
+        profile_cache.clear()
+    else:
+        profile_cache.delete(user_id)
+
+
+invalidation_bus.subscribe(PROFILE_CACHE_NAMESPACE, _drop_cached_profile)
+
+
+async def invalidate_user_profile(user_id: UUID) -> None:
+    """Call whenever a user's tenant or role changes"""
+    await invalidation_bus.publish(PROFILE_CACHE_NAMESPACE, str(user_id))
@@ -0,0 +1,113 @@
+"""
+Local verification of Supabase access tokens
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+from uuid import UUID
+
+import httpx
+from jose import jwt, JWTError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVerificationUnavailable(Exception):
+    """The token cannot be checked locally (no secret configured, JWKS unreachable)"""
+
+
+class SupabaseTokenVerifier:
+    """
+    Verifies signature, expiry, audience and issuer of Supabase JWTs without a
+    network call. HS256 tokens use SUPABASE_JWT_SECRET; asymmetric tokens use
+    the project's JWKS, cached for SUPABASE_JWKS_CACHE_TTL and refetched once
+    when an unknown key id shows up (key rotation).
+    """
+
+    JWKS_PATH = "/auth/v1/.well-known/jwks.json"
+    ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+    # Don't hammer the JWKS endpoint with tokens carrying bogus key ids
+    MIN_REFRESH_INTERVAL_SECONDS = 30
+
+    def __init__(self):
+        self._jwks: Optional[dict] = None
+        self._jwks_fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def issuer(self) -> str:
+        return f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1"
+
+    async def _fetch_jwks(self) -> dict:
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(f"{settings.SUPABASE_URL.rstrip('/')}{self.JWKS_PATH}")
+            response.raise_for_status()
+            return response.json()
+
+    async def _get_signing_key(self, kid: Optional[str]) -> dict:
+        async with self._lock:
+            age = time.monotonic() - self._jwks_fetched_at
+            key = self._find_key(kid)
+            expired = age > settings.SUPABASE_JWKS_CACHE_TTL
+            unknown_kid = key is None and age > self.MIN_REFRESH_INTERVAL_SECONDS
+
+            if self._jwks is None or expired or unknown_kid:
+                try:
+                    self._jwks = await self._fetch_jwks()
+                    self._jwks_fetched_at = time.monotonic()
+                except (httpx.HTTPError, ValueError) as e:
+                    if self._jwks is None:
+                        raise LocalVerificationUnavailable(f"JWKS unavailable: {e}")
+                    # Keep serving the last known keys
+                    logger.warning(f"JWKS refresh failed, using cached keys: {e}")
+                key = self._find_key(kid)
+
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return key
+
+    def _find_key(self, kid: Optional[str]) -> Optional[dict]:
+        if not self._jwks:
+            return None
+        for key in self._jwks.get("keys", []):
+            if key.get("kid") == kid:
+                return key
+        return None
+
+    async def verify(self, token: str) -> dict:
+        """
+        Return {"id", "email"} for a valid token.
+        Raises JWTError for invalid tokens and LocalVerificationUnavailable when
+        the token can only be checked by Supabase.
+        """
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+
+        if algorithm == "HS256":
+            if not settings.SUPABASE_JWT_SECRET:
+                raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET is not configured")
+            key = settings.SUPABASE_JWT_SECRET
+        elif algorithm in self.ASYMMETRIC_ALGORITHMS:
+            key = await self._get_signing_key(header.get("kid"))
+        else:
+            raise JWTError(f"Unsupported token algorithm: {algorithm}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.SUPABASE_JWT_AUDIENCE,
+            issuer=self.issuer,
+        )
+
+        return {
+            "id": UUID(claims["sub"]),
+            "email": claims.get("email"),
+        }
+
+
+# Singleton instance
+supabase_token_verifier = SupabaseTokenVerifier()
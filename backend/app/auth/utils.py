@@ -1,11 +1,31 @@
 """Authentication utility functions"""
+import re
 import secrets
+from typing import Optional, Tuple
 from passlib.hash import argon2
 
 
-def generate_api_key() -> str:
-    """Generate a new API key with 'wvr_' prefix"""
-    return f"wvr_{secrets.token_urlsafe(48)}"
+# Keys are issued as 'wvr_<lookup_id>_<secret>'. The lookup id is public and
+# indexed so verification is a single row fetch plus one hash check.
+LOOKUP_ID_BYTES = 8
+_API_KEY_PATTERN = re.compile(r"^wvr_([0-9a-f]{16})_([A-Za-z0-9_-]{64})$")
+
+
+def generate_api_key() -> Tuple[str, str]:
+    """Generate a new API key with 'wvr_' prefix. Returns (key, lookup_id)."""
+    lookup_id = secrets.token_hex(LOOKUP_ID_BYTES)
+    return f"wvr_{lookup_id}_{secrets.token_urlsafe(48)}", lookup_id
+
+
+def parse_lookup_id(key: str) -> Optional[str]:
+    """
+    Extract the lookup id from an API key.
+    Returns None for legacy keys ('wvr_<secret>') issued before lookup ids existed.
+    """
+    match = _API_KEY_PATTERN.match(key)
+    if not match:
+        return None
+    return match.group(1)
 
 
 def hash_api_key(key: str) -> str:
@@ -19,4 +39,3 @@ def verify_key_hash(key: str, key_hash: str) -> bool:
         return argon2.verify(key, key_hash)
     except Exception:
         return False
-
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -16,6 +16,52 @@ class Settings(BaseSettings):
     
     SUPABASE_URL: str
     SUPABASE_KEY: str
+    # Verify dashboard JWTs locally. HS256 projects need the JWT secret;
+    # asymmetric keys are read from the project's JWKS endpoint.
+    SUPABASE_JWT_SECRET: Optional[str] = None
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    SUPABASE_JWKS_CACHE_TTL: int = 3600
+    # user_id -> (tenant_id, role) mapping cache. Edits made directly in the
+    # database apply after this TTL
+    PROFILE_CACHE_TTL: int = 60
+    # Per-process L1 in front of Redis. Only namespaces listed here are held
+    # locally, each for at most the given number of seconds.
+    CACHE_L1_ENABLED: bool = True
+    CACHE_L1_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_L1_NAMESPACE_TTLS: Dict[str, int] = {"query": 30, "emb": 300}
+    # Local copy of each tenant's corpus version (bumps are broadcast to replicas)
+    CORPUS_VERSION_LOCAL_TTL: int = 5
+    # Exact-match answer cache: served fresh until the soft TTL, then served
+    # stale while one background refresh runs, dropped after the hard TTL
+    QUERY_CACHE_SOFT_TTL: int = 600
+    QUERY_CACHE_HARD_TTL: int = 3600
+    # Background refreshes never queue: when all slots are busy they are skipped
+    QUERY_REFRESH_MAX_CONCURRENT: int = 4
+    # A key refreshed by any replica isn't refreshed again within this window
+    QUERY_REFRESH_LOCK_SECONDS: int = 30
+    # LLM calls in flight per batch query request
+    QUERY_BATCH_LLM_CONCURRENCY: int = 4
+    # Semantic answer cache (one row per distinct high-confidence answer)
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2000  # per tenant, least recently used evicted
+    SEMANTIC_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # Start hybrid retrieval while the semantic cache is checked (cancelled on a hit);
+    # trades extra DB work on hits for lower latency on misses
+    SEMANTIC_CACHE_SPECULATIVE_RETRIEVAL: bool = True
+    # Celery beat job that pre-computes answers for each active tenant's top
+    # queries; runs more often than QUERY_CACHE_SOFT_TTL so they never go cold
+    CACHE_WARM_ENABLED: bool = True
+    CACHE_WARM_INTERVAL_SECONDS: int = 300
+    CACHE_WARM_TOP_N: int = 20
+    CACHE_WARM_ACTIVE_DAYS: int = 7
+    CACHE_WARM_DAILY_BUDGET: int = 100  # answer computations per tenant per day
+    # Coalesce identical in-flight queries across replicas too (Redis lock +
+    # followers poll the answer cache), not only within a process
+    SINGLE_FLIGHT_DISTRIBUTED: bool = False
+    SINGLE_FLIGHT_LOCK_SECONDS: float = 15.0
+    SINGLE_FLIGHT_POLL_SECONDS: float = 0.1
+    # Cached embeddings are packed binary: float32, or float16 for half the memory
+    EMBEDDING_CACHE_DTYPE: Literal["float32", "float16"] = "float32"
     
     
     SENTRY_DSN: Optional[str] = None
@@ -23,6 +69,34 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "INFO"
     
     RATE_LIMIT_RPM: int = 60
+    # Keys at or above a tier's rpm lease that many tokens per replica and
+    # spend them locally, e.g. {"600": 10, "3000": 50}. Empty disables leasing.
+    RATE_LIMIT_LEASE_TIERS: Dict[int, int] = {600: 10, 3000: 50}
+    RATE_LIMIT_LEASE_TTL_SECONDS: float = 2.0
+    # Largest fraction of MAX_QUERIES_PER_DAY a single lease may hold
+    RATE_LIMIT_LEASE_DAILY_SHARE: float = 0.01
+    # Accept keys issued before lookup ids ('wvr_<secret>'); these still need a scan
+    API_KEY_LEGACY_LOOKUP: bool = True
+    # Verified-key cache: short in-process tier backed by Redis
+    API_KEY_CACHE_LOCAL_TTL: int = 30
+    API_KEY_CACHE_TTL: int = 300
+    # Open DB, Redis, embedding and chat model connections before /ready reports ready
+    # (one tiny embedding call and one short chat completion per start)
+    SERVICE_WARMUP_ENABLED: bool = True
+    # Bot config cache: short in-process tier backed by Redis (updates are broadcast)
+    BOT_CONFIG_CACHE_LOCAL_TTL: int = 60
+    BOT_CONFIG_CACHE_TTL: int = 3600
+    # How often buffered last_used_at timestamps are written to Postgres
+    API_KEY_LAST_USED_FLUSH_SECONDS: int = 10
+    # Query logs are buffered per process, shipped to a Redis Stream and
+    # written to Postgres in batches by the worker
+    QUERY_LOG_FLUSH_SECONDS: float = 1.0
+    QUERY_LOG_BATCH_SIZE: int = 500
+    QUERY_LOG_BUFFER_MAX: int = 10000  # oldest records dropped beyond this
+    QUERY_LOG_STREAM_MAXLEN: int = 1000000
+    QUERY_LOG_DRAIN_INTERVAL_SECONDS: float = 5.0
+    # Unacknowledged entries of a dead consumer are redelivered after this
+    QUERY_LOG_CLAIM_IDLE_SECONDS: int = 60
     MAX_FILE_SIZE_MB: int = 200
     MAX_TENANT_STORAGE_GB: int = 2
     MAX_QUERIES_PER_DAY: int = 50  # Daily query limit per bot
@@ -31,6 +105,13 @@ class Settings(BaseSettings):
     CHUNK_OVERLAP: int = 200
     TOP_K_RESULTS: int = 3  # Reduced from 8 for faster retrieval
     LLM_TEMPERATURE: float = 0.2
+    # Estimated tokens of retrieved context sent to the LLM; bots can override
+    # it with context_token_budget in their config
+    CONTEXT_TOKEN_BUDGET: int = 2000
+    # LLM answers keyed by prompt, chunk ids and canonical question; keys carry
+    # the corpus version, so ingestion invalidates them before the TTL does
+    LLM_GENERATION_CACHE_ENABLED: bool = True
+    LLM_GENERATION_CACHE_TTL: int = 24 * 3600
     
     # Demo Bot Configuration
     DEMO_BOT_TENANT_ID: str = "00000000-0000-0000-0000-000000000000"
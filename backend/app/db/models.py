@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, BigInteger, Boolean, Text, TIMESTAMP, ForeignKey, UniqueConstraint, Index, text
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, Text, TIMESTAMP, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -123,6 +123,8 @@ class APIKey(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tenant_id = Column(UUID(as_uuid=True), ForeignKey('tenants.id', ondelete='CASCADE'), nullable=False)
     name = Column(String(255))
+    # Public part of the key ('wvr_<lookup_id>_<secret>'); NULL for legacy keys
+    lookup_id = Column(String(32))
     key_hash = Column(String(255), nullable=False)
     rate_limit_rpm = Column(Integer, default=60)
     revoked = Column(Boolean, default=False)
@@ -136,6 +138,7 @@ class APIKey(Base):
     __table_args__ = (
         Index('idx_api_keys_tenant_id', 'tenant_id'),
         Index('idx_api_keys_revoked', 'revoked'),
+        Index('idx_api_keys_lookup_id', 'lookup_id', unique=True),
     )
 
 
@@ -162,10 +165,37 @@ class BotQuery(Base):
         Index('idx_bot_queries_created_at', 'created_at'),
         Index('idx_bot_queries_confidence', 'confidence'),
 
-        # Use partial index to only index queries for high confidence answers
-        Index('idx_bot_queries_semantic_cache', 'query_embedding', postgresql_using='hnsw',
-        postgresql_with={'m': 16, 'ef_construction': 64},
-        postgresql_ops={'query_embedding': 'vector_cosine_ops'},
-        postgresql_where=text("confidence='high'")),
     )
 
+
+class SemanticCacheEntry(Base):
+    """One canonical question embedding per distinct high-confidence answer"""
+    __tablename__ = "semantic_cache"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey('tenants.id', ondelete='CASCADE'), nullable=False)
+    query = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    answer_hash = Column(String(32), nullable=False)  # md5(answer)
+    sources = Column(JSONB, default=[])
+    embedding = Column(Vector(1536), nullable=False)
+    hit_count = Column(Integer, nullable=False, server_default='0')
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    last_used_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'answer_hash', name='uq_semantic_cache_tenant_answer'),
+        # Per-tenant caps keep lookups an exact scan over this index; no ANN index
+        Index('idx_semantic_cache_tenant_last_used', 'tenant_id', 'last_used_at'),
+    )
+
+
+class EmbeddingStoreEntry(Base):
+    """Durable, content-addressed document embeddings (sha256 of the exact text)"""
+    __tablename__ = "embedding_store"
+    
+    content_hash = Column(String(64), primary_key=True)
+    model = Column(String(100), primary_key=True)
+    dimensions = Column(Integer, primary_key=True)
+    embedding = Column(Vector(), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
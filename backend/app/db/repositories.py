@@ -1,16 +1,26 @@
-from typing import Optional, List, Callable
+import asyncio
+import hashlib
+import json
+import numpy as np
+from typing import Optional, List, Callable, Dict, Tuple
 from uuid import UUID
 from datetime import datetime
-from sqlalchemy import select, update, delete, func, desc
+from sqlalchemy import select, update, delete, func, desc, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from pgvector import Vector as PgVector
+from pgvector.sqlalchemy import Vector
 
 from app.db import connection
 AsyncSessionLocal = connection.AsyncSessionLocal
-from app.db.models import Tenant, Profile, Bot, Document, DocumentChunk, APIKey, BotQuery
-from app.auth.utils import generate_api_key, hash_api_key, verify_key_hash
+from app.db.models import Tenant, Profile, Bot, Document, DocumentChunk, APIKey, BotQuery, SemanticCacheEntry, EmbeddingStoreEntry
+from app.auth.utils import generate_api_key, hash_api_key, verify_key_hash, parse_lookup_id
 from app.auth.types import APIKeyData
+from app.auth.key_cache import api_key_cache
 from app.api.v1.schemas import APIKeyMetadata
+from app.config import settings
+from app.services.vector_codec import VectorLike
 
 
 class TenantRepository:
@@ -138,13 +148,14 @@ class APIKeyRepository:
         name: Optional[str] = None,
         rate_limit_rpm: Optional[int] = None,
     ) -> dict:
-        key = generate_api_key()
-        key_hash = hash_api_key(key)
+        key, lookup_id = generate_api_key()
+        key_hash = await asyncio.to_thread(hash_api_key, key)
         
         async with AsyncSessionLocal() as session:
             api_key = APIKey(
                 tenant_id=tenant_id,
                 name=name,
+                lookup_id=lookup_id,
                 key_hash=key_hash,
                 rate_limit_rpm=rate_limit_rpm or 60,
             )
@@ -161,28 +172,75 @@ class APIKeyRepository:
             }
     
     async def verify_key(self, api_key: str) -> Optional[APIKeyData]:
+        lookup_id = parse_lookup_id(api_key)
+        
         async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(APIKey).where(APIKey.revoked == False)
-            )
-            keys = result.scalars().all()
-            
-            for key_obj in keys:
-                if verify_key_hash(api_key, key_obj.key_hash):
-                    return APIKeyData(
-                        key_id=key_obj.id,
-                        tenant_id=key_obj.tenant_id,
-                        rate_limit_rpm=key_obj.rate_limit_rpm,
+            if lookup_id:
+                # Indexed lookup - at most one candidate row
+                result = await session.execute(
+                    select(APIKey).where(
+                        APIKey.lookup_id == lookup_id,
+                        APIKey.revoked == False,
                     )
-            
+                )
+            elif settings.API_KEY_LEGACY_LOOKUP:
+                # Legacy keys have no lookup id, so scan only the rows issued before them
+                result = await session.execute(
+                    select(APIKey).where(
+                        APIKey.lookup_id.is_(None),
+                        APIKey.revoked == False,
+                    )
+                )
+            else:
+                return None
+            keys = result.scalars().all()
+        
+        if not keys:
             return None
+        
+        # Argon2 is deliberately slow - keep it off the event loop
+        key_obj = await asyncio.to_thread(self._match_key, api_key, keys)
+        if not key_obj:
+            return None
+        
+        return APIKeyData(
+            key_id=key_obj.id,
+            tenant_id=key_obj.tenant_id,
+            rate_limit_rpm=key_obj.rate_limit_rpm,
+        )
     
-    async def update_last_used(self, key_id: UUID):
+    @staticmethod
+    def _match_key(api_key: str, keys: List[APIKey]) -> Optional[APIKey]:
+        for key_obj in keys:
+            if verify_key_hash(api_key, key_obj.key_hash):
+                return key_obj
+        return None
+    
+    async def update_last_used_batch(self, last_used: Dict[UUID, datetime]) -> None:
+        """
+        Apply buffered last-use timestamps in one UPDATE.
+        Never moves a timestamp backwards, so flushes from several replicas can interleave.
+        """
+        if not last_used:
+            return
+        
+        from sqlalchemy import text
+        
+        key_ids = list(last_used.keys())
         async with AsyncSessionLocal() as session:
             await session.execute(
-                update(APIKey)
-                .where(APIKey.id == key_id)
-                .values(last_used_at=func.now())
+                text("""
+                    UPDATE api_keys AS k
+                    SET last_used_at = v.last_used_at
+                    FROM unnest(CAST(:key_ids AS uuid[]), CAST(:timestamps AS timestamptz[]))
+                        AS v(id, last_used_at)
+                    WHERE k.id = v.id
+                      AND (k.last_used_at IS NULL OR k.last_used_at < v.last_used_at)
+                """),
+                {
+                    "key_ids": key_ids,
+                    "timestamps": [last_used[key_id] for key_id in key_ids],
+                }
             )
             await session.commit()
     
@@ -215,6 +273,9 @@ class APIKeyRepository:
                 .values(revoked=True)
             )
             await session.commit()
+        
+        # Revocation must take effect on every replica, not after a cache TTL
+        await api_key_cache.invalidate(key_id)
 
 
 class DocumentRepository:
@@ -326,16 +387,13 @@ class ChunkRepository:
     async def search_similar(
         self,
         tenant_id: UUID,
-        query_embedding: List[float],
+        query_embedding: VectorLike,
         top_k: int = 8,
     ) -> List[dict]:
         async with self._session_factory() as session:
             # Using raw SQL for vector similarity search as SQLAlchemy doesn't have full pgvector support yet
             from sqlalchemy import text
             
-            # Format the embedding as a PostgreSQL array string
-            embedding_str = '[' + ','.join(str(x) for x in query_embedding) + ']'
-            
             query = text("""
                 SELECT 
                     id,
@@ -343,18 +401,19 @@ class ChunkRepository:
                     text,
                     page_num,
                     chunk_metadata,
+                    chunk_index,
                     1 - (embedding <=> (:query_embedding)::vector) as similarity
                 FROM doc_chunks
                 WHERE tenant_id = :tenant_id
                 ORDER BY embedding <=> (:query_embedding)::vector
                 LIMIT :top_k
-            """)
+            """).bindparams(bindparam("query_embedding", type_=Vector(1536)))
             
             result = await session.execute(
                 query,
                 {
                     "tenant_id": str(tenant_id),
-                    "query_embedding": embedding_str,
+                    "query_embedding": query_embedding,
                     "top_k": top_k,
                 }
             )
@@ -367,7 +426,8 @@ class ChunkRepository:
                     "text": row[2],
                     "page_num": row[3],
                     "metadata": row[4],
-                    "similarity": float(row[5]),
+                    "chunk_index": row[5],
+                    "similarity": float(row[6]),
                 }
                 for row in rows
             ]
@@ -390,6 +450,7 @@ class ChunkRepository:
                     text,
                     page_num,
                     chunk_metadata,
+                    chunk_index,
                     ts_rank_cd(search_vector, websearch_to_tsquery('english', :query)) as rank
                 FROM doc_chunks
                 WHERE tenant_id = :tenant_id
@@ -415,18 +476,107 @@ class ChunkRepository:
                     "text": row[2],
                     "page_num": row[3],
                     "metadata": row[4],
-                    "score": float(row[5]),
+                    "chunk_index": row[5],
+                    "score": float(row[6]),
                     "source_type": "keyword"
                 }
                 for row in rows
             ]
+    
+    async def search_hybrid_batch(
+        self,
+        tenant_id: UUID,
+        queries: List[str],
+        query_embeddings: List[VectorLike],
+        top_k: int = 8,
+    ) -> List[Tuple[List[dict], List[dict]]]:
+        """
+        Vector and keyword candidates for many queries in one statement (one
+        LATERAL subquery of each kind per query). Returns
+        (vector_results, keyword_results) per query, in the order given.
+        """
+        if not queries:
+            return []
+        async with self._session_factory() as session:
+            from sqlalchemy import text
+            
+            # One query vector per row: bound as a text[] of pgvector literals
+            # and cast to vector per row (search_similar binds a single typed Vector)
+            sql = text("""
+                WITH q AS (
+                    SELECT idx, query_text, embedding::vector AS embedding
+                    FROM unnest(
+                        CAST(:idxs AS int[]),
+                        CAST(:queries AS text[]),
+                        CAST(:embeddings AS text[])
+                    ) AS q(idx, query_text, embedding)
+                )
+                SELECT q.idx, 'vector' AS source, v.id, v.doc_id, v.text, v.page_num, v.chunk_metadata, v.chunk_index, v.score
+                FROM q
+                CROSS JOIN LATERAL (
+                    SELECT id, doc_id, text, page_num, chunk_metadata, chunk_index,
+                           1 - (embedding <=> q.embedding) AS score
+                    FROM doc_chunks
+                    WHERE tenant_id = :tenant_id
+                    ORDER BY embedding <=> q.embedding
+                    LIMIT :top_k
+                ) v
+                UNION ALL
+                SELECT q.idx, 'keyword' AS source, k.id, k.doc_id, k.text, k.page_num, k.chunk_metadata, k.chunk_index, k.score
+                FROM q
+                CROSS JOIN LATERAL (
+                    SELECT id, doc_id, text, page_num, chunk_metadata, chunk_index,
+                           ts_rank_cd(search_vector, websearch_to_tsquery('english', q.query_text)) AS score
+                    FROM doc_chunks
+                    WHERE tenant_id = :tenant_id
+                      AND search_vector @@ websearch_to_tsquery('english', q.query_text)
+                    ORDER BY score DESC
+                    LIMIT :top_k
+                ) k
+                ORDER BY 1, 2, 9 DESC
+            """)
+            
+            result = await session.execute(
+                sql,
+                {
+                    "idxs": list(range(len(queries))),
+                    "queries": queries,
+                    "embeddings": [PgVector(embedding).to_text() for embedding in query_embeddings],
+                    "tenant_id": str(tenant_id),
+                    "top_k": top_k,
+                }
+            )
+            
+            results: List[Tuple[List[dict], List[dict]]] = [([], []) for _ in queries]
+            for row in result.fetchall():
+                vector_results, keyword_results = results[row[0]]
+                chunk = {
+                    "id": str(row[2]),
+                    "doc_id": str(row[3]),
+                    "text": row[4],
+                    "page_num": row[5],
+                    "metadata": row[6],
+                    "chunk_index": row[7],
+                }
+                if row[1] == "vector":
+                    chunk["similarity"] = float(row[8])
+                    vector_results.append(chunk)
+                else:
+                    chunk["score"] = float(row[8])
+                    chunk["source_type"] = "keyword"
+                    keyword_results.append(chunk)
+            return results
+
 
 
 
 
 class BotRepository:
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._session_factory = session_factory
+    
     async def get_by_tenant_id(self, tenant_id: UUID) -> Optional[dict]:
-        async with AsyncSessionLocal() as session:
+        async with self._session_factory() as session:
             result = await session.execute(
                 select(Bot).where(Bot.tenant_id == tenant_id)
             )
@@ -451,7 +601,7 @@ class BotRepository:
     async def update_config(self, tenant_id: UUID, config: dict) -> None:
         """Update bot configuration (system_prompt, business_info, etc.)"""
         from sqlalchemy import update
-        async with AsyncSessionLocal() as session:
+        async with self._session_factory() as session:
             result = await session.execute(
                 update(Bot)
                 .where(Bot.tenant_id == tenant_id)
@@ -467,6 +617,9 @@ class BotRepository:
 
 
 class QueryLogRepository:
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._session_factory = session_factory
+    
     async def log_query(
         self,
         tenant_id: UUID,
@@ -476,9 +629,9 @@ class QueryLogRepository:
         confidence: str,
         latency_ms: int,
         sources: List[dict],
-        query_embedding: List[float] = None,
+        query_embedding: Optional[VectorLike] = None,
     ):
-        async with AsyncSessionLocal() as session:
+        async with self._session_factory() as session:
             # Ensure payload is JSON-serializable
             def convert(obj):
                 if isinstance(obj, UUID):
@@ -503,60 +656,212 @@ class QueryLogRepository:
             )
             session.add(bot_query)
             await session.commit()
+    
+    async def log_queries_batch(self, records: List[dict]) -> None:
+        """
+        Insert queued log records (see app.services.query_log) in one statement.
+        Records carry their own id, so redelivered ones are skipped.
+        """
+        if not records:
+            return
+        rows = [
+            {
+                "id": UUID(record["id"]),
+                "tenant_id": UUID(record["tenant_id"]),
+                "api_key_id": UUID(record["api_key_id"]) if record.get("api_key_id") else None,
+                "query": record["query"],
+                "answer": record["answer"],
+                "confidence": record["confidence"],
+                "latency_ms": record["latency_ms"],
+                "sources": json.loads(json.dumps(record.get("sources") or [], default=str)),
+                "created_at": datetime.fromisoformat(record["created_at"]),
+            }
+            for record in records
+        ]
+        async with self._session_factory() as session:
+            await session.execute(
+                pg_insert(BotQuery)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["id"])
+            )
+            await session.commit()
+
 
-    async def find_similar_query(
+class SemanticCacheRepository:
+    """
+    Bounded per-tenant store of high-confidence answers, keyed by one
+    canonical question embedding per distinct answer. Each tenant keeps at most
+    SEMANTIC_CACHE_MAX_ENTRIES rows (least recently used go first) for at most
+    SEMANTIC_CACHE_TTL_SECONDS, so a lookup is an exact scan of a small set.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._session_factory = session_factory
+
+    async def find_similar(
         self,
         tenant_id: UUID,
-        query_embedding: List[float],
-        threshold: float = 0.95
+        query_embedding: VectorLike,
+        threshold: float = 0.95,
     ) -> Optional[dict]:
-        """
-        Find a historically high-confidence query that matches semantically.
-        """
-        async with AsyncSessionLocal() as session:
+        """Closest cached answer for the tenant if it is at least `threshold` similar"""
+        async with self._session_factory() as session:
             from sqlalchemy import text
             
-            # Format embedding for SQL
-            embedding_str = '[' + ','.join(str(x) for x in query_embedding) + ']'
-            
-            # Search for most similar query in this tenant's history
-            # That was answered with 'high' confidence
+            # Nearest neighbour first, threshold checked afterwards: a distance
+            # predicate in WHERE only gets in the planner's way
             sql = text("""
-                SELECT 
-                    answer, 
-                    sources, 
-                    1 - (query_embedding <=> (:embedding)::vector) as similarity
-                FROM bot_queries
+                SELECT
+                    id,
+                    answer,
+                    sources,
+                    1 - (embedding <=> (:embedding)::vector) as similarity
+                FROM semantic_cache
                 WHERE tenant_id = :tenant_id
-                  AND confidence = 'high'
-                  AND 1 - (query_embedding <=> (:embedding)::vector) > :threshold
-                ORDER BY query_embedding <=> (:embedding)::vector
+                  AND created_at > now() - make_interval(secs => :ttl)
+                ORDER BY embedding <=> (:embedding)::vector
                 LIMIT 1
-            """)
+            """).bindparams(bindparam("embedding", type_=Vector(1536)))
             
             result = await session.execute(
                 sql,
                 {
                     "tenant_id": str(tenant_id),
-                    "embedding": embedding_str,
-                    "threshold": threshold
+                    "embedding": query_embedding,
+                    "ttl": settings.SEMANTIC_CACHE_TTL_SECONDS,
                 }
             )
             row = result.fetchone()
+            if row is None or float(row[3]) <= threshold:
+                return None
             
-            if row:
-                return {
-                    "answer": row[0],
-                    "sources": row[1],
-                    "similarity": float(row[2])
-                }
-            return None
+            await session.execute(
+                text("""
+                    UPDATE semantic_cache
+                    SET hit_count = hit_count + 1, last_used_at = now()
+                    WHERE id = :id
+                """),
+                {"id": row[0]},
+            )
+            await session.commit()
+            
+            return {
+                "answer": row[1],
+                "sources": row[2],
+                "similarity": float(row[3]),
+            }
+
+    async def store(
+        self,
+        tenant_id: UUID,
+        query: str,
+        query_embedding: VectorLike,
+        answer: str,
+        sources: List[dict],
+    ) -> None:
+        """Remember an answer; an answer that is already cached keeps its first question"""
+        async with self._session_factory() as session:
+            from sqlalchemy import text
+            
+            inserted = await session.execute(
+                text("""
+                    INSERT INTO semantic_cache
+                        (tenant_id, query, answer, answer_hash, sources, embedding)
+                    VALUES
+                        (:tenant_id, :query, :answer, :answer_hash, CAST(:sources AS jsonb), :embedding)
+                    ON CONFLICT (tenant_id, answer_hash)
+                    DO UPDATE SET last_used_at = now()
+                    RETURNING (xmax = 0) AS inserted
+                """).bindparams(bindparam("embedding", type_=Vector(1536))),
+                {
+                    "tenant_id": str(tenant_id),
+                    "query": query,
+                    "answer": answer,
+                    "answer_hash": hashlib.md5(answer.encode()).hexdigest(),
+                    "sources": json.dumps(sources, default=str),
+                    "embedding": query_embedding,
+                },
+            )
+            
+            if inserted.scalar():
+                # Only a new row can push the tenant over its cap
+                await session.execute(
+                    text("""
+                        DELETE FROM semantic_cache
+                        WHERE tenant_id = :tenant_id
+                          AND (
+                            created_at <= now() - make_interval(secs => :ttl)
+                            OR id IN (
+                                SELECT id FROM semantic_cache
+                                WHERE tenant_id = :tenant_id
+                                ORDER BY last_used_at DESC
+                                OFFSET :max_entries
+                            )
+                          )
+                    """),
+                    {
+                        "tenant_id": str(tenant_id),
+                        "ttl": settings.SEMANTIC_CACHE_TTL_SECONDS,
+                        "max_entries": settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                    },
+                )
+            await session.commit()
 
+    async def clear_tenant(self, tenant_id: UUID) -> None:
+        """Forget a tenant's answers after its documents changed"""
+        async with self._session_factory() as session:
+            await session.execute(
+                delete(SemanticCacheEntry).where(SemanticCacheEntry.tenant_id == tenant_id)
+            )
+            await session.commit()
+
+
+class EmbeddingStoreRepository:
+    """Durable embeddings keyed by (sha256 of exact text, model, dimensions)"""
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._session_factory = session_factory
+
+    async def get_many(self, content_hashes: List[str], model: str, dimensions: int) -> Dict[str, np.ndarray]:
+        if not content_hashes:
+            return {}
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(EmbeddingStoreEntry.content_hash, EmbeddingStoreEntry.embedding)
+                .where(
+                    EmbeddingStoreEntry.model == model,
+                    EmbeddingStoreEntry.dimensions == dimensions,
+                    EmbeddingStoreEntry.content_hash.in_(set(content_hashes)),
+                )
+            )
+            return {row[0]: row[1] for row in result.all()}
+
+    async def put_many(self, embeddings: Dict[str, VectorLike], model: str, dimensions: int) -> None:
+        if not embeddings:
+            return
+        async with self._session_factory() as session:
+            await session.execute(
+                pg_insert(EmbeddingStoreEntry)
+                .values([
+                    {
+                        "content_hash": content_hash,
+                        "model": model,
+                        "dimensions": dimensions,
+                        "embedding": embedding,
+                    }
+                    for content_hash, embedding in embeddings.items()
+                ])
+                .on_conflict_do_nothing()
+            )
+            await session.commit()
 
 
 class AnalyticsRepository:
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._session_factory = session_factory
+    
     async def get_query_stats(self, tenant_id: UUID, start_date, end_date) -> dict:
-        async with AsyncSessionLocal() as session:
+        async with self._session_factory() as session:
             from sqlalchemy import text, cast, Date
             
             query = text("""
@@ -594,23 +899,30 @@ class AnalyticsRepository:
                 ]
             }
     
-    async def get_top_queries(self, tenant_id: UUID, limit: int = 10) -> List[dict]:
-        async with AsyncSessionLocal() as session:
+    async def get_top_queries(
+        self,
+        tenant_id: UUID,
+        limit: int = 10,
+        since: Optional[datetime] = None,
+    ) -> List[dict]:
+        async with self._session_factory() as session:
             from sqlalchemy import text
             
-            query = text("""
+            since_filter = "AND created_at >= :since" if since else ""
+            query = text(f"""
                 SELECT query, COUNT(*) as count
                 FROM bot_queries
                 WHERE tenant_id = :tenant_id
+                  {since_filter}
                 GROUP BY query
                 ORDER BY count DESC
                 LIMIT :limit
             """)
             
-            result = await session.execute(
-                query,
-                {"tenant_id": str(tenant_id), "limit": limit}
-            )
+            params = {"tenant_id": str(tenant_id), "limit": limit}
+            if since:
+                params["since"] = since
+            result = await session.execute(query, params)
             rows = result.fetchall()
             
             return [
@@ -619,7 +931,7 @@ class AnalyticsRepository:
             ]
     
     async def get_unanswered_queries(self, tenant_id: UUID, limit: int = 20) -> List[dict]:
-        async with AsyncSessionLocal() as session:
+        async with self._session_factory() as session:
             result = await session.execute(
                 select(BotQuery.query, BotQuery.created_at)
                 .where(BotQuery.tenant_id == tenant_id, BotQuery.confidence == 'low')
@@ -632,3 +944,13 @@ class AnalyticsRepository:
                 {"query": row[0], "created_at": row[1].isoformat()}
                 for row in rows
             ]
+    
+    async def get_active_tenant_ids(self, since: datetime) -> List[UUID]:
+        """Tenants whose bot answered at least one query since the given time"""
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(BotQuery.tenant_id)
+                .where(BotQuery.created_at >= since)
+                .distinct()
+            )
+            return [row[0] for row in result.all()]
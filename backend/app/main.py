@@ -1,5 +1,6 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
@@ -8,6 +9,12 @@ from app.config import settings
 from app.api.v1 import routes
 from app.observability.metrics import setup_metrics
 from app.observability.logging import setup_logging
+from app.middleware.rate_limit import leased_rate_limiter
+from app.services.cache import cache_service
+from app.services.invalidation import invalidation_bus
+from app.services.last_used import last_used_tracker
+from app.services.query_log import query_log_queue
+from app.services.container import ServiceContainer
 
 
 @asynccontextmanager
@@ -20,7 +27,26 @@ async def lifespan(app: FastAPI):
             integrations=[FastApiIntegration()],
             traces_sample_rate=0.1,
         )
+    await cache_service.connect()
+    await invalidation_bus.start()
+    await last_used_tracker.start()
+    await query_log_queue.start()
+    await leased_rate_limiter.start()
+    
+    # Services (and their provider clients) are shared by every request
+    services = ServiceContainer.build()
+    app.state.services = services
+    if settings.SERVICE_WARMUP_ENABLED:
+        await services.warm_up()
+    services.ready = True
+    
     yield
+    services.ready = False
+    await leased_rate_limiter.stop()
+    await query_log_queue.stop()
+    await last_used_tracker.stop()
+    await invalidation_bus.stop()
+    await cache_service.close()
 
 
 app = FastAPI(
@@ -47,3 +73,11 @@ app.include_router(routes.router, prefix="/v1")
 async def health_check():
     return {"status": "healthy"}
 
+
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """Ready once startup (and the optional connection warm-up) has finished"""
+    services = getattr(request.app.state, "services", None)
+    if services is None or not services.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
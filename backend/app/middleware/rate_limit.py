@@ -1,33 +1,417 @@
+import asyncio
+import logging
 import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from uuid import UUID
 from fastapi import HTTPException
-import redis.asyncio as redis
+from pydantic import BaseModel
 
 from app.config import settings
 from app.auth.types import APIKeyData
+from app.services.cache import cache_service
+from app.services.rate_limit import DailyLimitService
 
-redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+logger = logging.getLogger(__name__)
 
+# Per-minute GCRA check for the API key and daily quota check for the tenant,
+# applied atomically in one round trip. Nothing is consumed unless both pass.
+#
+# KEYS[1] per-key GCRA state: theoretical arrival time (TAT) in ms
+# KEYS[2] per-tenant daily counter
+# ARGV[1] requests per minute, ARGV[2] daily limit,
+# ARGV[3] unix time the daily counter expires, ARGV[4] cost of this request
+#
+# Returns {status, minute_remaining, reset_ms, daily_used}
+#   status 0 = allowed, 1 = per-minute limit hit, 2 = daily limit hit
+#   reset_ms is the time until the minute budget refills (retry-after when status = 1)
+RATE_LIMIT_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local rpm = tonumber(ARGV[1])
+local daily_limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[4])
 
-async def check_rate_limit(api_key_data: APIKeyData):
-    key = f"rate_limit:{api_key_data.tenant_id}:{api_key_data.key_id}"
-    window = 60
-    limit = api_key_data.rate_limit_rpm
-    
-    current_time = int(time.time())
-    window_start = current_time - window
-    
-    pipe = redis_client.pipeline()
-    pipe.zremrangebyscore(key, 0, window_start)
-    pipe.zcard(key)
-    pipe.zadd(key, {str(current_time): current_time})
-    pipe.expire(key, window + 1)
-    
-    results = await pipe.execute()
-    request_count = results[1]
-    
-    if request_count >= limit:
+local period = 60000
+local interval = period / rpm
+
+local stored_tat = redis.call('GET', KEYS[1])
+local tat = stored_tat and tonumber(stored_tat) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local stored_daily = redis.call('GET', KEYS[2])
+local daily_used = stored_daily and tonumber(stored_daily) or 0
+
+if new_tat - now > period then
+    local remaining = math.max(0, math.floor((now + period - tat) / interval))
+    return {1, remaining, math.ceil(new_tat - period - now), daily_used}
+end
+
+local minute_remaining = math.floor((now + period - new_tat) / interval)
+
+if daily_used + cost > daily_limit then
+    return {2, minute_remaining + cost, math.ceil(tat - now), daily_used}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now) + 1000)
+daily_used = redis.call('INCRBY', KEYS[2], cost)
+redis.call('EXPIREAT', KEYS[2], ARGV[3])
+
+return {0, minute_remaining, math.ceil(new_tat - now), daily_used}
+"""
+
+# Leases up to ARGV[4] tokens from both budgets at once for a replica to spend
+# locally, after first handing back ARGV[5] unused tokens from its previous lease.
+# At most ARGV[6] of them come out of the daily quota, so one replica's lease
+# can't hold a small quota hostage. Same KEYS and first three ARGV as RATE_LIMIT_LUA.
+#
+# Returns {granted, minute_remaining, reset_ms, daily_used, reason}
+#   reason 0 = full grant, 1 = limited by the per-minute budget, 2 = by the daily quota
+RATE_LIMIT_LEASE_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local rpm = tonumber(ARGV[1])
+local daily_limit = tonumber(ARGV[2])
+local want = tonumber(ARGV[4])
+local refund = tonumber(ARGV[5])
+local daily_cap = tonumber(ARGV[6])
+
+local period = 60000
+local interval = period / rpm
+
+local stored_tat = redis.call('GET', KEYS[1])
+local tat = stored_tat and tonumber(stored_tat) or now
+local stored_daily = redis.call('GET', KEYS[2])
+local daily_used = stored_daily and tonumber(stored_daily) or 0
+
+if refund > 0 then
+    tat = tat - interval * refund
+    local daily_refund = math.min(daily_used, refund)
+    if daily_refund > 0 then
+        daily_used = redis.call('DECRBY', KEYS[2], daily_refund)
+    end
+end
+if tat < now then
+    tat = now
+end
+
+local minute_available = math.max(0, math.floor((now + period - tat) / interval))
+local daily_available = math.max(0, daily_limit - daily_used)
+local available = math.min(minute_available, daily_available)
+local granted = math.min(want, available, daily_cap)
+local reason = 0
+if granted < want and available < daily_cap then
+    reason = minute_available <= daily_available and 1 or 2
+end
+
+local new_tat = tat + interval * granted
+if new_tat > now then
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now) + 1000)
+else
+    redis.call('DEL', KEYS[1])
+end
+if granted > 0 then
+    daily_used = redis.call('INCRBY', KEYS[2], granted)
+    redis.call('EXPIREAT', KEYS[2], ARGV[3])
+end
+
+local reset_ms = math.ceil(new_tat - now)
+if granted < want and reason == 1 then
+    reset_ms = math.ceil(new_tat + interval - period - now)
+end
+
+return {granted, minute_available - granted, reset_ms, daily_used, reason}
+"""
+
+
+class RateLimitStatus(BaseModel):
+    limit: int
+    remaining: int
+    reset_seconds: int
+    daily_usage: dict
+
+    def headers(self) -> dict:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_seconds),
+            "X-DailyLimit-Limit": str(self.daily_usage["limit"]),
+            "X-DailyLimit-Remaining": str(self.daily_usage["remaining"]),
+        }
+
+
+def _seconds(ms: int) -> int:
+    return max(0, -(-int(ms) // 1000))
+
+
+def _gcra_key(api_key_data: APIKeyData) -> str:
+    # Own prefix: rate_limit:{tenant}:{key} held the previous sliding-window
+    # ZSET, and replicas of both versions run side by side during a deploy
+    return f"rate_limit:gcra:{api_key_data.tenant_id}:{api_key_data.key_id}"
+
+
+def _next_midnight_utc() -> int:
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(tomorrow.timestamp())
+
+
+def _unavailable_status(limit: int) -> RateLimitStatus:
+    daily_limit = settings.MAX_QUERIES_PER_DAY
+    return RateLimitStatus(
+        limit=limit,
+        remaining=limit,
+        reset_seconds=0,
+        daily_usage={
+            "current": 0,
+            "limit": daily_limit,
+            "remaining": daily_limit,
+            "redis_available": False,
+        },
+    )
+
+
+def _build_status(limit: int, minute_remaining: int, reset_ms: int, daily_used: int) -> RateLimitStatus:
+    daily_limit = settings.MAX_QUERIES_PER_DAY
+    return RateLimitStatus(
+        limit=limit,
+        remaining=max(0, int(minute_remaining)),
+        reset_seconds=_seconds(reset_ms),
+        daily_usage={
+            "current": int(daily_used),
+            "limit": daily_limit,
+            "remaining": max(0, daily_limit - int(daily_used)),
+            "redis_available": True,
+        },
+    )
+
+
+def _raise_limit_exceeded(reason: int, rate_status: RateLimitStatus, quota_tenant_id: UUID) -> None:
+    if reason == 1:
         raise HTTPException(
             status_code=429,
-            detail=f"Rate limit exceeded. Maximum {limit} requests per minute.",
+            detail=f"Rate limit exceeded. Maximum {rate_status.limit} requests per minute.",
+            headers={**rate_status.headers(), "Retry-After": str(max(1, rate_status.reset_seconds))},
+        )
+
+    daily_used = rate_status.daily_usage["current"]
+    daily_limit = rate_status.daily_usage["limit"]
+    logger.warning(f"Daily limit exceeded for tenant {quota_tenant_id}: {daily_used}/{daily_limit}")
+    raise HTTPException(
+        status_code=429,
+        detail={
+            "error": "Daily query limit exceeded",
+            "current": daily_used,
+            "limit": daily_limit,
+            "message": f"You have reached your daily limit of {daily_limit} queries. Limit resets at midnight UTC."
+        },
+        headers=rate_status.headers(),
+    )
+
+
+class _Lease:
+    __slots__ = ("api_key_data", "tokens", "expires_at", "status")
+
+    def __init__(self, api_key_data: APIKeyData, tokens: int, expires_at: float, status: RateLimitStatus):
+        self.api_key_data = api_key_data
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.status = status
+
+
+class LeasedRateLimiter:
+    """
+    Local token budgets for high-RPM keys. Each replica leases a batch of
+    tokens (from both the per-minute budget and the daily quota) and spends
+    them without touching Redis until the batch runs out or the lease expires.
+    Unused tokens are handed back with the next lease or by the sweeper.
+    A lease takes at most RATE_LIMIT_LEASE_DAILY_SHARE of the daily quota;
+    with small quotas that means one token per lease, i.e. plain per-request
+    checks.
+
+    Trade-off: a key can be briefly over- or under-admitted by up to one
+    lease per replica. Lease sizes are set per rate_limit_rpm tier in
+    RATE_LIMIT_LEASE_TIERS.
+    """
+
+    def __init__(self):
+        self._leases: Dict[Tuple[UUID, UUID], _Lease] = {}
+        self._locks: Dict[Tuple[UUID, UUID], asyncio.Lock] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def lease_size(rate_limit_rpm: int) -> int:
+        """Tokens to lease for a key of this tier; 0 means don't lease"""
+        size = 0
+        for min_rpm, tier_size in sorted(settings.RATE_LIMIT_LEASE_TIERS.items()):
+            if rate_limit_rpm >= int(min_rpm):
+                size = tier_size
+        return size
+
+    async def _call_lease(
+        self,
+        api_key_data: APIKeyData,
+        quota_tenant_id: UUID,
+        want: int,
+        refund: int,
+        daily_cap: int = 0,
+    ) -> Tuple[int, int, RateLimitStatus]:
+        key = _gcra_key(api_key_data)
+        daily_key = DailyLimitService._get_daily_key(quota_tenant_id)
+        granted, minute_remaining, reset_ms, daily_used, reason = await cache_service.run_script(
+            RATE_LIMIT_LEASE_LUA,
+            keys=[key, daily_key],
+            args=[
+                api_key_data.rate_limit_rpm, settings.MAX_QUERIES_PER_DAY, _next_midnight_utc(),
+                want, refund, daily_cap,
+            ],
         )
+        status = _build_status(api_key_data.rate_limit_rpm, minute_remaining, reset_ms, daily_used)
+        return int(granted), int(reason), status
+
+    @staticmethod
+    def daily_cap(cost: int) -> int:
+        """Most tokens one lease may take from the daily quota (always enough for this request)"""
+        share = int(settings.MAX_QUERIES_PER_DAY * settings.RATE_LIMIT_LEASE_DAILY_SHARE)
+        return max(cost, share)
+
+    @staticmethod
+    def _local_status(lease: _Lease) -> RateLimitStatus:
+        # Tokens still held locally are spendable, so report them as remaining
+        status = lease.status.model_copy(deep=True)
+        status.remaining += lease.tokens
+        status.daily_usage["current"] = max(0, status.daily_usage["current"] - lease.tokens)
+        status.daily_usage["remaining"] += lease.tokens
+        return status
+
+    async def acquire(
+        self,
+        api_key_data: APIKeyData,
+        quota_tenant_id: UUID,
+        cost: int,
+        lease_size: int,
+    ) -> RateLimitStatus:
+        lease_key = (api_key_data.key_id, quota_tenant_id)
+
+        lease = self._leases.get(lease_key)
+        if lease and lease.expires_at > time.monotonic() and lease.tokens >= cost:
+            lease.tokens -= cost
+            return self._local_status(lease)
+
+        lock = self._locks.setdefault(lease_key, asyncio.Lock())
+        async with lock:
+            # Another request may have refilled the lease while we waited
+            lease = self._leases.get(lease_key)
+            now = time.monotonic()
+            if lease and lease.expires_at > now and lease.tokens >= cost:
+                lease.tokens -= cost
+                return self._local_status(lease)
+
+            refund = lease.tokens if lease else 0
+            self._leases.pop(lease_key, None)
+
+            try:
+                granted, reason, status = await self._call_lease(
+                    api_key_data, quota_tenant_id, max(lease_size, cost), refund, self.daily_cap(cost)
+                )
+            except Exception as e:
+                logger.error(f"Rate limit lease failed for key {api_key_data.key_id}: {e}")
+                return _unavailable_status(api_key_data.rate_limit_rpm)
+
+            if granted < cost:
+                if granted:
+                    # Not enough for this request - hand the partial grant straight back
+                    self._leases[lease_key] = _Lease(api_key_data, granted, 0.0, status)
+                _raise_limit_exceeded(reason, status, quota_tenant_id)
+
+            lease = _Lease(api_key_data, granted - cost, now + settings.RATE_LIMIT_LEASE_TTL_SECONDS, status)
+            self._leases[lease_key] = lease
+            return self._local_status(lease)
+
+    async def release_expired(self, force: bool = False) -> None:
+        """Hand unused tokens of expired (or, with force, all) leases back to Redis"""
+        now = time.monotonic()
+        for lease_key, lease in list(self._leases.items()):
+            if not force and lease.expires_at > now:
+                continue
+            self._leases.pop(lease_key, None)
+            self._locks.pop(lease_key, None)
+            if lease.tokens <= 0:
+                continue
+
+            quota_tenant_id = lease_key[1]
+            try:
+                await self._call_lease(lease.api_key_data, quota_tenant_id, 0, lease.tokens)
+            except Exception as e:
+                logger.warning(
+                    f"Failed to return {lease.tokens} leased tokens for key {lease.api_key_data.key_id}: {e}"
+                )
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(settings.RATE_LIMIT_LEASE_TTL_SECONDS)
+            await self.release_expired()
+
+    async def start(self) -> None:
+        if self._sweeper is None and settings.RATE_LIMIT_LEASE_TIERS:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        await self.release_expired(force=True)
+
+
+# Singleton instance
+leased_rate_limiter = LeasedRateLimiter()
+
+
+def max_request_cost(api_key_data: APIKeyData) -> int:
+    """
+    Largest cost a single request can ever be admitted with: more than the
+    key's per-minute budget or the daily quota would be rejected on every retry.
+    """
+    return min(api_key_data.rate_limit_rpm, settings.MAX_QUERIES_PER_DAY)
+
+
+async def enforce_rate_limits(
+    api_key_data: APIKeyData,
+    quota_tenant_id: UUID,
+    cost: int = 1,
+) -> RateLimitStatus:
+    """
+    Enforce the per-minute limit of the API key and the daily quota of
+    quota_tenant_id in one Redis round trip. Raises 429 when either is exceeded.
+    High-RPM keys spend locally leased tokens and skip Redis most of the time.
+    Fails open when Redis is unavailable.
+    """
+    lease_size = LeasedRateLimiter.lease_size(api_key_data.rate_limit_rpm)
+    if lease_size > 0:
+        return await leased_rate_limiter.acquire(api_key_data, quota_tenant_id, cost, lease_size)
+
+    limit = api_key_data.rate_limit_rpm
+    key = _gcra_key(api_key_data)
+    daily_key = DailyLimitService._get_daily_key(quota_tenant_id)
+
+    try:
+        status, minute_remaining, reset_ms, daily_used = await cache_service.run_script(
+            RATE_LIMIT_LUA,
+            keys=[key, daily_key],
+            args=[limit, settings.MAX_QUERIES_PER_DAY, _next_midnight_utc(), cost],
+        )
+    except Exception as e:
+        logger.error(f"Rate limit check failed for key {api_key_data.key_id}: {e}")
+        return _unavailable_status(limit)
+
+    rate_status = _build_status(limit, minute_remaining, reset_ms, daily_used)
+    if status != 0:
+        _raise_limit_exceeded(status, rate_status, quota_tenant_id)
 
+    return rate_status
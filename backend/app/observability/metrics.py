@@ -30,6 +30,58 @@ api_errors = Counter(
     ["endpoint", "status_code"],
 )
 
+single_flight_counter = Counter(
+    "weaver_single_flight_total",
+    "Coalesced work by role (leader did the work, followers shared it)",
+    ["name", "role"],
+)
+
+embedding_lookup_counter = Counter(
+    "weaver_embedding_lookups_total",
+    "Embedding lookups per store (redis, postgres) and result (hit, miss)",
+    ["store", "result"],
+)
+
+semantic_cache_counter = Counter(
+    "weaver_semantic_cache_lookups_total",
+    "Semantic answer cache lookups by result (hit, miss)",
+    ["result"],
+)
+
+llm_generation_cache_counter = Counter(
+    "weaver_llm_generation_cache_lookups_total",
+    "LLM generation cache lookups by result (hit, miss)",
+    ["result"],
+)
+
+retrieval_latency = Histogram(
+    "weaver_retrieval_duration_seconds",
+    "Hybrid retrieval time by outcome (used, or cancelled by a semantic cache hit)",
+    ["outcome"],
+)
+
+query_log_records_counter = Counter(
+    "weaver_query_log_records_total",
+    "Query log records by outcome (streamed, direct insert, dropped from a full buffer)",
+    ["outcome"],
+)
+
+query_log_buffer_depth = Gauge(
+    "weaver_query_log_buffer_depth",
+    "Query log records waiting in this process's local buffer",
+)
+
+query_log_stream_length = Gauge(
+    "weaver_query_log_stream_length",
+    "Entries in the query log stream not yet written by the worker (as of the last flush)",
+)
+
+context_tokens_saved = Histogram(
+    "weaver_context_tokens_saved",
+    "Estimated LLM input tokens saved per request by context packing (overlap and budget)",
+    buckets=(0, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+
 
 def setup_metrics(app: FastAPI):
     metrics_app = make_asgi_app()
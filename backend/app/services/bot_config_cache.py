@@ -0,0 +1,77 @@
+"""
+Two-tier cache of bot configs (in-process -> Redis)
+"""
+import logging
+from typing import Optional
+from uuid import UUID
+
+from app.config import settings
+from app.services.cache import cache_service, LocalTTLCache
+from app.services.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+
+class BotConfigCache:
+    """
+    Caches each tenant's bot config_json (system_prompt, business_info, ...)
+    so answering a query doesn't load the Bot row. Updates write through
+    (see set) and are broadcast on the invalidation bus, so other replicas
+    drop their local copy and re-read the new one from Redis.
+
+    Fills from the database never overwrite: a query that loaded the old row
+    must not replace a config written through while it was loading.
+    """
+
+    NAMESPACE = "botconfig"
+
+    def __init__(self):
+        self._local = LocalTTLCache(ttl=settings.BOT_CONFIG_CACHE_LOCAL_TTL)
+        # Bumped on every invalidation; a load that saw it change skips the local fill
+        self._generation = 0
+        invalidation_bus.subscribe(self.NAMESPACE, self._drop_local)
+
+    @staticmethod
+    def _key(tenant_id: UUID) -> str:
+        return f"bot_config:{tenant_id}"
+
+    @property
+    def generation(self) -> int:
+        """Take before loading from the database and hand to fill()"""
+        return self._generation
+
+    def _drop_local(self, tenant_id: Optional[str]) -> None:
+        self._generation += 1
+        if tenant_id is None:
+            self._local.clear()
+        else:
+            self._local.delete(tenant_id)
+
+    async def get(self, tenant_id: UUID) -> Optional[dict]:
+        """Cached config ({} for tenants without a bot), or None on a miss"""
+        config = self._local.get(str(tenant_id))
+        if config is not None:
+            return config
+
+        cached = await cache_service.get(self._key(tenant_id))
+        if cached is not None:
+            self._local.set(str(tenant_id), cached)
+        return cached
+
+    async def fill(self, tenant_id: UUID, config: dict, generation: int) -> None:
+        """Cache a config just read from the database, unless it may already be stale"""
+        await cache_service.add(self._key(tenant_id), config, settings.BOT_CONFIG_CACHE_TTL)
+        if generation == self._generation:
+            self._local.set(str(tenant_id), config)
+
+    async def set(self, tenant_id: UUID, config: dict) -> None:
+        """Write through an updated config and drop stale copies on every replica"""
+        # Redis first, so replicas re-reading after the broadcast get the new config
+        await cache_service.set(self._key(tenant_id), config, settings.BOT_CONFIG_CACHE_TTL)
+        await invalidation_bus.publish(self.NAMESPACE, str(tenant_id))
+        self._local.set(str(tenant_id), config)
+        logger.info(f"Updated cached bot config for tenant {tenant_id}")
+
+
+# Singleton instance
+bot_config_cache = BotConfigCache()
@@ -1,23 +1,32 @@
 """
 Centralized Redis cache service with connection pooling
 """
+import asyncio
+import fnmatch
 import hashlib
 import json
 import logging
-from typing import Optional, Any
-from redis import Redis
-from redis.exceptions import RedisError
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Awaitable, Callable, Dict, List, Tuple, Sequence, TypeVar
+import numpy as np
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, NoScriptError
 
 from app.config import settings
+from app.services.vector_codec import VectorCodecError, VectorLike, decode_vector, encode_vector
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class CacheService:
-    """Singleton Redis cache service"""
+    """Singleton asyncio Redis cache service"""
     
     _instance = None
     _redis_client: Optional[Redis] = None
+    SCAN_BATCH_SIZE = 500
     
     def __new__(cls):
         if cls._instance is None:
@@ -26,9 +35,28 @@ class CacheService:
         return cls._instance
     
     def _initialize(self):
-        """Initialize Redis connection pool"""
-        try:
-            # Create a single connection pool shared across all cache operations
+        """Set up lazy client state; the pool is created on first use"""
+        self._enabled = True
+        self._redis_client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._script_shas: Dict[str, str] = {}
+        self._l1: Optional[L1Cache] = (
+            L1Cache(settings.CACHE_L1_MAX_BYTES) if settings.CACHE_L1_ENABLED else None
+        )
+    
+    @property
+    def client(self) -> Optional[Redis]:
+        """
+        Shared client (one connection pool) for the running event loop.
+        Asyncio pools can't cross loops, so Celery tasks that call asyncio.run
+        per job get a fresh pool for their loop; they must close() it before
+        the loop ends (see run_with_cache), since a dead loop can't close it.
+        """
+        if not self._enabled:
+            return None
+        
+        loop = asyncio.get_running_loop()
+        if self._redis_client is None or self._loop is not loop:
             self._redis_client = Redis.from_url(
                 settings.REDIS_URL,
                 decode_responses=False,  # Handle encoding/decoding manually for flexibility
@@ -38,82 +66,315 @@ class CacheService:
                 retry_on_timeout=True,
                 health_check_interval=30,
             )
-            # Test connection
-            self._redis_client.ping()
+            self._loop = loop
+        return self._redis_client
+    
+    async def connect(self) -> None:
+        """Check Redis at startup; disable the cache (fail open) if it's unreachable"""
+        try:
+            await self.client.ping()
             logger.info("Redis cache service initialized successfully")
         except RedisError as e:
             logger.warning(f"Failed to connect to Redis: {e}. Cache will be disabled.")
-            self._redis_client = None
+            self._enabled = False
         except Exception as e:
             logger.error(f"Unexpected error initializing Redis: {e}. Cache will be disabled.")
-            self._redis_client = None
+            self._enabled = False
+    
+    async def close(self) -> None:
+        if self._redis_client is not None:
+            client, self._redis_client, self._loop = self._redis_client, None, None
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing Redis client: {e}")
     
     @property
     def is_available(self) -> bool:
         """Check if Redis is available"""
-        return self._redis_client is not None
+        return self._enabled
     
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+    def _l1_ttl(self, key: str) -> Optional[int]:
+        """L1 lifetime for a key's namespace, or None if the namespace isn't held locally"""
+        if self._l1 is None:
+            return None
+        return settings.CACHE_L1_NAMESPACE_TTLS.get(key.split(":", 1)[0])
+    
+    @staticmethod
+    def _decode(key: str, value: bytes) -> Optional[Any]:
+        try:
+            return json.loads(value.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logger.warning(f"Cache value decode error for key '{key}': {e}")
+            return None
+    
+    async def _get_raw(self, key: str) -> Optional[bytes]:
+        """Encoded value from L1, falling back to Redis"""
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl:
+            value = self._l1.get(key)
+            if value is not None:
+                return value
+        
         if not self.is_available:
             return None
         
         try:
-            value = self._redis_client.get(key)
-            if value:
-                # Decode bytes to string and parse JSON
-                return json.loads(value.decode('utf-8'))
-            return None
+            value = await self.client.get(key)
+            if value and l1_ttl:
+                # May outlive the Redis entry by up to l1_ttl
+                self._l1.put(key, value, l1_ttl)
+            return value or None
         except RedisError as e:
             logger.warning(f"Cache GET error for key '{key}': {e}")
             return None
-        except (json.JSONDecodeError, UnicodeDecodeError) as e:
-            logger.warning(f"Cache value decode error for key '{key}': {e}")
-            return None
     
-    def set(self, key: str, value: Any, ttl: int) -> bool:
-        """Set value in cache with TTL in seconds"""
+    async def _set_raw(self, key: str, value: bytes, ttl: int) -> bool:
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl:
+            self._l1.put(key, value, min(ttl, l1_ttl))
+        
         if not self.is_available:
             return False
         
         try:
-            # Encode value as JSON bytes
-            encoded_value = json.dumps(value).encode('utf-8')
-            self._redis_client.setex(key, ttl, encoded_value)
+            await self.client.setex(key, ttl, value)
             return True
         except RedisError as e:
             logger.warning(f"Cache SET error for key '{key}': {e}")
             return False
+    
+    async def _get_many_raw(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        """Encoded values for keys, in order: L1 hits locally, the rest in one MGET"""
+        values: List[Optional[bytes]] = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            if self._l1_ttl(key):
+                values[i] = self._l1.get(key)
+            if values[i] is None:
+                missing.append(i)
+        
+        if not missing or not self.is_available:
+            return values
+        
+        try:
+            fetched = await self.client.mget([keys[i] for i in missing])
+        except RedisError as e:
+            logger.warning(f"Cache MGET error for {len(missing)} keys: {e}")
+            return values
+        
+        for i, value in zip(missing, fetched):
+            if value:
+                l1_ttl = self._l1_ttl(keys[i])
+                if l1_ttl:
+                    self._l1.put(keys[i], value, l1_ttl)
+                values[i] = value
+        return values
+    
+    async def _set_many_raw(self, items: Dict[str, bytes], ttl: int) -> bool:
+        """SETEX every item in a single pipelined round trip"""
+        if not items:
+            return True
+        
+        for key, value in items.items():
+            l1_ttl = self._l1_ttl(key)
+            if l1_ttl:
+                self._l1.put(key, value, min(ttl, l1_ttl))
+        
+        if not self.is_available:
+            return False
+        
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, value)
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            logger.warning(f"Cache pipelined SET error for {len(items)} keys: {e}")
+            return False
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Get value from cache (L1 first, then Redis)"""
+        value = await self._get_raw(key)
+        if value is None:
+            return None
+        return self._decode(key, value)
+    
+    async def set(self, key: str, value: Any, ttl: int) -> bool:
+        """Set value in cache with TTL in seconds"""
+        try:
+            # Encode value as JSON bytes
+            encoded_value = json.dumps(value).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Cache value encode error for key '{key}': {e}")
+            return False
+        return await self._set_raw(key, encoded_value, ttl)
+    
+    async def add(self, key: str, value: Any, ttl: int) -> bool:
+        """
+        Set value only if the key doesn't exist (SET NX), for cache fills that
+        must not clobber a concurrent write-through. Redis only, bypassing L1.
+        """
+        if not self.is_available:
+            return False
+        try:
+            return bool(await self.client.set(key, json.dumps(value).encode('utf-8'), ex=ttl, nx=True))
         except (TypeError, ValueError) as e:
             logger.warning(f"Cache value encode error for key '{key}': {e}")
             return False
+        except RedisError as e:
+            logger.warning(f"Cache SET NX error for key '{key}': {e}")
+            return False
     
-    def delete(self, key: str) -> bool:
+    async def get_vector(self, key: str) -> Optional[np.ndarray]:
+        """Get a vector stored with set_vector, as a float32 array"""
+        value = await self._get_raw(key)
+        if value is None:
+            return None
+        try:
+            return decode_vector(value)
+        except VectorCodecError as e:
+            # e.g. an entry written as a JSON list before the binary codec
+            logger.debug(f"Cache vector decode error for key '{key}': {e}")
+            return None
+    
+    async def set_vector(self, key: str, vector: VectorLike, ttl: int) -> bool:
+        """Store a vector in the packed binary format instead of JSON"""
+        try:
+            encoded_value = encode_vector(vector, settings.EMBEDDING_CACHE_DTYPE)
+        except ValueError as e:
+            logger.warning(f"Cache vector encode error for key '{key}': {e}")
+            return False
+        return await self._set_raw(key, encoded_value, ttl)
+    
+    async def get_swr(self, key: str, stale_margin: float = 0) -> Tuple[Optional[Any], bool]:
+        """
+        (value, stale) for an entry written with set_swr. Stale entries are past
+        their soft TTL (or within stale_margin seconds of it) but still usable
+        while the caller refreshes them.
+        """
+        return self._unwrap_swr(await self.get(key), stale_margin)
+    
+    async def get_swr_many(
+        self, keys: Sequence[str], stale_margin: float = 0
+    ) -> List[Tuple[Optional[Any], bool]]:
+        """Batch version of get_swr (one MGET)"""
+        return [self._unwrap_swr(value, stale_margin) for value in await self.get_many(keys)]
+    
+    @staticmethod
+    def _unwrap_swr(value: Optional[Any], stale_margin: float) -> Tuple[Optional[Any], bool]:
+        if value is None:
+            return None, False
+        if isinstance(value, dict) and "swr_fresh_until" in value:
+            return value["value"], time.time() + stale_margin >= value["swr_fresh_until"]
+        return value, False
+    
+    async def set_swr(self, key: str, value: Any, soft_ttl: int, hard_ttl: int) -> bool:
+        """Set a value that turns stale after soft_ttl and disappears after hard_ttl"""
+        envelope = {"value": value, "swr_fresh_until": time.time() + soft_ttl}
+        return await self.set(key, envelope, max(soft_ttl, hard_ttl))
+    
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        """Get several values at once; misses are None, in the order of keys"""
+        values = await self._get_many_raw(keys)
+        return [
+            self._decode(key, value) if value is not None else None
+            for key, value in zip(keys, values)
+        ]
+    
+    async def set_many(self, items: Dict[str, Any], ttl: int) -> bool:
+        """Set several values with the same TTL in one round trip"""
+        encoded = {}
+        for key, value in items.items():
+            try:
+                encoded[key] = json.dumps(value).encode('utf-8')
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Cache value encode error for key '{key}': {e}")
+        return await self._set_many_raw(encoded, ttl)
+    
+    async def get_vectors(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Batch version of get_vector"""
+        vectors = []
+        for key, value in zip(keys, await self._get_many_raw(keys)):
+            try:
+                vectors.append(decode_vector(value) if value is not None else None)
+            except VectorCodecError as e:
+                logger.debug(f"Cache vector decode error for key '{key}': {e}")
+                vectors.append(None)
+        return vectors
+    
+    async def set_vectors(self, items: Dict[str, VectorLike], ttl: int) -> bool:
+        """Batch version of set_vector"""
+        encoded = {}
+        for key, vector in items.items():
+            try:
+                encoded[key] = encode_vector(vector, settings.EMBEDDING_CACHE_DTYPE)
+            except ValueError as e:
+                logger.warning(f"Cache vector encode error for key '{key}': {e}")
+        return await self._set_many_raw(encoded, ttl)
+    
+    async def delete(self, key: str) -> bool:
         """Delete value from cache"""
+        if self._l1 is not None:
+            self._l1.delete(key)
+        
         if not self.is_available:
             return False
         
         try:
-            self._redis_client.delete(key)
+            await self.client.delete(key)
             return True
         except RedisError as e:
             logger.warning(f"Cache DELETE error for key '{key}': {e}")
             return False
     
-    def clear_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern. Returns number of keys deleted."""
+    async def clear_pattern(self, pattern: str) -> int:
+        """
+        Delete all keys matching pattern. Returns number of keys deleted.
+        Walks the keyspace with SCAN and UNLINKs in batches, so Redis is never
+        blocked the way KEYS would block it. Prefer versioned keys over this.
+        """
+        if self._l1 is not None:
+            self._l1.delete_matching(pattern)
+        
         if not self.is_available:
             return 0
         
         try:
-            keys = self._redis_client.keys(pattern)
-            if keys:
-                return self._redis_client.delete(*keys)
-            return 0
+            deleted = 0
+            batch = []
+            async for key in self.client.scan_iter(match=pattern, count=self.SCAN_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= self.SCAN_BATCH_SIZE:
+                    deleted += await self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await self.client.unlink(*batch)
+            return deleted
         except RedisError as e:
             logger.warning(f"Cache CLEAR error for pattern '{pattern}': {e}")
             return 0
     
+    async def run_script(self, script: str, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        """
+        Run a Lua script via EVALSHA, loading it on first use.
+        Unlike the cache helpers this raises RedisError, so callers choose how to fail.
+        """
+        if not self.is_available:
+            raise RedisError("Redis cache is disabled")
+        
+        client = self.client
+        sha = self._script_shas.get(script)
+        if sha is None:
+            sha = hashlib.sha1(script.encode()).hexdigest()
+            self._script_shas[script] = sha
+        try:
+            return await client.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            self._script_shas[script] = await client.script_load(script)
+            return await client.evalsha(self._script_shas[script], len(keys), *keys, *args)
+    
     @staticmethod
     def generate_key(prefix: str, *args) -> str:
         """Generate a consistent cache key from prefix and arguments"""
@@ -123,14 +384,16 @@ class CacheService:
         key_hash = hashlib.md5(key_string.encode()).hexdigest()
         return f"{prefix}:{key_hash}"
     
-    def get_stats(self) -> dict:
-        """Get Redis cache statistics"""
+    async def get_stats(self) -> dict:
+        """Get L1 and Redis cache statistics"""
+        stats = {"l1": self._l1.stats() if self._l1 is not None else {"enabled": False}}
         if not self.is_available:
-            return {"available": False}
+            return {**stats, "available": False}
         
         try:
-            info = self._redis_client.info("stats")
+            info = await self.client.info("stats")
             return {
+                **stats,
                 "available": True,
                 "total_connections": info.get("total_connections_received", 0),
                 "total_commands": info.get("total_commands_processed", 0),
@@ -143,7 +406,7 @@ class CacheService:
             }
         except RedisError as e:
             logger.warning(f"Failed to get cache stats: {e}")
-            return {"available": False, "error": str(e)}
+            return {**stats, "available": False, "error": str(e)}
     
     @staticmethod
     def _calculate_hit_rate(hits: int, misses: int) -> float:
@@ -154,6 +417,217 @@ class CacheService:
         return round((hits / total) * 100, 2)
 
 
+class LocalTTLCache:
+    """
+    Small in-process TTL cache for hot, tiny values (verified keys, profiles).
+    Not shared across replicas - pair it with Redis and the invalidation bus.
+    """
+    
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 10000,
+        on_evict: Optional[Callable[[str, Any], None]] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Called with (key, value) when an entry expires or is pushed out,
+        # so owners can clean up any index they keep next to the cache
+        self.on_evict = on_evict
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+    
+    def _evicted(self, key: str, value: Any) -> None:
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+    
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            self._evicted(key, value)
+            return None
+        return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            # Drop the oldest insertion; dicts preserve insertion order
+            oldest = next(iter(self._entries))
+            _, oldest_value = self._entries.pop(oldest)
+            self._evicted(oldest, oldest_value)
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+    
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+    
+    def clear(self) -> None:
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FrequencySketch:
+    """
+    Count-min sketch of recent access frequency for TinyLFU admission.
+    Counters saturate at 15 and are all halved every `sample_size` accesses,
+    so keys that were hot an hour ago don't stay "hot" forever.
+    """
+    
+    DEPTH = 4
+    MAX_COUNT = 15
+    _HALVE = bytes(i >> 1 for i in range(256))
+    
+    def __init__(self, width: int = 1 << 16, sample_size: Optional[int] = None):
+        if width & (width - 1):
+            raise ValueError("width must be a power of two")
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(self.DEPTH)]
+        self._sample_size = sample_size or 10 * width
+        self._additions = 0
+    
+    def _indexes(self, key: str) -> List[int]:
+        # Double hashing from one 64-bit hash; str hashes are stable within a process
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) & self._mask for i in range(self.DEPTH)]
+    
+    def increment(self, key: str) -> None:
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._rows = [bytearray(row.translate(self._HALVE)) for row in self._rows]
+            self._additions //= 2
+    
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+
+class L1Cache:
+    """
+    Per-process cache of encoded values, bounded by total bytes.
+    LRU order picks eviction victims; TinyLFU admission only lets a new key in
+    if it has been requested more often than the entries it would push out,
+    so a burst of one-off queries can't flush the hot set.
+    """
+    
+    def __init__(self, max_bytes: int, sketch: Optional[FrequencySketch] = None):
+        self.max_bytes = max_bytes
+        self._sketch = sketch or FrequencySketch()
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+    
+    @staticmethod
+    def _size(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+    
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= self._size(key, entry[1])
+    
+    def get(self, key: str) -> Optional[bytes]:
+        self._sketch.increment(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store a value unless admission rejects it. Returns whether it was stored."""
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            self.rejections += 1
+            return False
+        
+        # Updates of resident keys are always admitted (they only make room)
+        resident = key in self._entries
+        self._remove(key)
+        
+        needed = self._bytes + size - self.max_bytes
+        if needed > 0:
+            now = time.monotonic()
+            candidate_frequency = self._sketch.estimate(key)
+            victims = []
+            for victim_key, (expires_at, victim_value) in self._entries.items():
+                if needed <= 0:
+                    break
+                if (
+                    not resident
+                    and expires_at > now
+                    and self._sketch.estimate(victim_key) >= candidate_frequency
+                ):
+                    self.rejections += 1
+                    return False
+                victims.append(victim_key)
+                needed -= self._size(victim_key, victim_value)
+            for victim_key in victims:
+                self._remove(victim_key)
+                self.evictions += 1
+        
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._bytes += size
+        return True
+    
+    def delete(self, key: str) -> None:
+        self._remove(key)
+    
+    def delete_matching(self, pattern: str) -> None:
+        for key in [k for k in self._entries if fnmatch.fnmatchcase(k, pattern)]:
+            self._remove(key)
+    
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+            "hit_rate": CacheService._calculate_hit_rate(self.hits, self.misses),
+        }
+
+
 # Singleton instance
 cache_service = CacheService()
 
+
+def run_with_cache(coro: Awaitable[T]) -> T:
+    """
+    asyncio.run for code outside the API process (Celery tasks, scripts):
+    the loop's Redis pool is closed before the loop goes away instead of
+    being orphaned with its sockets.
+    """
+    async def main() -> T:
+        try:
+            return await coro
+        finally:
+            await cache_service.close()
+    
+    return asyncio.run(main())
+
@@ -0,0 +1,109 @@
+"""
+Pre-computes answers for each tenant's most frequent questions
+"""
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.connection import AsyncSessionLocal
+from app.db.repositories import AnalyticsRepository
+from app.services.cache import cache_service
+from app.services.query import QueryService
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmingService:
+    """
+    Keeps the answer cache warm for each active tenant's top queries: answers
+    that are missing, or would turn stale before the next run, are recomputed.
+    Recomputations are limited by a daily per-tenant budget
+    (CACHE_WARM_DAILY_BUDGET); most are semantic-cache hits, but each one is
+    counted as if it needed the LLM.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.analytics_repo = AnalyticsRepository(session_factory=session_factory)
+        self.query_service = QueryService(session_factory=session_factory)
+
+    @staticmethod
+    def _budget_key(tenant_id: UUID) -> str:
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        return f"cache_warm_budget:{tenant_id}:{today}"
+
+    @staticmethod
+    def _stats_key(tenant_id: UUID) -> str:
+        return f"cache_warm_stats:{tenant_id}"
+
+    async def _take_budget(self, tenant_id: UUID) -> bool:
+        key = self._budget_key(tenant_id)
+        async with cache_service.client.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 2 * 24 * 3600)
+            used, _ = await pipe.execute()
+        return used <= settings.CACHE_WARM_DAILY_BUDGET
+
+    async def warm_tenant(self, tenant_id: UUID) -> dict:
+        """Warm one tenant and report how many of its top queries were already warm"""
+        stats = {
+            "tenant_id": str(tenant_id),
+            "queries": 0,
+            "already_warm": 0,
+            "warmed": 0,
+            "over_budget": 0,
+            "failed": 0,
+            "warm_hit_ratio": 0.0,
+        }
+        if not cache_service.is_available:
+            return stats
+
+        since = datetime.now(timezone.utc) - timedelta(days=settings.CACHE_WARM_ACTIVE_DAYS)
+        top_queries = await self.analytics_repo.get_top_queries(
+            tenant_id, limit=settings.CACHE_WARM_TOP_N, since=since
+        )
+
+        # Several raw spellings can share one normalized cache key
+        queries = list(dict.fromkeys(q["query"].lower().strip() for q in top_queries))
+        stats["queries"] = len(queries)
+
+        for query in queries:
+            # Anything that would go stale before the next run counts as cold
+            if await self.query_service.is_answer_cached(
+                tenant_id, query, fresh_for=settings.CACHE_WARM_INTERVAL_SECONDS
+            ):
+                stats["already_warm"] += 1
+                continue
+
+            try:
+                if not await self._take_budget(tenant_id):
+                    stats["over_budget"] += 1
+                    continue
+                await self.query_service.precompute_answer(tenant_id, query)
+                stats["warmed"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.warning(f"Cache warm failed for tenant:{tenant_id}: {e}")
+
+        if stats["queries"]:
+            stats["warm_hit_ratio"] = round(stats["already_warm"] / stats["queries"] * 100, 2)
+        logger.info(
+            f"Cache warm - tenant:{tenant_id} | queries:{stats['queries']} | "
+            f"already_warm:{stats['already_warm']} | warmed:{stats['warmed']} | "
+            f"over_budget:{stats['over_budget']} | warm_hit_ratio:{stats['warm_hit_ratio']}%"
+        )
+
+        # Last run per tenant, for whoever wants to check the effect of warming
+        await cache_service.set(
+            self._stats_key(tenant_id), {**stats, "at": time.time()}, 24 * 3600
+        )
+        return stats
+
+    async def warm_active_tenants(self) -> List[dict]:
+        since = datetime.now(timezone.utc) - timedelta(days=settings.CACHE_WARM_ACTIVE_DAYS)
+        tenant_ids = await self.analytics_repo.get_active_tenant_ids(since)
+        return [await self.warm_tenant(tenant_id) for tenant_id in tenant_ids]
@@ -0,0 +1,116 @@
+"""
+Long-lived services shared by every request (built once per process)
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.connection import AsyncSessionLocal
+from app.db.repositories import (
+    AnalyticsRepository,
+    APIKeyRepository,
+    BotRepository,
+    DocumentRepository,
+    ProfileRepository,
+    TenantRepository,
+)
+from app.services.cache import cache_service
+from app.services.ingestion import IngestionService
+from app.services.prompt_generator import PromptGeneratorService
+from app.services.query import QueryService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ServiceContainer:
+    """
+    Services and repositories for the API. Building them per request created
+    new provider clients (and their HTTP connection pools) on every query;
+    the container is built in the app lifespan and handed to routes through
+    the get_services dependency.
+    """
+    query_service: QueryService
+    ingestion_service: IngestionService
+    prompt_generator: PromptGeneratorService
+    profile_repo: ProfileRepository
+    tenant_repo: TenantRepository
+    bot_repo: BotRepository
+    doc_repo: DocumentRepository
+    api_key_repo: APIKeyRepository
+    analytics_repo: AnalyticsRepository
+    ready: bool = field(default=False)
+
+    # Startup never waits longer than this for warm-up
+    WARMUP_TIMEOUT_SECONDS = 10.0
+
+    @classmethod
+    def build(cls, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal) -> "ServiceContainer":
+        return cls(
+            query_service=QueryService(session_factory=session_factory),
+            ingestion_service=IngestionService(),
+            prompt_generator=PromptGeneratorService(),
+            profile_repo=ProfileRepository(),
+            tenant_repo=TenantRepository(),
+            bot_repo=BotRepository(session_factory=session_factory),
+            doc_repo=DocumentRepository(session_factory=session_factory),
+            api_key_repo=APIKeyRepository(),
+            analytics_repo=AnalyticsRepository(session_factory=session_factory),
+        )
+
+    async def warm_up(self) -> None:
+        """
+        Open a DB connection, a Redis connection and the embedding and chat
+        provider connections before the replica reports ready, so the first
+        queries don't pay for connection setup. Failures are logged, never fatal.
+        """
+        started = time.time()
+
+        async def database() -> None:
+            async with AsyncSessionLocal() as session:
+                await session.execute(text("SELECT 1"))
+
+        async def redis() -> None:
+            if cache_service.is_available:
+                await cache_service.client.ping()
+
+        async def embeddings() -> None:
+            # Straight to the provider client: through EmbeddingService this
+            # would be a cache hit on every boot after the first
+            embedding_service = self.query_service.retrieval_service.embedding_service
+            await embedding_service.embeddings.aembed_query(
+                "ping", output_dimensionality=embedding_service.DIMENSIONS
+            )
+
+        async def chat() -> None:
+            await self.query_service.llm_service.llm.ainvoke("Reply with OK.")
+
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(database(), redis(), embeddings(), chat(), return_exceptions=True),
+                timeout=self.WARMUP_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Service warm-up timed out after {self.WARMUP_TIMEOUT_SECONDS}s")
+            return
+        for name, result in zip(("database", "redis", "embeddings", "chat"), results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up of {name} connection failed: {result}")
+
+        logger.info(f"Service warm-up finished in {int((time.time() - started) * 1000)}ms")
+
+
+def get_services(request: Request) -> ServiceContainer:
+    """FastAPI dependency returning the process-wide service container"""
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        # Lifespan didn't run (e.g. a TestClient used without `with`)
+        services = ServiceContainer.build()
+        request.app.state.services = services
+    return services
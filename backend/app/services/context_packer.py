@@ -0,0 +1,107 @@
+"""
+Packs retrieved chunks into the LLM context: neighbours are merged without
+their overlapping text, then passages are fitted into a token budget.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+# Same rule of thumb as the chunker settings (1000 chars ~ 250 tokens)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _overlap_length(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`"""
+    for length in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+@dataclass
+class PackResult:
+    passages: List[dict]
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+
+def _merge_neighbours(chunks: List[dict], max_overlap: int) -> List[Tuple[int, dict]]:
+    """
+    Merge runs of consecutive chunk_index from the same document. Returns
+    (rank, passage) pairs; a passage ranks as well as its best chunk.
+    """
+    by_doc: Dict[Optional[str], List[Tuple[int, dict]]] = {}
+    for rank, chunk in enumerate(chunks):
+        by_doc.setdefault(chunk.get("doc_id"), []).append((rank, chunk))
+
+    passages = []
+    for doc_chunks in by_doc.values():
+        doc_chunks.sort(key=lambda item: (item[1].get("chunk_index") is None, item[1].get("chunk_index") or 0))
+        current_rank, current = None, None
+        for rank, chunk in doc_chunks:
+            index = chunk.get("chunk_index")
+            if (
+                current is not None
+                and index is not None
+                and current["last_chunk_index"] is not None
+                and index == current["last_chunk_index"] + 1
+            ):
+                overlap = _overlap_length(current["text"], chunk["text"], max_overlap)
+                separator = "" if overlap else "\n"
+                current["text"] = current["text"] + separator + chunk["text"][overlap:]
+                current["last_chunk_index"] = index
+                current["similarity"] = max(current.get("similarity", 0.0), chunk.get("similarity", 0.0))
+                current_rank = min(current_rank, rank)
+                continue
+
+            if current is not None:
+                passages.append((current_rank, current))
+            current_rank = rank
+            current = {**chunk, "last_chunk_index": index}
+        if current is not None:
+            passages.append((current_rank, current))
+
+    passages.sort(key=lambda item: item[0])
+    return passages
+
+
+def pack_context(
+    chunks: List[dict],
+    token_budget: int,
+    max_overlap: int = None,
+) -> PackResult:
+    """
+    Merge adjacent chunks of the same document (dropping the text they share
+    from chunking overlap) and keep the best-ranked passages that fit in
+    `token_budget`. The top passage is truncated rather than dropped if it
+    alone is over budget.
+    """
+    if max_overlap is None:
+        # Splitters may overlap by a little more than configured at word boundaries
+        max_overlap = settings.CHUNK_OVERLAP * 2
+
+    tokens_before = sum(estimate_tokens(chunk["text"]) for chunk in chunks)
+
+    packed: List[dict] = []
+    used = 0
+    for _, passage in _merge_neighbours(chunks, max_overlap):
+        tokens = estimate_tokens(passage["text"])
+        if used + tokens > token_budget:
+            if packed:
+                # A smaller passage further down may still fit
+                continue
+            passage["text"] = passage["text"][: token_budget * CHARS_PER_TOKEN]
+            tokens = estimate_tokens(passage["text"])
+        packed.append(passage)
+        used += tokens
+
+    return PackResult(passages=packed, tokens_before=tokens_before, tokens_after=used)
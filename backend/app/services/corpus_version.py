@@ -0,0 +1,75 @@
+"""
+Per-tenant corpus generation counter for cache keys
+"""
+import logging
+from typing import Optional
+from uuid import UUID
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.cache import cache_service, LocalTTLCache
+from app.services.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusVersionService:
+    """
+    Every answer or retrieval cache key embeds the tenant's corpus version.
+    Bumping the version when documents change orphans all of the tenant's
+    cached entries at once (they age out via their TTL) - no KEYS/SCAN needed.
+    """
+
+    NAMESPACE = "corpus"
+
+    def __init__(self):
+        # Read on every query; bumps are broadcast, so a short local TTL is safe
+        self._local = LocalTTLCache(ttl=settings.CORPUS_VERSION_LOCAL_TTL)
+        invalidation_bus.subscribe(self.NAMESPACE, self._drop_local)
+
+    @staticmethod
+    def _key(tenant_id: UUID) -> str:
+        return f"corpus_version:{tenant_id}"
+
+    def _drop_local(self, tenant_id: Optional[str]) -> None:
+        if tenant_id is None:
+            self._local.clear()
+        else:
+            self._local.delete(tenant_id)
+
+    async def get(self, tenant_id: UUID) -> int:
+        """Current version (0 for tenants that never changed, or without Redis)"""
+        version = self._local.get(str(tenant_id))
+        if version is not None:
+            return version
+
+        if not cache_service.is_available:
+            return 0
+
+        try:
+            stored = await cache_service.client.get(self._key(tenant_id))
+        except RedisError as e:
+            logger.warning(f"Failed to read corpus version for tenant {tenant_id}: {e}")
+            return 0
+
+        version = int(stored) if stored else 0
+        self._local.set(str(tenant_id), version)
+        return version
+
+    async def bump(self, tenant_id: UUID) -> Optional[int]:
+        """Start a new corpus generation after documents were added, replaced or removed"""
+        version = None
+        if cache_service.is_available:
+            try:
+                version = await cache_service.client.incr(self._key(tenant_id))
+                logger.info(f"Corpus version for tenant {tenant_id} is now {version}")
+            except RedisError as e:
+                logger.warning(f"Failed to bump corpus version for tenant {tenant_id}: {e}")
+
+        await invalidation_bus.publish(self.NAMESPACE, str(tenant_id))
+        return version
+
+
+# Singleton instance
+corpus_version_service = CorpusVersionService()
@@ -1,83 +1,172 @@
-from typing import List
+import hashlib
+import logging
+from typing import Callable, Dict, List
+
+import numpy as np
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
+from app.db.connection import AsyncSessionLocal
+from app.db.repositories import EmbeddingStoreRepository
+from app.observability.metrics import embedding_lookup_counter
 from app.services.cache import cache_service
 
+logger = logging.getLogger(__name__)
+
 
 class EmbeddingService:
-    def __init__(self):
+    MODEL = "models/gemini-embedding-001"
+    DIMENSIONS = 1536
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
         self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
+            model=self.MODEL,
             google_api_key=settings.GOOGLE_API_KEY,
             task_type="retrieval_document",
         )
+        self.store = EmbeddingStoreRepository(session_factory=session_factory)
         self.cache_ttl = 3600  # 1 hour cache
     
-    async def embed_text(self, text: str) -> List[float]:
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Address of a text's embedding: sha256 of the exact text (case and whitespace matter)"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _cache_key(self, content_hash: str) -> str:
+        # Model and dimensions are part of the address so a model change never serves old vectors
+        return f"emb:{self.MODEL.rsplit('/', 1)[-1]}:{self.DIMENSIONS}:{content_hash}"
+    
+    async def embed_query_vector(self, text: str) -> np.ndarray:
+        """Embedding as a float32 array, ready to bind as a pgvector parameter"""
         try:
-            # Try cache first
-            cache_key = cache_service.generate_key("emb", text.lower().strip())
-            cached = cache_service.get(cache_key)
-            if cached:
+            # Try cache first (queries are not kept in the durable store)
+            cache_key = self._cache_key(self.content_hash(text))
+            cached = await cache_service.get_vector(cache_key)
+            embedding_lookup_counter.labels(
+                store="redis", result="miss" if cached is None else "hit"
+            ).inc()
+            if cached is not None:
                 return cached
             
             # Generate embedding
             embedding = await self.embeddings.aembed_query(
                 text,
-                output_dimensionality=1536
+                output_dimensionality=self.DIMENSIONS
             )
             
-            # Cache for future use
-            cache_service.set(cache_key, embedding, self.cache_ttl)
+            # Cache for future use (packed binary, not a JSON float list)
+            await cache_service.set_vector(cache_key, embedding, self.cache_ttl)
             
-            return embedding
+            return np.asarray(embedding, dtype=np.float32)
         except Exception as e:
             raise Exception(f"Embedding generation failed: {str(e)}")
     
+    async def embed_query_vectors(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Batch version of embed_query_vector: one MGET, then one provider call
+        for every text that wasn't cached (queries skip the durable store).
+        """
+        try:
+            keys = [self._cache_key(self.content_hash(text)) for text in texts]
+            vectors = await cache_service.get_vectors(keys)
+            hits = sum(vector is not None for vector in vectors)
+            embedding_lookup_counter.labels(store="redis", result="hit").inc(hits)
+            embedding_lookup_counter.labels(store="redis", result="miss").inc(len(texts) - hits)
+            
+            # One provider call per distinct uncached text
+            missing = list(dict.fromkeys(
+                text for text, vector in zip(texts, vectors) if vector is None
+            ))
+            if missing:
+                new_embeddings = await self.embeddings.aembed_documents(
+                    missing,
+                    output_dimensionality=self.DIMENSIONS
+                )
+                generated = {
+                    text: np.asarray(emb, dtype=np.float32)
+                    for text, emb in zip(missing, new_embeddings)
+                }
+                await cache_service.set_vectors(
+                    {self._cache_key(self.content_hash(text)): emb for text, emb in generated.items()},
+                    self.cache_ttl,
+                )
+                vectors = [
+                    vector if vector is not None else generated[text]
+                    for text, vector in zip(texts, vectors)
+                ]
+            
+            return vectors
+        except Exception as e:
+            raise Exception(f"Batch embedding generation failed: {str(e)}")
+    
+    async def embed_text(self, text: str) -> List[float]:
+        return (await self.embed_query_vector(text)).tolist()
+    
+    async def _load_from_store(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            return await self.store.get_many(hashes, self.MODEL, self.DIMENSIONS)
+        except Exception as e:
+            # The provider can still serve the batch
+            logger.warning(f"Embedding store lookup failed: {e}")
+            return {}
+    
+    async def _save_to_store(self, embeddings: Dict[str, List[float]]) -> None:
+        try:
+            await self.store.put_many(embeddings, self.MODEL, self.DIMENSIONS)
+        except Exception as e:
+            logger.warning(f"Embedding store write failed: {e}")
+    
     async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Resolve each text through Redis, then the durable embedding store, then
+        the provider. Vectors are addressed by content hash, so re-ingesting a
+        document (or another tenant uploading the same text) only embeds chunks
+        that were never seen before.
+        """
         try:
-            # Check cache for each text first
-            cached_embeddings = []
-            uncached_texts = []
-            uncached_indices = []
+            hashes = [self.content_hash(text) for text in texts]
             
-            for i, text in enumerate(texts):
-                cache_key = cache_service.generate_key("emb", text.lower().strip())
-                cached = cache_service.get(cache_key)
-                if cached:
-                    cached_embeddings.append((i, cached))
-                else:
-                    uncached_texts.append(text)
-                    uncached_indices.append(i)
+            # 1. Redis: one MGET for the whole batch
+            cached = await cache_service.get_vectors([self._cache_key(h) for h in hashes])
+            found: Dict[str, np.ndarray] = {
+                h: vector for h, vector in zip(hashes, cached) if vector is not None
+            }
+            missing = list(dict.fromkeys(h for h in hashes if h not in found))
+            embedding_lookup_counter.labels(store="redis", result="hit").inc(len(found))
+            embedding_lookup_counter.labels(store="redis", result="miss").inc(len(missing))
             
-            # Generate embeddings only for uncached texts
-            if uncached_texts:
+            # 2. Durable store for whatever Redis has forgotten
+            if missing:
+                stored = await self._load_from_store(missing)
+                embedding_lookup_counter.labels(store="postgres", result="hit").inc(len(stored))
+                embedding_lookup_counter.labels(store="postgres", result="miss").inc(len(missing) - len(stored))
+                if stored:
+                    await cache_service.set_vectors(
+                        {self._cache_key(h): vector for h, vector in stored.items()},
+                        self.cache_ttl,
+                    )
+                    found.update(stored)
+                    missing = [h for h in missing if h not in stored]
+            
+            # 3. Provider, once per distinct text
+            if missing:
+                text_by_hash = dict(zip(hashes, texts))
                 new_embeddings = await self.embeddings.aembed_documents(
-                    uncached_texts,
-                    output_dimensionality=1536
+                    [text_by_hash[h] for h in missing],
+                    output_dimensionality=self.DIMENSIONS
                 )
+                generated = dict(zip(missing, new_embeddings))
                 
-                # Cache new embeddings
-                for text, embedding in zip(uncached_texts, new_embeddings):
-                    cache_key = cache_service.generate_key("emb", text.lower().strip())
-                    cache_service.set(cache_key, embedding, self.cache_ttl)
-                
-                # Merge cached and new embeddings in correct order
-                result = [None] * len(texts)
-                for i, emb in cached_embeddings:
-                    result[i] = emb
-                for i, emb in zip(uncached_indices, new_embeddings):
-                    result[i] = emb
-                
-                return result
+                await self._save_to_store(generated)
+                # Cache new embeddings in one pipelined round trip
+                await cache_service.set_vectors(
+                    {self._cache_key(h): emb for h, emb in generated.items()},
+                    self.cache_ttl,
+                )
+                found.update(generated)
             
-            # All cached - reconstruct in order
-            result = [None] * len(texts)
-            for i, emb in cached_embeddings:
-                result[i] = emb
-            return result
+            return [np.asarray(found[h], dtype=np.float32).tolist() for h in hashes]
             
         except Exception as e:
             raise Exception(f"Batch embedding generation failed: {str(e)}")
-
@@ -1,3 +1,4 @@
+import asyncio
 from uuid import UUID
 from fastapi import UploadFile
 
@@ -27,7 +28,9 @@ class IngestionService:
         # Upload to GCS using S3-compatible API
         gcs_path = f"{tenant_id}/docs/{file.filename}"
         
-        StorageService.upload_file(
+        # boto3 and the Celery producer are blocking - keep them off the event loop
+        await asyncio.to_thread(
+            StorageService.upload_file,
             bucket_name=settings.GCS_BUCKET_NAME,
             key=gcs_path,
             content=content,
@@ -42,7 +45,7 @@ class IngestionService:
         )
 
         try:
-            process_document.delay(str(doc_id), str(tenant_id), gcs_path)
+            await asyncio.to_thread(process_document.delay, str(doc_id), str(tenant_id), gcs_path)
         except Exception as e:
             # If enqueueing to Celery fails, mark document as failed instead of leaving it pending
             await self.doc_repo.update_status(doc_id, "failed", f"Enqueue error: {e}")
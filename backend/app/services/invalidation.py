@@ -0,0 +1,104 @@
+"""
+Cross-replica cache invalidation over Redis pub/sub
+"""
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, List, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Handlers receive the invalidated key, or None when every entry in the
+# namespace must be dropped (e.g. after the subscription was interrupted and
+# messages may have been missed).
+InvalidationHandler = Callable[[Optional[str]], None]
+
+
+class InvalidationBus:
+    """Publishes and applies invalidations for in-process caches on every replica"""
+
+    CHANNEL = "weaver:invalidate"
+    RECONNECT_DELAY_SECONDS = 1.0
+
+    def __init__(self):
+        self._handlers: Dict[str, List[InvalidationHandler]] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, namespace: str, handler: InvalidationHandler) -> None:
+        """Register a local handler for a namespace"""
+        self._handlers.setdefault(namespace, []).append(handler)
+
+    def _apply(self, namespace: str, key: Optional[str]) -> None:
+        for handler in self._handlers.get(namespace, []):
+            try:
+                handler(key)
+            except Exception as e:
+                logger.error(f"Invalidation handler failed for '{namespace}': {e}")
+
+    def _apply_all(self) -> None:
+        for namespace in self._handlers:
+            self._apply(namespace, None)
+
+    async def publish(self, namespace: str, key: Optional[str]) -> None:
+        """Invalidate locally right away, then tell the other replicas"""
+        self._apply(namespace, key)
+        if not cache_service.is_available:
+            return
+
+        try:
+            await cache_service.client.publish(
+                self.CHANNEL, json.dumps({"ns": namespace, "key": key})
+            )
+        except RedisError as e:
+            # Other replicas fall back to their local TTLs
+            logger.warning(f"Failed to publish invalidation for '{namespace}': {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            # Dedicated connection: the shared pool's socket_timeout would cut idle subscriptions
+            subscriber = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=5)
+            pubsub = subscriber.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                # Anything cached while we were disconnected may be stale
+                self._apply_all()
+                async for message in pubsub.listen():
+                    try:
+                        payload = json.loads(message["data"])
+                        self._apply(payload["ns"], payload.get("key"))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"Ignoring malformed invalidation message: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Invalidation subscription lost: {e}. Reconnecting.")
+                await asyncio.sleep(self.RECONNECT_DELAY_SECONDS)
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await subscriber.aclose()
+                except Exception:
+                    pass
+
+    async def start(self) -> None:
+        if self._listener is None and cache_service.is_available:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+# Singleton instance
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,76 @@
+"""
+Write-behind buffer for API key last_used_at timestamps
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from uuid import UUID
+
+from app.config import settings
+from app.db.repositories import APIKeyRepository
+
+logger = logging.getLogger(__name__)
+
+
+class LastUsedTracker:
+    """
+    Records key usage in memory and flushes the latest timestamp per key in a
+    single batched UPDATE every API_KEY_LAST_USED_FLUSH_SECONDS. last_used_at
+    is therefore stale by at most one flush interval.
+    """
+
+    def __init__(self):
+        self._pending: Dict[UUID, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._api_key_repo = APIKeyRepository()
+
+    def record(self, key_id: UUID) -> None:
+        """Note a use of the key. Costs no I/O; later uses overwrite earlier ones."""
+        self._pending[key_id] = datetime.now(timezone.utc)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        try:
+            await self._api_key_repo.update_last_used_batch(pending)
+            logger.debug(f"Flushed last_used_at for {len(pending)} API keys")
+        except Exception as e:
+            logger.warning(f"Failed to flush last_used_at for {len(pending)} API keys: {e}")
+            # Put them back for the next attempt, keeping whichever use is newer
+            for key_id, used_at in pending.items():
+                current = self._pending.get(key_id)
+                if current is None or current < used_at:
+                    self._pending[key_id] = used_at
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._stopping.wait(),
+                    timeout=settings.API_KEY_LAST_USED_FLUSH_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                pass
+            # Not cancelled mid-UPDATE: shutdown sets the event and waits for this drain
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and drain whatever is still buffered"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+# Singleton instance
+last_used_tracker = LastUsedTracker()
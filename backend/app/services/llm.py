@@ -1,8 +1,33 @@
+import hashlib
+import logging
+import re
+from functools import lru_cache
 from typing import List, AsyncIterator, Optional, Dict
+from uuid import UUID
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from app.config import settings
+from app.observability.metrics import context_tokens_saved, llm_generation_cache_counter
+from app.services.cache import cache_service
+from app.services.context_packer import pack_context
+from app.services.corpus_version import corpus_version_service
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def canonical_question(query: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing ?!. so trivial rewordings share a key"""
+    return _TRAILING_PUNCTUATION.sub("", " ".join(query.lower().split()))
+
+
+@lru_cache(maxsize=1024)
+def _system_message(content: str) -> SystemMessage:
+    # Built once per distinct prompt (bots reuse theirs on every query);
+    # messages are only read by the model client, so sharing is safe
+    return SystemMessage(content=content)
 
 
 class LLMService:
@@ -18,16 +43,27 @@ class LLMService:
 If the context doesn't contain enough information to answer the question, say "I don't know based on the available information."
 Always cite the source documents when providing answers."""
     
-    def build_prompt(self, query: str, context_chunks: List[dict], bot_config: Optional[Dict] = None) -> List:
+    def _system_prompt(self, bot_config: Optional[Dict]) -> str:
         # Use bot-specific system prompt if available, otherwise use default
         if bot_config and "system_prompt" in bot_config:
-            system_prompt = bot_config["system_prompt"]
-        else:
-            system_prompt = self.default_system_prompt
+            return bot_config["system_prompt"]
+        return self.default_system_prompt
+    
+    @staticmethod
+    def _token_budget(bot_config: Optional[Dict]) -> int:
+        return (bot_config or {}).get("context_token_budget") or settings.CONTEXT_TOKEN_BUDGET
+    
+    def build_prompt(self, query: str, context_chunks: List[dict], bot_config: Optional[Dict] = None) -> List:
+        system_prompt = self._system_prompt(bot_config)
+        
+        # Adjacent chunks are merged (without their overlap) and fitted to the bot's budget
+        token_budget = self._token_budget(bot_config)
+        packed = pack_context(context_chunks, token_budget)
+        context_tokens_saved.observe(packed.tokens_saved)
         
         context_text = "\n\n".join([
             f"[Source {i+1} - Page {chunk.get('page_num', 'N/A')}]:\n{chunk['text']}"
-            for i, chunk in enumerate(context_chunks)
+            for i, chunk in enumerate(packed.passages)
         ])
         
         user_prompt = f"""Context:
@@ -38,29 +74,112 @@ Question: {query}
 Answer:"""
         
         return [
-            SystemMessage(content=system_prompt),
+            _system_message(system_prompt),
             HumanMessage(content=user_prompt),
         ]
     
-    async def generate_answer(self, query: str, context_chunks: List[dict], bot_config: Optional[Dict] = None) -> str:
+    async def generation_cache_key(
+        self,
+        tenant_id: UUID,
+        query: str,
+        context_chunks: List[dict],
+        bot_config: Optional[Dict] = None,
+    ) -> str:
+        """
+        Key for everything that shapes the prompt: system prompt, context
+        budget, retrieved chunk ids in rank order and the canonical question.
+        The corpus version is part of the key, so re-ingesting drops entries
+        long before LLM_GENERATION_CACHE_TTL.
+        """
+        fingerprint = "\x1f".join([
+            self._system_prompt(bot_config),
+            str(self._token_budget(bot_config)),
+            ",".join(str(chunk.get("id")) for chunk in context_chunks),
+            canonical_question(query),
+        ])
+        corpus_version = await corpus_version_service.get(tenant_id)
+        return cache_service.generate_key(
+            "gen", str(tenant_id), corpus_version,
+            hashlib.sha256(fingerprint.encode()).hexdigest(),
+        )
+    
+    async def _cached_generation(self, cache_key: Optional[str]) -> Optional[str]:
+        if cache_key is None:
+            return None
+        cached = await cache_service.get(cache_key)
+        if cached and cached.get("answer"):
+            llm_generation_cache_counter.labels(result="hit").inc()
+            return cached["answer"]
+        llm_generation_cache_counter.labels(result="miss").inc()
+        return None
+    
+    async def _store_generation(self, cache_key: Optional[str], answer: str) -> None:
+        if cache_key is not None and answer:
+            await cache_service.set(cache_key, {"answer": answer}, settings.LLM_GENERATION_CACHE_TTL)
+    
+    async def _cache_key_for(
+        self,
+        tenant_id: Optional[UUID],
+        query: str,
+        context_chunks: List[dict],
+        bot_config: Optional[Dict],
+    ) -> Optional[str]:
+        if tenant_id is None or not settings.LLM_GENERATION_CACHE_ENABLED:
+            return None
+        return await self.generation_cache_key(tenant_id, query, context_chunks, bot_config)
+    
+    async def generate_answer(
+        self,
+        query: str,
+        context_chunks: List[dict],
+        bot_config: Optional[Dict] = None,
+        tenant_id: Optional[UUID] = None,
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Generations are only cached when the caller says whose corpus this is.
+        With use_cache=False the model is always called (the result is still
+        stored for later callers).
+        """
+        cache_key = await self._cache_key_for(tenant_id, query, context_chunks, bot_config)
+        if use_cache:
+            cached = await self._cached_generation(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
             messages = self.build_prompt(query, context_chunks, bot_config)
             response = await self.llm.ainvoke(messages)
-            return response.content
         except Exception as e:
             raise Exception(f"LLM generation failed: {str(e)}")
+        
+        await self._store_generation(cache_key, response.content)
+        return response.content
     
     async def generate_answer_stream(
         self,
         query: str,
         context_chunks: List[dict],
         bot_config: Optional[Dict] = None,
+        tenant_id: Optional[UUID] = None,
     ) -> AsyncIterator[str]:
+        cache_key = await self._cache_key_for(tenant_id, query, context_chunks, bot_config)
+        cached = await self._cached_generation(cache_key)
+        if cached is not None:
+            # One frame, no simulated typing
+            yield cached
+            return
+        
+        answer = ""
         try:
             messages = self.build_prompt(query, context_chunks, bot_config)
             async for chunk in self.llm.astream(messages):
                 if chunk.content:
+                    answer += chunk.content
                     yield chunk.content
         except Exception as e:
             raise Exception(f"LLM streaming failed: {str(e)}")
+        
+        # Only complete answers are cached; a reader that disconnects early never gets here
+        await self._store_generation(cache_key, answer)
 
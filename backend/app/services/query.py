@@ -2,49 +2,90 @@ import time
 import json
 import logging
 import asyncio
-from typing import AsyncIterator, List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 from uuid import UUID
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from redis.exceptions import RedisError
+
 from app.services.retrieval import RetrievalService
 from app.services.llm import LLMService
-from app.db.repositories import QueryLogRepository, BotRepository
+from app.db.repositories import BotRepository, SemanticCacheRepository
+from app.db.connection import AsyncSessionLocal
 from app.api.v1.schemas import QueryResponse, Source
 from app.services.cache import cache_service
+from app.services.corpus_version import corpus_version_service
+from app.services.bot_config_cache import bot_config_cache
+from app.services.single_flight import SingleFlight, StreamFanout
+from app.services.query_context import QueryContext
+from app.services.query_log import query_log_queue
+from app.services.rate_limit import daily_limit_service
+from app.observability.metrics import retrieval_latency, semantic_cache_counter
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Shared by every QueryService instance: identical questions arriving together
+# (same tenant, normalized text and corpus version) are answered once.
+_query_flights = SingleFlight("query")
+_stream_fanout = StreamFanout("query_stream")
+# Background refreshes of stale answers (stale-while-revalidate)
+_background_refreshes: Set[asyncio.Task] = set()
+
 
 class QueryService:
     SLOW_RETRIEVAL_THRESHOLD_MS = 1000
     SLOW_LLM_THRESHOLD_MS = 3000
     SLOW_TOTAL_THRESHOLD_MS = 4000
-    def __init__(self):
-        self.retrieval_service = RetrievalService()
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.retrieval_service = RetrievalService(session_factory=session_factory)
         self.llm_service = LLMService()
-        self.query_log_repo = QueryLogRepository()
-        self.bot_repo = BotRepository()
-        self.query_cache_ttl = 600  # 10 minutes cache for query results
+        self.semantic_cache_repo = SemanticCacheRepository(session_factory=session_factory)
+        self.bot_repo = BotRepository(session_factory=session_factory)
+        # Answers are fresh for the soft TTL, then served stale while refreshed
+        self.query_cache_ttl = settings.QUERY_CACHE_SOFT_TTL
+        self.query_cache_hard_ttl = settings.QUERY_CACHE_HARD_TTL
+    
+    @staticmethod
+    async def answer_cache_key(tenant_id: UUID, query: str) -> str:
+        """Exact-match answer key, for the tenant's current set of documents"""
+        corpus_version = await corpus_version_service.get(tenant_id)
+        return cache_service.generate_key(
+            "query", str(tenant_id), corpus_version, query.lower().strip()
+        )
+    
+    async def is_answer_cached(self, tenant_id: UUID, query: str, fresh_for: int = 0) -> bool:
+        """Whether an answer is cached and stays fresh for at least `fresh_for` seconds"""
+        cache_key = await self.answer_cache_key(tenant_id, query)
+        cached, stale = await cache_service.get_swr(cache_key, stale_margin=fresh_for)
+        return cached is not None and not stale
+    
+    async def precompute_answer(self, tenant_id: UUID, query: str) -> None:
+        """Compute and cache an answer without logging a query (cache warming)"""
+        cache_key = await self.answer_cache_key(tenant_id, query)
+        await _query_flights.do(
+            cache_key, lambda: self._answer(tenant_id, query, cache_key, time.time())
+        )
     
     async def query(
         self,
         tenant_id: UUID,
         query: str,
         api_key_id: UUID,
+        quota_tenant_id: Optional[UUID] = None,
     ) -> QueryResponse:
         start_time = time.time()
-        timings = {}
-        
-        # Fetch bot config (includes system_prompt if customized)
-        bot = await self.bot_repo.get_by_tenant(tenant_id)
-        bot_config = bot.get("config", {}) if bot else {}
         
         # Check cache (exact match)
-        cache_key = cache_service.generate_key("query", str(tenant_id), query.lower().strip())
-        cached = cache_service.get(cache_key)
+        cache_key = await self.answer_cache_key(tenant_id, query)
+        cached, stale = await cache_service.get_swr(cache_key)
         if cached:
-            logger.info(f"Cache HIT for tenant:{tenant_id}")
-            # Still log the cached query
-            await self.query_log_repo.log_query(
+            logger.info(f"Cache HIT for tenant:{tenant_id} | stale:{stale}")
+            if stale:
+                self._schedule_refresh(tenant_id, query, cache_key, quota_tenant_id or tenant_id)
+            # Still log the cached query (queued, written off the request path)
+            query_log_queue.record(
                 tenant_id=tenant_id,
                 api_key_id=api_key_id,
                 query=query,
@@ -55,57 +96,365 @@ class QueryService:
             )
             return QueryResponse(**cached)
         
-        # Generate embedding
-        t1 = time.time()
-        query_embedding = await self.retrieval_service.embedding_service.embed_text(query)
-        timings['embedding_ms'] = int((time.time() - t1) * 1000)
-
-        # Check Semantic Cache (Similarity Match)
-        similar_query = await self.query_log_repo.find_similar_query(
+        async def cached_elsewhere() -> Optional[dict]:
+            result, _ = await cache_service.get_swr(cache_key)
+            return result
+        
+        # Concurrent identical queries wait for one computation
+        answer_data, shared = await _query_flights.do(
+            cache_key,
+            lambda: self._answer(tenant_id, query, cache_key, start_time),
+            shared_result=cached_elsewhere,
+        )
+        if shared:
+            logger.info(f"Coalesced query - tenant:{tenant_id}")
+        
+        # Every caller gets its own log row with its own key and latency
+        latency_ms = int((time.time() - start_time) * 1000)
+        query_log_queue.record(
             tenant_id=tenant_id,
-            query_embedding=query_embedding,
-            threshold=0.95
+            api_key_id=api_key_id,
+            query=query,
+            answer=answer_data['answer'],
+            confidence=answer_data['confidence'],
+            latency_ms=latency_ms,
+            sources=answer_data['sources'],
         )
-
-        if similar_query:
-            latency_ms = int((time.time() - start_time) * 1000)
-            logger.info(f"Semantic Cache HIT - tenant:{tenant_id} | sim:{similar_query['similarity']:.4f}")
-            
-            # Log the hit and save the new query's embedding to reinforce the cache
-            await self.query_log_repo.log_query(
+        
+        return QueryResponse(
+            answer=answer_data['answer'],
+            sources=answer_data['sources'],
+            confidence=answer_data['confidence'],
+            latency_ms=latency_ms,
+        )
+    
+    async def query_batch(
+        self,
+        tenant_id: UUID,
+        queries: List[str],
+        api_key_id: UUID,
+        quota_tenant_id: Optional[UUID] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Answer many questions, yielding {"index", "query", ...answer} (or
+        {"index", "query", "error"}) for each as soon as it is ready.
+        Cached answers come back first. All misses are embedded with one
+        provider call and retrieved with one SQL statement; LLM calls then fan
+        out, at most QUERY_BATCH_LLM_CONCURRENCY at a time.
+        """
+        start_time = time.time()
+        cache_keys = [await self.answer_cache_key(tenant_id, query) for query in queries]
+        
+        # Duplicate questions in one batch are answered once
+        indexes_by_key: Dict[str, List[int]] = {}
+        for index, cache_key in enumerate(cache_keys):
+            indexes_by_key.setdefault(cache_key, []).append(index)
+        unique_keys = list(indexes_by_key)
+        
+        def results_for(cache_key: str, data: dict) -> List[dict]:
+            items = []
+            for index in indexes_by_key[cache_key]:
+                query_log_queue.record(
+                    tenant_id=tenant_id,
+                    api_key_id=api_key_id,
+                    query=queries[index],
+                    answer=data['answer'],
+                    confidence=data['confidence'],
+                    latency_ms=int((time.time() - start_time) * 1000),
+                    sources=data['sources'],
+                )
+                items.append({"index": index, "query": queries[index], **data})
+            return items
+        
+        missing = []
+        for cache_key, (cached, stale) in zip(
+            unique_keys, await cache_service.get_swr_many(unique_keys)
+        ):
+            if cached is None:
+                missing.append(cache_key)
+                continue
+            if stale:
+                query = queries[indexes_by_key[cache_key][0]]
+                self._schedule_refresh(tenant_id, query, cache_key, quota_tenant_id or tenant_id)
+            for item in results_for(cache_key, cached):
+                yield item
+        
+        if not missing:
+            return
+        
+        missing_queries = [queries[indexes_by_key[key][0]] for key in missing]
+        try:
+            bot_config, embeddings = await asyncio.gather(
+                self.get_bot_config(tenant_id),
+                self.retrieval_service.embedding_service.embed_query_vectors(missing_queries),
+            )
+            chunks_per_query = await self.retrieval_service.retrieve_context_batch(
+                tenant_id=tenant_id,
+                queries=missing_queries,
+                query_embeddings=embeddings,
+            )
+        except Exception as e:
+            # The response has started streaming: report every unanswered question
+            logger.error(f"Batch query retrieval failed - tenant:{tenant_id}: {e}")
+            for cache_key in missing:
+                for index in indexes_by_key[cache_key]:
+                    yield {"index": index, "query": queries[index], "error": "Failed to answer this question"}
+            return
+        
+        llm_slots = asyncio.Semaphore(settings.QUERY_BATCH_LLM_CONCURRENCY)
+        
+        async def answer_one(cache_key: str, query: str, embedding, context_chunks) -> dict:
+            ctx = QueryContext(
                 tenant_id=tenant_id,
-                api_key_id=api_key_id,
                 query=query,
-                answer=similar_query['answer'],
-                confidence="high", 
-                latency_ms=latency_ms,
-                sources=similar_query['sources'],
-                query_embedding=query_embedding 
+                cache_key=cache_key,
+                start_time=start_time,
+                bot_config=bot_config,
+                embedding=embedding,
             )
-            
-            # Cache in Redis for exact-match speed next time
-            cache_data = {
-                "answer": similar_query['answer'],
-                "sources": similar_query['sources'],
-                "confidence": "high",
-                "latency_ms": latency_ms,
-            }
-            cache_service.set(cache_key, cache_data, self.query_cache_ttl)
-
-            return QueryResponse(
-                answer=similar_query['answer'],
-                sources=similar_query['sources'],
-                confidence="high",
-                latency_ms=latency_ms
+            async with llm_slots:
+                similar_query = await self.semantic_cache_repo.find_similar(
+                    tenant_id=tenant_id,
+                    query_embedding=embedding,
+                    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                )
+                semantic_cache_counter.labels(result="hit" if similar_query else "miss").inc()
+                if similar_query:
+                    return await self._use_semantic_hit(ctx, similar_query)
+                return await self._generate(ctx, context_chunks)
+        
+        async def run(cache_key: str, query: str, embedding, context_chunks):
+            try:
+                # Shares work with identical single queries in flight
+                data, _ = await _query_flights.do(
+                    cache_key,
+                    lambda: answer_one(cache_key, query, embedding, context_chunks),
+                    cancel_when_abandoned=True,
+                )
+                return cache_key, data, None
+            except Exception as e:
+                logger.warning(f"Batch query item failed - tenant:{tenant_id}: {e}")
+                return cache_key, None, "Failed to answer this question"
+        
+        tasks = [
+            asyncio.create_task(run(cache_key, query, embedding, chunks))
+            for cache_key, query, embedding, chunks in zip(
+                missing, missing_queries, embeddings, chunks_per_query
             )
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                cache_key, data, error = await finished
+                if error is not None:
+                    for index in indexes_by_key[cache_key]:
+                        yield {"index": index, "query": queries[index], "error": error}
+                    continue
+                for item in results_for(cache_key, data):
+                    yield item
+        finally:
+            # The client went away: cancelling the waits also cancels the
+            # answers they started, unless a live query joined them
+            for task in tasks:
+                task.cancel()
+    
+    def _schedule_refresh(
+        self,
+        tenant_id: UUID,
+        query: str,
+        cache_key: str,
+        quota_tenant_id: UUID,
+    ) -> None:
+        """Refresh a stale answer in the background; the caller already has the cached one"""
+        # A refresh holds its slot from the moment it is scheduled
+        if len(_background_refreshes) >= settings.QUERY_REFRESH_MAX_CONCURRENT:
+            # Refreshes are best effort and never queue behind live traffic
+            logger.debug(f"Skipping stale answer refresh for tenant:{tenant_id}, no free slots")
+            return
+        task = asyncio.create_task(self._refresh(tenant_id, query, cache_key, quota_tenant_id))
+        _background_refreshes.add(task)
+        task.add_done_callback(_background_refreshes.discard)
+    
+    async def _refresh(
+        self,
+        tenant_id: UUID,
+        query: str,
+        cache_key: str,
+        quota_tenant_id: UUID,
+    ) -> None:
+        usage = await daily_limit_service.get_current_usage(quota_tenant_id)
+        if usage["remaining"] <= 0:
+            return
+        
+        # One refresh per key across replicas; the claim is left to expire so
+        # replicas still holding the stale copy in L1 don't refresh again
+        if cache_service.is_available:
+            try:
+                claimed = await cache_service.client.set(
+                    f"query_refresh:{cache_key}", 1,
+                    nx=True, ex=settings.QUERY_REFRESH_LOCK_SECONDS,
+                )
+            except RedisError as e:
+                logger.warning(f"Failed to claim answer refresh for tenant:{tenant_id}: {e}")
+                return
+            if not claimed:
+                return
+        
+        try:
+            # Joins an identical live query instead of racing it
+            await _query_flights.do(
+                cache_key, lambda: self._recompute(tenant_id, query, cache_key, time.time())
+            )
+            logger.info(f"Refreshed stale answer - tenant:{tenant_id}")
+        except Exception as e:
+            logger.warning(f"Stale answer refresh failed for tenant:{tenant_id}: {e}")
+    
+    @staticmethod
+    def _confidence(context_chunks: List[dict]) -> str:
+        avg_similarity = sum(c.get("similarity", 0.0) for c in context_chunks) / len(context_chunks)
+        if avg_similarity > 0.8:
+            return "high"
+        elif avg_similarity > 0.6:
+            return "medium"
+        return "low"
+    
+    async def get_bot_config(self, tenant_id: UUID) -> dict:
+        """Bot config (includes system_prompt if customized), cached per tenant"""
+        config = await bot_config_cache.get(tenant_id)
+        if config is None:
+            generation = bot_config_cache.generation
+            bot = await self.bot_repo.get_by_tenant(tenant_id)
+            config = (bot.get("config") or {}) if bot else {}
+            await bot_config_cache.fill(tenant_id, config, generation)
+        return config
+    
+    async def _prepare(self, ctx: QueryContext) -> None:
+        """
+        Load the bot config and embed the query concurrently, with keyword
+        search already running; the embedding then serves the semantic cache
+        and vector search.
+        """
+        ctx.keyword_search = self.retrieval_service.start_keyword_search(ctx.tenant_id, ctx.query)
+        try:
+            ctx.bot_config, ctx.embedding = await asyncio.gather(
+                self.get_bot_config(ctx.tenant_id),
+                ctx.timed(
+                    "embedding_ms",
+                    self.retrieval_service.embedding_service.embed_query_vector(ctx.query),
+                ),
+            )
+        except BaseException:
+            ctx.cancel_pending()
+            raise
+    
+    async def _retrieve(self, ctx: QueryContext) -> List[dict]:
+        started = time.time()
+        try:
+            chunks = await ctx.timed(
+                "retrieval_ms",
+                self.retrieval_service.retrieve_context(
+                    tenant_id=ctx.tenant_id,
+                    query=ctx.query,
+                    query_embedding=ctx.embedding,
+                    keyword_search=ctx.keyword_search,
+                ),
+            )
+        except asyncio.CancelledError:
+            retrieval_latency.labels(outcome="cancelled").observe(time.time() - started)
+            raise
+        retrieval_latency.labels(outcome="used").observe(time.time() - started)
+        return chunks
+    
+    async def _find_similar_or_retrieve(self, ctx: QueryContext) -> Tuple[Optional[dict], List[dict]]:
+        """
+        Semantic cache lookup and hybrid retrieval, launched together: a miss
+        (the common case) doesn't wait for the lookup's round trip before
+        retrieving, and a hit cancels the retrieval.
+        Returns (similar_query, context_chunks); chunks are empty on a hit.
+        """
+        if settings.SEMANTIC_CACHE_SPECULATIVE_RETRIEVAL:
+            ctx.retrieval = asyncio.create_task(self._retrieve(ctx))
+        
+        similar_query = await ctx.timed(
+            "semantic_cache_ms",
+            self.semantic_cache_repo.find_similar(
+                tenant_id=ctx.tenant_id,
+                query_embedding=ctx.embedding,
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ),
+        )
+        semantic_cache_counter.labels(result="hit" if similar_query else "miss").inc()
+        
+        if similar_query:
+            ctx.cancel_pending()
+            return similar_query, []
+        
+        if ctx.retrieval is None:
+            return None, await self._retrieve(ctx)
+        return None, await ctx.retrieval
+    
+    async def _answer(
+        self,
+        tenant_id: UUID,
+        query: str,
+        cache_key: str,
+        start_time: float,
+    ) -> dict:
+        """Compute and cache an answer. Runs once per group of coalesced callers."""
+        ctx = QueryContext(tenant_id=tenant_id, query=query, cache_key=cache_key, start_time=start_time)
+        try:
+            return await self._answer_with_context(ctx)
+        finally:
+            ctx.cancel_pending()
+    
+    async def _recompute(
+        self,
+        tenant_id: UUID,
+        query: str,
+        cache_key: str,
+        start_time: float,
+    ) -> dict:
+        """
+        Retrieve and generate again for a stale answer. The semantic cache is
+        skipped: it holds this very question's previous answer.
+        """
+        ctx = QueryContext(
+            tenant_id=tenant_id, query=query, cache_key=cache_key, start_time=start_time, refresh=True
+        )
+        try:
+            await self._prepare(ctx)
+            return await self._generate(ctx, await self._retrieve(ctx))
+        finally:
+            ctx.cancel_pending()
+    
+    async def _answer_with_context(self, ctx: QueryContext) -> dict:
+        await self._prepare(ctx)
+
+        # Semantic cache (similarity match), with retrieval running alongside
+        similar_query, context_chunks = await self._find_similar_or_retrieve(ctx)
 
+        if similar_query:
+            return await self._use_semantic_hit(ctx, similar_query)
+        return await self._generate(ctx, context_chunks)
+    
+    async def _use_semantic_hit(self, ctx: QueryContext, similar_query: dict) -> dict:
+        logger.info(f"Semantic Cache HIT - tenant:{ctx.tenant_id} | sim:{similar_query['similarity']:.4f}")
         
-        t_retrieval = time.time()
-        context_chunks = await self.retrieval_service.retrieve_context(
-            tenant_id=tenant_id,
-            query=query,
+        # Cache in Redis for exact-match speed next time
+        cache_data = {
+            "answer": similar_query['answer'],
+            "sources": similar_query['sources'],
+            "confidence": "high",
+            "latency_ms": ctx.elapsed_ms(),
+        }
+        await cache_service.set_swr(
+            ctx.cache_key, cache_data, self.query_cache_ttl, self.query_cache_hard_ttl
         )
-        timings['retrieval_ms'] = int((time.time() - t_retrieval) * 1000)
+        return cache_data
+    
+    async def _generate(self, ctx: QueryContext, context_chunks: List[dict]) -> dict:
+        """Answer from retrieved chunks with the LLM, then cache the answer"""
+        tenant_id, query, cache_key = ctx.tenant_id, ctx.query, ctx.cache_key
+        timings = ctx.timings
         
         if not context_chunks:
             answer = "I don't know based on the available information."
@@ -113,9 +462,12 @@ class QueryService:
             sources = []
         else:
             # LLM generation with bot config (includes system_prompt)
-            t_llm = time.time()
-            answer = await self.llm_service.generate_answer(query, context_chunks, bot_config)
-            timings['llm_ms'] = int((time.time() - t_llm) * 1000)
+            answer = await ctx.timed(
+                "llm_ms",
+                self.llm_service.generate_answer(
+                    query, context_chunks, ctx.bot_config, tenant_id=tenant_id, use_cache=not ctx.refresh
+                ),
+            )
             if timings['llm_ms'] > self.SLOW_LLM_THRESHOLD_MS:
                 logger.warning(
                     "Slow LLM generation detected",
@@ -126,13 +478,7 @@ class QueryService:
                     },
                 )
             
-            avg_similarity = sum(c.get("similarity", 0.0) for c in context_chunks) / len(context_chunks)
-            if avg_similarity > 0.8:
-                confidence = "high"
-            elif avg_similarity > 0.6:
-                confidence = "medium"
-            else:
-                confidence = "low"
+            confidence = self._confidence(context_chunks)
             
             sources = [
                 Source(
@@ -143,7 +489,7 @@ class QueryService:
                 for chunk in context_chunks[:3]
             ]
         
-        latency_ms = int((time.time() - start_time) * 1000)
+        latency_ms = ctx.elapsed_ms()
         timings['total_ms'] = latency_ms
 
         logger.info(f"Query Miss - tenant:{tenant_id} | timings:{timings}")
@@ -159,24 +505,6 @@ class QueryService:
                 },
             )
         
-        await self.query_log_repo.log_query(
-            tenant_id=tenant_id,
-            api_key_id=api_key_id,
-            query=query,
-            answer=answer,
-            confidence=confidence,
-            latency_ms=latency_ms,
-            sources=[
-                {
-                    "doc_id": str(s.doc_id),
-                    "page": s.page,
-                    "confidence": s.confidence,
-                }
-                for s in sources
-            ],
-            query_embedding=query_embedding
-        )
-        
         # Cache result in Redis
         cache_data = {
             "answer": answer,
@@ -184,87 +512,115 @@ class QueryService:
             "confidence": confidence,
             "latency_ms": latency_ms,
         }
-        cache_service.set(cache_key, cache_data, self.query_cache_ttl)
-        
-        return QueryResponse(
-            answer=answer,
-            sources=sources,
-            confidence=confidence,
-            latency_ms=latency_ms,
+        await cache_service.set_swr(
+            cache_key, cache_data, self.query_cache_ttl, self.query_cache_hard_ttl
         )
+        if confidence == "high":
+            await self.semantic_cache_repo.store(
+                tenant_id, query, ctx.embedding, answer, cache_data["sources"]
+            )
+        
+        return cache_data
     
     async def query_stream(
         self,
         tenant_id: UUID,
         query: str,
         api_key_id: UUID,
+        quota_tenant_id: Optional[UUID] = None,
     ) -> AsyncIterator[str]:
         start_time = time.time()
         
-        # Fetch bot config (includes system_prompt if customized)
-        bot = await self.bot_repo.get_by_tenant(tenant_id)
-        bot_config = bot.get("config", {}) if bot else {}
-
-        # Generate Embedding (Needed for Cache & Retrieval)
-        query_embedding = await self.retrieval_service.embedding_service.embed_text(query)
+        # Same exact-match cache as query()
+        cache_key = await self.answer_cache_key(tenant_id, query)
+        result, stale = await cache_service.get_swr(cache_key)
+        
+        if result:
+            logger.info(f"Cache HIT (Stream) for tenant:{tenant_id} | stale:{stale}")
+            if stale:
+                self._schedule_refresh(tenant_id, query, cache_key, quota_tenant_id or tenant_id)
+            # The whole answer is already known: send it as one frame
+            yield f"data: {json.dumps({'content': result['answer']})}\n\n"
+        else:
+            # Identical questions streaming at the same time share one LLM stream
+            async for event, payload in _stream_fanout.subscribe(
+                cache_key, lambda: self._answer_stream(tenant_id, query, cache_key)
+            ):
+                if event == "content":
+                    yield f"data: {json.dumps({'content': payload})}\n\n"
+                else:
+                    result = payload
         
-        # 2. Check Semantic Cache
-        similar_query = await self.query_log_repo.find_similar_query(
+        if result is None:
+            return
+        
+        query_log_queue.record(
             tenant_id=tenant_id,
-            query_embedding=query_embedding,
-            threshold=0.95
+            api_key_id=api_key_id,
+            query=query,
+            answer=result['answer'],
+            confidence=result['confidence'],
+            latency_ms=int((time.time() - start_time) * 1000),
+            sources=result['sources'],
         )
+        
+        yield f"data: {json.dumps({'sources': result['sources'], 'confidence': result['confidence']})}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    async def _answer_stream(
+        self,
+        tenant_id: UUID,
+        query: str,
+        cache_key: str,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Produce ("content", text) events followed by one ("result", dict) event,
+        and cache the result for both endpoints.
+        Runs once per group of subscribers; nothing here is caller specific.
+        """
+        ctx = QueryContext(tenant_id=tenant_id, query=query, cache_key=cache_key)
+        try:
+            async for event in self._answer_stream_with_context(ctx):
+                yield event
+        finally:
+            ctx.cancel_pending()
+    
+    async def _answer_stream_with_context(self, ctx: QueryContext) -> AsyncIterator[Tuple[str, Any]]:
+        tenant_id, query, cache_key = ctx.tenant_id, ctx.query, ctx.cache_key
+        
+        await self._prepare(ctx)
+        
+        # Semantic cache, with retrieval running alongside
+        similar_query, context_chunks = await self._find_similar_or_retrieve(ctx)
 
         if similar_query:
             logger.info(f"Semantic Cache HIT (Stream) - tenant:{tenant_id}")
             
-            # Simulate streaming the cached answer for UX consistency
-            cached_answer = similar_query['answer']
-            chunk_size = 15 # Characters per chunk
-            
-            for i in range(0, len(cached_answer), chunk_size):
-                chunk = cached_answer[i:i+chunk_size]
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
-                # Tiny sleep to simulate natural typing effect (optional)
-                await asyncio.sleep(0.01) 
-            
-            # Log Hit
-            await self.query_log_repo.log_query(
-                tenant_id=tenant_id,
-                api_key_id=api_key_id,
-                query=query,
-                answer=cached_answer,
-                confidence="high",
-                latency_ms=int((time.time() - start_time) * 1000),
-                sources=similar_query['sources'],
-                query_embedding=query_embedding
+            cache_data = {
+                "answer": similar_query['answer'],
+                "sources": similar_query['sources'],
+                "confidence": "high",
+                "latency_ms": ctx.elapsed_ms(),
+            }
+            await cache_service.set_swr(
+                cache_key, cache_data, self.query_cache_ttl, self.query_cache_hard_ttl
             )
-
-            yield f"data: {json.dumps({'sources': similar_query['sources'], 'confidence': 'high'})}\n\n"
-            yield "data: [DONE]\n\n"
+            
+            # One frame, no simulated typing
+            yield "content", cache_data["answer"]
+            yield "result", cache_data
             return
         
-        context_chunks = await self.retrieval_service.retrieve_context(
-            tenant_id=tenant_id,
-            query=query,
-        )
-        
         if not context_chunks:
-            yield f"data: {json.dumps({'content': "I don't know based on the available information."})}\n\n"
+            yield "content", "I don't know based on the available information."
             return
         
         full_answer = ""
-        async for chunk in self.llm_service.generate_answer_stream(query, context_chunks, bot_config):
+        async for chunk in self.llm_service.generate_answer_stream(
+            query, context_chunks, ctx.bot_config, tenant_id=tenant_id
+        ):
             full_answer += chunk
-            yield f"data: {json.dumps({'content': chunk})}\n\n"
-        
-        avg_similarity = sum(c.get("similarity", 0.0) for c in context_chunks) / len(context_chunks)
-        if avg_similarity > 0.8:
-            confidence = "high"
-        elif avg_similarity > 0.6:
-            confidence = "medium"
-        else:
-            confidence = "low"
+            yield "content", chunk
         
         sources = [
             {
@@ -275,19 +631,18 @@ class QueryService:
             for chunk in context_chunks[:3]
         ]
         
-        latency_ms = int((time.time() - start_time) * 1000)
-        
-        await self.query_log_repo.log_query(
-            tenant_id=tenant_id,
-            api_key_id=api_key_id,
-            query=query,
-            answer=full_answer,
-            confidence=confidence,
-            latency_ms=latency_ms,
-            sources=sources,
-            query_embedding=query_embedding
+        cache_data = {
+            "answer": full_answer,
+            "sources": sources,
+            "confidence": self._confidence(context_chunks),
+            "latency_ms": ctx.elapsed_ms(),
+        }
+        await cache_service.set_swr(
+            cache_key, cache_data, self.query_cache_ttl, self.query_cache_hard_ttl
         )
+        if cache_data["confidence"] == "high":
+            await self.semantic_cache_repo.store(
+                tenant_id, query, ctx.embedding, full_answer, sources
+            )
         
-        yield f"data: {json.dumps({'sources': sources, 'confidence': confidence})}\n\n"
-        yield "data: [DONE]\n\n"
-
+        yield "result", cache_data
@@ -0,0 +1,49 @@
+"""
+Per-request state shared by the steps of the query pipeline
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Dict, List, Optional, TypeVar
+from uuid import UUID
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+@dataclass
+class QueryContext:
+    """
+    Everything one answer computation needs, computed once: the query
+    embedding is shared by the semantic cache and vector search, and keyword
+    search starts before the embedding exists.
+    """
+    tenant_id: UUID
+    query: str
+    cache_key: str
+    start_time: float = field(default_factory=time.time)
+    bot_config: dict = field(default_factory=dict)
+    embedding: Optional[np.ndarray] = None
+    keyword_search: Optional["asyncio.Task[List[dict]]"] = None
+    retrieval: Optional["asyncio.Task[List[dict]]"] = None
+    timings: Dict[str, int] = field(default_factory=dict)
+    # Background refresh of a stale answer: recompute, don't reuse cached answers
+    refresh: bool = False
+
+    def elapsed_ms(self) -> int:
+        return int((time.time() - self.start_time) * 1000)
+
+    async def timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Await and record the duration as timings[name] (in ms)"""
+        started = time.time()
+        try:
+            return await awaitable
+        finally:
+            self.timings[name] = int((time.time() - started) * 1000)
+
+    def cancel_pending(self) -> None:
+        """Drop work started ahead of time that turned out not to be needed"""
+        for task in (self.retrieval, self.keyword_search):
+            if task is not None and not task.done():
+                task.cancel()
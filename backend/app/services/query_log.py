@@ -0,0 +1,259 @@
+"""
+Query logging off the request path: API replicas buffer log records locally
+and ship them to a Redis Stream; the worker drains the stream into bot_queries
+in batches.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, List, Optional
+from uuid import UUID, uuid4
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.connection import AsyncSessionLocal
+from app.db.repositories import QueryLogRepository
+from app.observability.metrics import (
+    query_log_buffer_depth,
+    query_log_records_counter,
+    query_log_stream_length,
+)
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_STREAM = "query_log"
+QUERY_LOG_GROUP = "query_log_writers"
+
+
+class QueryLogQueue:
+    """
+    Producer side. record() only appends to a bounded in-memory buffer; a
+    background loop ships the buffer to the stream with one pipelined XADD
+    batch every QUERY_LOG_FLUSH_SECONDS. Without Redis, batches are inserted
+    directly. When the buffer is full the oldest records are dropped (and
+    counted) rather than slowing down queries.
+
+    Every record carries its own id and timestamp, so a record delivered twice
+    is inserted once.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._buffer: Deque[dict] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._query_log_repo = QueryLogRepository(session_factory=session_factory)
+
+    def record(
+        self,
+        tenant_id: UUID,
+        api_key_id: UUID,
+        query: str,
+        answer: str,
+        confidence: str,
+        latency_ms: int,
+        sources: List[dict],
+    ) -> None:
+        """Queue one query log row. Costs no I/O."""
+        if len(self._buffer) >= settings.QUERY_LOG_BUFFER_MAX:
+            self._buffer.popleft()
+            query_log_records_counter.labels(outcome="dropped").inc()
+
+        self._buffer.append({
+            "id": str(uuid4()),
+            "tenant_id": str(tenant_id),
+            "api_key_id": str(api_key_id) if api_key_id else None,
+            "query": query,
+            "answer": answer,
+            "confidence": confidence,
+            "latency_ms": latency_ms,
+            "sources": sources,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        query_log_buffer_depth.set(len(self._buffer))
+        if len(self._buffer) >= settings.QUERY_LOG_BATCH_SIZE:
+            self._wakeup.set()
+
+    def _take_batch(self) -> List[dict]:
+        batch = []
+        while self._buffer and len(batch) < settings.QUERY_LOG_BATCH_SIZE:
+            batch.append(self._buffer.popleft())
+        return batch
+
+    def _put_back(self, batch: List[dict]) -> None:
+        # Newest records win if the buffer filled up in the meantime
+        room = settings.QUERY_LOG_BUFFER_MAX - len(self._buffer)
+        kept = batch[-room:] if room > 0 else []
+        self._buffer.extendleft(reversed(kept))
+        if len(kept) < len(batch):
+            query_log_records_counter.labels(outcome="dropped").inc(len(batch) - len(kept))
+
+    async def _ship(self, batch: List[dict]) -> None:
+        if cache_service.is_available:
+            try:
+                async with cache_service.client.pipeline(transaction=False) as pipe:
+                    for record in batch:
+                        pipe.xadd(
+                            QUERY_LOG_STREAM,
+                            {"data": json.dumps(record, default=str)},
+                            maxlen=settings.QUERY_LOG_STREAM_MAXLEN,
+                            approximate=True,
+                        )
+                    pipe.xlen(QUERY_LOG_STREAM)
+                    results = await pipe.execute()
+                query_log_stream_length.set(results[-1])
+                query_log_records_counter.labels(outcome="streamed").inc(len(batch))
+                return
+            except RedisError as e:
+                logger.warning(f"Failed to stream {len(batch)} query logs, inserting directly: {e}")
+
+        await self._query_log_repo.log_queries_batch(batch)
+        query_log_records_counter.labels(outcome="direct").inc(len(batch))
+
+    async def flush(self) -> None:
+        while self._buffer:
+            batch = self._take_batch()
+            try:
+                await self._ship(batch)
+            except Exception as e:
+                logger.warning(f"Failed to write {len(batch)} query logs: {e}")
+                self._put_back(batch)
+                break
+            finally:
+                query_log_buffer_depth.set(len(self._buffer))
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=settings.QUERY_LOG_FLUSH_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and ship whatever is still buffered"""
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+class QueryLogConsumer:
+    """
+    Worker side. Reads the stream through a consumer group, inserts each batch
+    with one multi-row INSERT ... ON CONFLICT (id) DO NOTHING and acknowledges
+    it afterwards (at-least-once). Entries left unacknowledged by a crashed
+    consumer are claimed again after QUERY_LOG_CLAIM_IDLE_SECONDS.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._query_log_repo = QueryLogRepository(session_factory=session_factory)
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+
+    async def _ensure_group(self) -> None:
+        try:
+            await cache_service.client.xgroup_create(
+                QUERY_LOG_STREAM, QUERY_LOG_GROUP, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _write(self, entries: list) -> int:
+        if not entries:
+            return 0
+        ids = [entry_id for entry_id, _ in entries]
+        records = []
+        for _, fields in entries:
+            try:
+                records.append(json.loads(fields[b"data"]))
+            except (KeyError, TypeError, ValueError) as e:
+                # Unparseable entries would otherwise be redelivered forever
+                logger.error(f"Discarding malformed query log entry: {e}")
+
+        await self._query_log_repo.log_queries_batch(records)
+        client = cache_service.client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.xack(QUERY_LOG_STREAM, QUERY_LOG_GROUP, *ids)
+            pipe.xdel(QUERY_LOG_STREAM, *ids)
+            await pipe.execute()
+        return len(records)
+
+    async def drain(self, max_batches: int = 100) -> int:
+        """Insert up to max_batches batches from the stream; returns the rows written"""
+        if not cache_service.is_available:
+            return 0
+
+        await self._ensure_group()
+        client = cache_service.client
+        batch_size = settings.QUERY_LOG_BATCH_SIZE
+        written = 0
+
+        # Entries a dead consumer read but never acknowledged
+        _, claimed, *_ = await client.xautoclaim(
+            QUERY_LOG_STREAM,
+            QUERY_LOG_GROUP,
+            self.consumer_name,
+            min_idle_time=settings.QUERY_LOG_CLAIM_IDLE_SECONDS * 1000,
+            start_id="0-0",
+            count=batch_size,
+        )
+        written += await self._write(claimed)
+
+        for _ in range(max_batches):
+            response = await client.xreadgroup(
+                QUERY_LOG_GROUP,
+                self.consumer_name,
+                {QUERY_LOG_STREAM: ">"},
+                count=batch_size,
+            )
+            entries = response[0][1] if response else []
+            if not entries:
+                break
+            written += await self._write(entries)
+
+        if written:
+            logger.info(f"Wrote {written} query logs from the stream")
+        return written
+
+    async def run(self, stopping: asyncio.Event) -> None:
+        """
+        Drain until `stopping` is set, pausing QUERY_LOG_DRAIN_INTERVAL_SECONDS
+        whenever the stream is empty. Every worker runs this; the consumer group
+        splits entries between them.
+        """
+        while not stopping.is_set():
+            try:
+                written = await self.drain()
+            except Exception as e:
+                # Unacknowledged entries are claimed again on a later pass
+                logger.warning(f"Query log drain failed: {e}")
+                written = 0
+            if written:
+                continue
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=settings.QUERY_LOG_DRAIN_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Singleton instance
+query_log_queue = QueryLogQueue()
@@ -1,20 +1,24 @@
 import time
 import logging
 import asyncio
-from typing import List, Dict
+from typing import Awaitable, Callable, List, Dict, Optional
 from uuid import UUID
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.services.embeddings import EmbeddingService
+from app.services.vector_codec import VectorLike
 from app.db.repositories import ChunkRepository
+from app.db.connection import AsyncSessionLocal
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 
 class RetrievalService:
-    def __init__(self):
-        self.embedding_service = EmbeddingService()
-        self.chunk_repo = ChunkRepository()
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.embedding_service = EmbeddingService(session_factory=session_factory)
+        self.chunk_repo = ChunkRepository(session_factory=session_factory)
         self.rrf_k = 60  # Standard RRF constant
     
     def _reciprocal_rank_fusion(self, results_lists: List[List[dict]]) -> List[dict]:
@@ -51,45 +55,77 @@ class RetrievalService:
             
         return final_results
 
+    def start_keyword_search(
+        self,
+        tenant_id: UUID,
+        query: str,
+        top_k: int = None,
+    ) -> "asyncio.Task[List[dict]]":
+        """
+        Start keyword search as a task. It doesn't need the embedding, so callers
+        can run it alongside the embedding call and hand it to retrieve_context.
+        """
+        if top_k is None:
+            top_k = settings.TOP_K_RESULTS
+        return asyncio.create_task(
+            self.chunk_repo.search_keyword(
+                tenant_id=tenant_id,
+                query_text=query,
+                top_k=top_k * 2,
+            )
+        )
+
     async def retrieve_context(
         self,
         tenant_id: UUID,
         query: str,
         top_k: int = None,
+        query_embedding: Optional[VectorLike] = None,
+        keyword_search: Optional[Awaitable[List[dict]]] = None,
     ) -> List[dict]:
+        """
+        Hybrid retrieval. Pass `query_embedding` (and a task from
+        start_keyword_search) when the caller already has them, so the query is
+        embedded and keyword-searched only once per request.
+        """
         if top_k is None:
             top_k = settings.TOP_K_RESULTS
             
         start_time = time.time()
         
-        # 1. Generate Embedding (Async)
-        query_embedding = await self.embedding_service.embed_text(query)
-        
-        # 2. Run Hybrid Search concurrently (Vector + Keyword)
         # We request slightly more candidates (top_k * 2) from each source 
         # to maximize the chance of finding overlapping relevant documents for RRF
         candidate_k = top_k * 2
         
+        # 1. Keyword search doesn't need the embedding: start it first
+        if keyword_search is None:
+            keyword_search = self.start_keyword_search(tenant_id, query, top_k)
+            
+            # 2. Generate Embedding (Async) unless the caller already did
+            if query_embedding is None:
+                try:
+                    query_embedding = await self.embedding_service.embed_query_vector(query)
+                except BaseException:
+                    keyword_search.cancel()
+                    raise
+        elif query_embedding is None:
+            query_embedding = await self.embedding_service.embed_query_vector(query)
+        
+        # 3. Vector search while keyword search finishes
         vector_task = self.chunk_repo.search_similar(
             tenant_id=tenant_id,
             query_embedding=query_embedding,
             top_k=candidate_k,
         )
         
-        keyword_task = self.chunk_repo.search_keyword(
-            tenant_id=tenant_id,
-            query_text=query,
-            top_k=candidate_k,
-        )
-        
         # Execute in parallel
-        results = await asyncio.gather(vector_task, keyword_task)
+        results = await asyncio.gather(vector_task, keyword_search)
         vector_results, keyword_results = results[0], results[1]
         
-        # 3. Apply Reciprocal Rank Fusion
+        # 4. Apply Reciprocal Rank Fusion
         fused_results = self._reciprocal_rank_fusion([vector_results, keyword_results])
         
-        # 4. Slice to final top_k
+        # 5. Slice to final top_k
         final_results = fused_results[:top_k]
         
         total_ms = int((time.time() - start_time) * 1000)
@@ -99,4 +135,33 @@ class RetrievalService:
             f"fused:{len(final_results)}"
         )
         
-        return final_results
\ No newline at end of file
+        return final_results
+    
+    async def retrieve_context_batch(
+        self,
+        tenant_id: UUID,
+        queries: List[str],
+        query_embeddings: List[VectorLike],
+        top_k: int = None,
+    ) -> List[List[dict]]:
+        """Hybrid retrieval for many queries with one database round trip"""
+        if top_k is None:
+            top_k = settings.TOP_K_RESULTS
+        
+        start_time = time.time()
+        candidates = await self.chunk_repo.search_hybrid_batch(
+            tenant_id=tenant_id,
+            queries=queries,
+            query_embeddings=query_embeddings,
+            top_k=top_k * 2,
+        )
+        results = [
+            self._reciprocal_rank_fusion([vector_results, keyword_results])[:top_k]
+            for vector_results, keyword_results in candidates
+        ]
+        
+        total_ms = int((time.time() - start_time) * 1000)
+        logger.info(
+            f"Batch hybrid retrieval - tenant:{tenant_id} | queries:{len(queries)} | time:{total_ms}ms"
+        )
+        return results
@@ -0,0 +1,217 @@
+"""
+Request coalescing: identical concurrent work runs once and is shared
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+from uuid import uuid4
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.observability.metrics import single_flight_counter
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Delete the lock only if we still own it (it may have expired and been re-taken)
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    In-process, the first caller (leader) starts the work as a task and every
+    caller - leader included - awaits it, so a disconnecting leader doesn't
+    cancel the work for its followers.
+
+    With SINGLE_FLIGHT_DISTRIBUTED, the leader also takes a short Redis lock.
+    Leaders on other replicas that find the lock taken poll `shared_result`
+    (typically the answer cache the winner writes to) instead of redoing the
+    work, and fall back to doing it themselves if the lock disappears or the
+    wait times out.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        # Work nobody would read otherwise (e.g. batch items); cancelled once all callers leave
+        self._abandonable: Set[asyncio.Task] = set()
+
+    async def _wait(self, task: asyncio.Task) -> Tuple[T, bool]:
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            remaining = self._waiters.pop(task) - 1
+            if remaining > 0:
+                self._waiters[task] = remaining
+            elif task in self._abandonable and not task.done():
+                task.cancel()
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        shared_result: Optional[Callable[[], Awaitable[Optional[T]]]] = None,
+        cancel_when_abandoned: bool = False,
+    ) -> Tuple[T, bool]:
+        """
+        Run fn once per key. Returns (result, shared) - shared is False only for
+        the caller that did the work. With cancel_when_abandoned, work started
+        by this call is cancelled once every caller waiting on it is cancelled.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            single_flight_counter.labels(name=self.name, role="follower").inc()
+            result, _ = await self._wait(task)
+            return result, True
+
+        if settings.SINGLE_FLIGHT_DISTRIBUTED and shared_result is not None:
+            task = asyncio.create_task(self._run_distributed(key, fn, shared_result))
+        else:
+            task = asyncio.create_task(self._run_local(fn))
+        self._inflight[key] = task
+        if cancel_when_abandoned:
+            self._abandonable.add(task)
+
+        def _finished(_):
+            self._inflight.pop(key, None)
+            self._abandonable.discard(task)
+
+        task.add_done_callback(_finished)
+
+        result, shared = await self._wait(task)
+        single_flight_counter.labels(
+            name=self.name, role="remote_follower" if shared else "leader"
+        ).inc()
+        return result, shared
+
+    @staticmethod
+    async def _run_local(fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        return await fn(), False
+
+    async def _run_distributed(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        shared_result: Callable[[], Awaitable[Optional[T]]],
+    ) -> Tuple[T, bool]:
+        if not cache_service.is_available:
+            return await fn(), False
+
+        lock_key = f"single_flight:{self.name}:{key}"
+        token = uuid4().hex
+
+        try:
+            acquired = await cache_service.client.set(
+                lock_key, token, nx=True, px=int(settings.SINGLE_FLIGHT_LOCK_SECONDS * 1000)
+            )
+        except RedisError as e:
+            # Coalesce in-process only
+            logger.warning(f"Single-flight lock unavailable for '{self.name}': {e}")
+            return await fn(), False
+
+        if acquired:
+            try:
+                return await fn(), False
+            finally:
+                try:
+                    await cache_service.run_script(RELEASE_LOCK_LUA, [lock_key], [token])
+                except RedisError as e:
+                    logger.warning(f"Failed to release single-flight lock '{lock_key}': {e}")
+
+        # Another replica is doing the work: wait for its result
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_SECONDS)
+            result = await shared_result()
+            if result is not None:
+                return result, True
+            try:
+                if not await cache_service.client.exists(lock_key):
+                    # Winner finished without a shareable result (or failed)
+                    break
+            except RedisError:
+                break
+
+        return await fn(), False
+
+
+class _SharedStream:
+    """One producer, any number of readers; late readers replay from the start"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def read(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            while position < len(self.items):
+                yield self.items[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class StreamFanout:
+    """
+    Shares one async stream (e.g. an LLM token stream) between every caller
+    asking for the same key while it is running. The producer runs as its own
+    task, so readers can disconnect without cutting off the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._streams: Dict[str, _SharedStream] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def subscribe(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        stream = self._streams.get(key)
+        if stream is not None:
+            single_flight_counter.labels(name=self.name, role="follower").inc()
+            return stream.read()
+
+        single_flight_counter.labels(name=self.name, role="leader").inc()
+        stream = _SharedStream()
+        self._streams[key] = stream
+        task = asyncio.create_task(stream.pump(factory()))
+        self._tasks[key] = task
+
+        def _finished(_):
+            self._streams.pop(key, None)
+            self._tasks.pop(key, None)
+
+        task.add_done_callback(_finished)
+        return stream.read()
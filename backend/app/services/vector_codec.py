@@ -0,0 +1,56 @@
+"""
+Compact binary encoding for embedding vectors stored in Redis
+"""
+import struct
+from typing import Sequence, Union
+
+import numpy as np
+
+# magic, format version, dtype code, dimensions
+_HEADER = struct.Struct("<2sBBI")
+_MAGIC = b"WV"
+_VERSION = 1
+_DTYPES = {
+    "float32": (1, np.dtype("<f4")),
+    "float16": (2, np.dtype("<f2")),
+}
+_DTYPES_BY_CODE = {code: dtype for code, dtype in _DTYPES.values()}
+
+VectorLike = Union[np.ndarray, Sequence[float]]
+
+
+class VectorCodecError(ValueError):
+    """The payload is not an encoded vector (e.g. a legacy JSON cache entry)"""
+
+
+def encode_vector(vector: VectorLike, dtype: str = "float32") -> bytes:
+    """Pack a 1-D vector as a small header followed by little-endian floats"""
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unsupported vector dtype: {dtype}")
+    code, np_dtype = _DTYPES[dtype]
+
+    array = np.asarray(vector, dtype=np_dtype)
+    if array.ndim != 1:
+        raise ValueError(f"Expected a 1-D vector, got shape {array.shape}")
+
+    return _HEADER.pack(_MAGIC, _VERSION, code, array.shape[0]) + array.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """
+    Unpack an encoded vector as float32. float32 payloads are a read-only view
+    over `data` (no copy); float16 payloads are widened.
+    """
+    if len(data) < _HEADER.size:
+        raise VectorCodecError("Payload too short for a vector header")
+
+    magic, version, code, dim = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION or code not in _DTYPES_BY_CODE:
+        raise VectorCodecError("Payload is not an encoded vector")
+
+    np_dtype = _DTYPES_BY_CODE[code]
+    if len(data) != _HEADER.size + dim * np_dtype.itemsize:
+        raise VectorCodecError(f"Payload length does not match {dim} dimensions")
+
+    array = np.frombuffer(data, dtype=np_dtype, count=dim, offset=_HEADER.size)
+    return array if np_dtype == np.float32 else array.astype(np.float32)
@@ -0,0 +1,32 @@
+"""
+Long-running query log writer, started next to every Celery worker by
+worker/entrypoint.sh. It does not depend on beat, which only runs on one
+worker (if any).
+
+    python -m app.workers.query_log_drain
+"""
+import asyncio
+import logging
+import signal
+
+from app.services.cache import run_with_cache
+from app.services.query_log import QueryLogConsumer
+from app.workers.db import WorkerAsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    consumer = QueryLogConsumer(session_factory=WorkerAsyncSessionLocal)
+    logger.info(f"Query log drain started as consumer {consumer.consumer_name}")
+    await consumer.run(stopping)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_with_cache(main())
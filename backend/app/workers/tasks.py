@@ -1,5 +1,5 @@
 import io
-import asyncio
+import logging
 from uuid import UUID
 from typing import List
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
@@ -12,8 +12,11 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from app.config import settings
 from app.services.embeddings import EmbeddingService
+from app.services.cache import run_with_cache
+from app.services.corpus_version import corpus_version_service
+from app.services.cache_warming import CacheWarmingService
 from app.services.storage import StorageService
-from app.db.repositories import DocumentRepository, ChunkRepository
+from app.db.repositories import DocumentRepository, ChunkRepository, SemanticCacheRepository
 from app.workers.db import WorkerAsyncSessionLocal
 
 
@@ -36,6 +39,8 @@ def _ensure_rediss_ssl_params(url: str) -> str:
     return urlunparse(parsed._replace(query=new_query))
 
 
+logger = logging.getLogger(__name__)
+
 redis_url = _ensure_rediss_ssl_params(settings.REDIS_URL)
 
 celery_app = Celery(
@@ -65,6 +70,12 @@ celery_app.conf.update(
         2: 10,  # TCP_KEEPINTVL  
         3: 3,   # TCP_KEEPCNT
     },
+    beat_schedule={
+        "warm-query-caches": {
+            "task": "app.workers.tasks.warm_query_caches",
+            "schedule": settings.CACHE_WARM_INTERVAL_SECONDS,
+        },
+    },
 )
 
 
@@ -129,7 +140,7 @@ async def _process_document_async(doc_id: str, tenant_id: str, gcs_path: str):
     """Async function that does the actual document processing"""
     doc_repo = DocumentRepository(session_factory=WorkerAsyncSessionLocal)
     chunk_repo = ChunkRepository(session_factory=WorkerAsyncSessionLocal)
-    embedding_service = EmbeddingService()
+    embedding_service = EmbeddingService(session_factory=WorkerAsyncSessionLocal)
     
     # Download file from GCS
     content = StorageService.download_file(
@@ -204,26 +215,75 @@ async def _process_document_async(doc_id: str, tenant_id: str, gcs_path: str):
     await doc_repo.update_status(UUID(doc_id), "completed")
 
 
+async def _corpus_changed(tenant_id: str) -> None:
+    """
+    Cached answers for this tenant may now be wrong: drop them. Best effort -
+    a cache or broker error must not fail (and so re-ingest) the document.
+    """
+    try:
+        await SemanticCacheRepository(session_factory=WorkerAsyncSessionLocal).clear_tenant(UUID(tenant_id))
+    except Exception as e:
+        logger.warning(f"Failed to clear semantic cache for tenant:{tenant_id}: {e}")
+    try:
+        await corpus_version_service.bump(UUID(tenant_id))
+    except Exception as e:
+        logger.warning(f"Failed to bump corpus version for tenant:{tenant_id}: {e}")
+    if settings.CACHE_WARM_ENABLED:
+        # Re-answer the tenant's top questions against the new documents
+        try:
+            warm_tenant_cache.delay(tenant_id)
+        except Exception as e:
+            logger.warning(f"Failed to enqueue cache warming for tenant:{tenant_id}: {e}")
+
+
 async def _process_and_mark(doc_id: str, tenant_id: str, gcs_path: str) -> None:
     """Async wrapper that does the full document processing."""
     await _process_document_async(doc_id, tenant_id, gcs_path)
+    # New chunks are searchable
+    await _corpus_changed(tenant_id)
 
 
-async def _mark_failed(doc_id: str, error_message: str) -> None:
+async def _mark_failed(doc_id: str, tenant_id: str, error_message: str) -> None:
     """Async helper to mark a document as failed."""
     doc_repo = DocumentRepository(session_factory=WorkerAsyncSessionLocal)
     await doc_repo.update_status(UUID(doc_id), "failed", error_message)
+    # Batches inserted before the failure are already searchable
+    await _corpus_changed(tenant_id)
 
 
 @celery_app.task(bind=True, max_retries=3)
 def process_document(self, doc_id: str, tenant_id: str, gcs_path: str):
-    """Celery entrypoint – runs async processing via asyncio.run."""
+    """Celery entrypoint – runs async processing in its own event loop."""
     try:
-        asyncio.run(_process_and_mark(doc_id, tenant_id, gcs_path))
+        run_with_cache(_process_and_mark(doc_id, tenant_id, gcs_path))
     except Exception as e:
         # Try to record failure in the DB; if that also fails, we still retry.
         try:
-            asyncio.run(_mark_failed(doc_id, str(e)))
+            run_with_cache(_mark_failed(doc_id, tenant_id, str(e)))
         finally:
             raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
 
+
+async def _warm_tenant(tenant_id: str) -> dict:
+    warming = CacheWarmingService(session_factory=WorkerAsyncSessionLocal)
+    return await warming.warm_tenant(UUID(tenant_id))
+
+
+async def _warm_active_tenants() -> List[dict]:
+    warming = CacheWarmingService(session_factory=WorkerAsyncSessionLocal)
+    return await warming.warm_active_tenants()
+
+
+@celery_app.task
+def warm_tenant_cache(tenant_id: str):
+    """Pre-compute answers for one tenant's top queries (e.g. after a corpus change)."""
+    return run_with_cache(_warm_tenant(tenant_id))
+
+
+@celery_app.task
+def warm_query_caches():
+    """Beat entrypoint – keeps every active tenant's top answers warm."""
+    if not settings.CACHE_WARM_ENABLED:
+        return []
+    return run_with_cache(_warm_active_tenants())
+
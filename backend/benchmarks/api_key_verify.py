@@ -0,0 +1,110 @@
+"""
+Benchmark APIKeyRepository.verify_key as the api_keys table grows.
+
+Seeds filler keys into the configured DATABASE_URL under a throwaway tenant,
+then times verification of one real key at each table size. Lookup-id keys
+should stay flat from 10 to 100k rows; legacy keys are shown for contrast at
+small sizes only since they still scan.
+
+Usage (from backend/):
+    python -m benchmarks.api_key_verify [--sizes 10,100,1000,10000,100000] [--runs 50]
+"""
+import argparse
+import asyncio
+import secrets
+import statistics
+import time
+import uuid
+
+from sqlalchemy import insert, delete
+
+from app.auth.utils import hash_api_key
+from app.db.connection import AsyncSessionLocal
+from app.db.models import APIKey, Tenant
+from app.db.repositories import APIKeyRepository, TenantRepository
+
+LEGACY_MAX_ROWS = 100
+INSERT_BATCH = 5000
+
+
+async def _seed_filler(tenant_id: uuid.UUID, count: int, legacy: bool) -> None:
+    # Filler rows never match, so one shared hash is enough and seeding stays fast
+    dummy_hash = hash_api_key(secrets.token_urlsafe(16))
+    async with AsyncSessionLocal() as session:
+        for start in range(0, count, INSERT_BATCH):
+            rows = [
+                {
+                    "tenant_id": tenant_id,
+                    "name": "bench-filler",
+                    "lookup_id": None if legacy else secrets.token_hex(8),
+                    "key_hash": dummy_hash,
+                    "rate_limit_rpm": 60,
+                }
+                for _ in range(min(INSERT_BATCH, count - start))
+            ]
+            await session.execute(insert(APIKey), rows)
+        await session.commit()
+
+
+async def _time_verify(repo: APIKeyRepository, key: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = await repo.verify_key(key)
+        samples.append((time.perf_counter() - t0) * 1000)
+        assert result is not None, "benchmark key failed to verify"
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 2),
+    }
+
+
+async def main(sizes: list, runs: int) -> None:
+    repo = APIKeyRepository()
+    tenant_id = await TenantRepository().create("api-key-verify-benchmark")
+
+    try:
+        created = await repo.create_key(tenant_id, name="bench-target")
+        key = created["key"]
+
+        # Legacy-format key for comparison (no lookup id, must be scanned)
+        legacy_key = f"wvr_{secrets.token_urlsafe(48)}"
+        async with AsyncSessionLocal() as session:
+            session.add(APIKey(
+                tenant_id=tenant_id,
+                name="bench-legacy",
+                key_hash=hash_api_key(legacy_key),
+                rate_limit_rpm=60,
+            ))
+            await session.commit()
+
+        seeded = 1
+        legacy_seeded = 1
+        print(f"{'rows':>8} | {'lookup p50':>10} | {'lookup p95':>10} | {'legacy p50':>10}")
+        for size in sizes:
+            await _seed_filler(tenant_id, size - seeded, legacy=False)
+            seeded = size
+
+            lookup = await _time_verify(repo, key, runs)
+
+            legacy_p50 = "-"
+            if size <= LEGACY_MAX_ROWS:
+                await _seed_filler(tenant_id, size - legacy_seeded, legacy=True)
+                legacy_seeded = size
+                legacy_p50 = (await _time_verify(repo, legacy_key, max(1, runs // 10)))["p50_ms"]
+
+            print(f"{size:>8} | {lookup['p50_ms']:>10} | {lookup['p95_ms']:>10} | {legacy_p50:>10}")
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(Tenant).where(Tenant.id == tenant_id))
+            await session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(main([int(s) for s in args.sizes.split(",")], args.runs))
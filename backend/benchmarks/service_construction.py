@@ -0,0 +1,58 @@
+"""
+Benchmark building the per-request service graph versus reusing the shared one.
+
+Before the service container, every query built QueryService (retrieval,
+embedding and LLM services, plus their Gemini clients) and every upload built
+IngestionService. This times that construction against the dependency lookup
+routes now do. No network calls are made; only object construction is timed.
+
+Usage (from backend/):
+    python -m benchmarks.service_construction [--runs 200]
+"""
+import argparse
+import statistics
+import time
+from types import SimpleNamespace
+
+from app.services.container import ServiceContainer, get_services
+from app.services.ingestion import IngestionService
+from app.services.query import QueryService
+
+
+def _time(fn, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+    }
+
+
+def main(runs: int) -> None:
+    # A stand-in request whose app already holds the container, as after lifespan
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(services=ServiceContainer.build())))
+
+    cases = {
+        "QueryService() per request": QueryService,
+        "IngestionService() per request": IngestionService,
+        "ServiceContainer.build() (once at startup)": ServiceContainer.build,
+        "get_services() per request": lambda: get_services(request),
+    }
+
+    print(f"{'case':<44} | {'p50 ms':>10} | {'p95 ms':>10}")
+    for name, fn in cases.items():
+        fn()  # import-time and first-use costs aren't per request
+        result = _time(fn, runs)
+        print(f"{name:<44} | {result['p50_ms']:>10} | {result['p95_ms']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    main(args.runs)
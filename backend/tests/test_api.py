@@ -27,3 +27,91 @@ def test_invalid_api_key():
     )
     assert response.status_code == 401
 
+
+
+def test_services_are_shared_between_requests():
+    from app.services.container import get_services
+
+    class FakeRequest:
+        app = app
+
+    assert get_services(FakeRequest()) is get_services(FakeRequest())
+
+
+def test_ready_after_startup(monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "SERVICE_WARMUP_ENABLED", False)
+    with TestClient(app) as started:
+        response = started.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+def test_batch_larger_than_key_budget_is_rejected():
+    from uuid import uuid4
+
+    from app.auth.api_key import verify_api_key
+    from app.auth.types import APIKeyData
+
+    tenant_id = uuid4()
+    app.dependency_overrides[verify_api_key] = lambda: APIKeyData(
+        key_id=uuid4(), tenant_id=tenant_id, rate_limit_rpm=10
+    )
+    try:
+        response = client.post(
+            f"/v1/tenants/{tenant_id}/query:batch",
+            json={"queries": [f"q{i}" for i in range(11)]},
+        )
+    finally:
+        app.dependency_overrides.pop(verify_api_key, None)
+
+    # Not a 429: no retry could ever admit it
+    assert response.status_code == 400
+    assert "Retry-After" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_warm_up_calls_provider_clients_directly(monkeypatch):
+    from app.services import container as container_module
+    from app.services.cache import CacheService
+    from app.services.container import ServiceContainer
+
+    class FakeSession:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement):
+            return None
+
+    class FakeEmbeddings:
+        calls = []
+
+        async def aembed_query(self, text, output_dimensionality=None):
+            self.calls.append(text)
+            return [0.0]
+
+    class FakeChat:
+        calls = []
+
+        async def ainvoke(self, prompt):
+            self.calls.append(prompt)
+
+    async def cached_embedding(text):
+        raise AssertionError("warm-up must not go through the embedding cache")
+
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+    monkeypatch.setattr(container_module, "AsyncSessionLocal", FakeSession)
+    services = ServiceContainer.build()
+    embedding_service = services.query_service.retrieval_service.embedding_service
+    embedding_service.embeddings = FakeEmbeddings()
+    monkeypatch.setattr(embedding_service, "embed_query_vector", cached_embedding)
+    services.query_service.llm_service.llm = FakeChat()
+
+    await services.warm_up()
+
+    assert FakeEmbeddings.calls == ["ping"]
+    assert len(FakeChat.calls) == 1
@@ -0,0 +1,21 @@
+import secrets
+
+from app.auth.utils import generate_api_key, parse_lookup_id
+
+
+def test_generated_key_carries_lookup_id():
+    key, lookup_id = generate_api_key()
+    
+    assert key.startswith(f"wvr_{lookup_id}_")
+    assert parse_lookup_id(key) == lookup_id
+
+
+def test_legacy_key_has_no_lookup_id():
+    legacy_key = f"wvr_{secrets.token_urlsafe(48)}"
+    
+    assert parse_lookup_id(legacy_key) is None
+
+
+def test_malformed_key_has_no_lookup_id():
+    assert parse_lookup_id("wvr_ABCDEF0123456789_short") is None
+    assert parse_lookup_id("invalid_key") is None
@@ -0,0 +1,60 @@
+from uuid import uuid4
+
+import pytest
+
+from app.services.bot_config_cache import bot_config_cache
+from app.services.cache import CacheService
+from app.services.llm import LLMService
+from app.services.query import QueryService
+
+
+@pytest.mark.asyncio
+async def test_bot_config_is_loaded_once_and_updates_write_through(monkeypatch):
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+    service = QueryService()
+    tenant_id = uuid4()
+    loads = []
+
+    async def get_by_tenant(tid):
+        loads.append(tid)
+        return {"config": {"system_prompt": "Old prompt"}}
+
+    monkeypatch.setattr(service.bot_repo, "get_by_tenant", get_by_tenant)
+
+    assert await service.get_bot_config(tenant_id) == {"system_prompt": "Old prompt"}
+    assert await service.get_bot_config(tenant_id) == {"system_prompt": "Old prompt"}
+    assert len(loads) == 1
+
+    await bot_config_cache.set(tenant_id, {"system_prompt": "New prompt"})
+    assert await service.get_bot_config(tenant_id) == {"system_prompt": "New prompt"}
+    assert len(loads) == 1
+
+
+def test_system_message_is_memoized_per_prompt():
+    llm = LLMService.__new__(LLMService)
+    llm.default_system_prompt = "Default"
+    chunks = [{"text": "context", "page_num": 1}]
+
+    first = llm.build_prompt("q1", chunks, {"system_prompt": "Be brief."})
+    second = llm.build_prompt("q2", chunks, {"system_prompt": "Be brief."})
+    other = llm.build_prompt("q3", chunks, None)
+
+    assert first[0] is second[0]
+    assert other[0].content == "Default"
+
+
+@pytest.mark.asyncio
+async def test_load_racing_an_update_does_not_restore_the_old_config(monkeypatch):
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+    service = QueryService()
+    tenant_id = uuid4()
+
+    async def get_by_tenant(tid):
+        # The row was read, then the config was updated before the fill
+        await bot_config_cache.set(tenant_id, {"system_prompt": "New prompt"})
+        return {"config": {"system_prompt": "Old prompt"}}
+
+    monkeypatch.setattr(service.bot_repo, "get_by_tenant", get_by_tenant)
+
+    await service.get_bot_config(tenant_id)
+    assert await bot_config_cache.get(tenant_id) == {"system_prompt": "New prompt"}
@@ -0,0 +1,154 @@
+import json
+import time
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from app.services.cache import CacheService, FrequencySketch, L1Cache
+from app.services.vector_codec import VectorCodecError, decode_vector, encode_vector
+
+
+def test_l1_hot_keys_survive_one_off_traffic():
+    cache = L1Cache(max_bytes=1000)
+    for i in range(5):
+        key = f"query:hot{i}"
+        for _ in range(3):
+            cache.get(key)
+        assert cache.put(key, b"x" * 100, ttl=60)
+
+    # A scan of never-repeated keys must not push the hot set out
+    for i in range(100):
+        key = f"query:once{i}"
+        cache.get(key)
+        cache.put(key, b"y" * 200, ttl=60)
+
+    for i in range(5):
+        assert cache.get(f"query:hot{i}") is not None
+    assert cache.rejections > 0
+    assert cache.stats()["bytes"] <= 1000
+
+
+def test_l1_admits_keys_more_popular_than_victims():
+    cache = L1Cache(max_bytes=300)
+    for i in range(3):
+        cache.put(f"emb:{i}", b"z" * 90, ttl=60)
+
+    for _ in range(5):
+        cache.get("emb:popular")
+    assert cache.put("emb:popular", b"p" * 90, ttl=60)
+    assert cache.evictions == 1
+    assert cache.get("emb:popular") == b"p" * 90
+
+
+def test_l1_updates_of_resident_keys_are_admitted_at_capacity():
+    cache = L1Cache(max_bytes=300)
+    for key in ("query:a", "query:b", "query:c"):
+        cache.put(key, b"v" * 90, ttl=60)
+    for _ in range(5):
+        cache.get("query:b")
+        cache.get("query:c")
+
+    # A refreshed (slightly larger) value for a cold resident key still needs room
+    assert cache.put("query:a", b"n" * 100, ttl=60)
+    assert cache.get("query:a") == b"n" * 100
+    assert cache.stats()["bytes"] <= 300
+
+
+def test_l1_entries_expire():
+    cache = L1Cache(max_bytes=1000)
+    cache.put("query:a", b"1", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("query:a") is None
+    assert len(cache) == 0
+
+
+def test_frequency_sketch_ages_counters():
+    sketch = FrequencySketch(width=1024, sample_size=100)
+    for _ in range(10):
+        sketch.increment("k")
+    assert sketch.estimate("k") == 10
+    for i in range(90):
+        sketch.increment(f"other{i}")
+    assert sketch.estimate("k") <= 5
+
+
+def test_vector_codec_round_trip():
+    vector = np.random.default_rng(0).standard_normal(1536).astype(np.float32)
+
+    encoded = encode_vector(vector)
+    assert len(encoded) < len(json.dumps(vector.tolist())) / 4
+    assert np.array_equal(decode_vector(encoded), vector)
+
+    half = decode_vector(encode_vector(vector, "float16"))
+    assert half.dtype == np.float32
+    assert np.allclose(half, vector, atol=1e-2)
+
+
+def test_vector_codec_rejects_json_payloads():
+    with pytest.raises(VectorCodecError):
+        decode_vector(json.dumps([0.1, 0.2, 0.3]).encode())
+
+
+@pytest.mark.asyncio
+async def test_get_many_serves_l1_hits_without_redis(monkeypatch):
+    service = CacheService()
+    monkeypatch.setattr(service, "_l1", L1Cache(max_bytes=10_000))
+    monkeypatch.setattr(service, "_enabled", False)
+
+    await service.set_many({"query:a": {"answer": 1}, "query:b": [1, 2]}, ttl=60)
+
+    assert await service.get_many(["query:a", "query:missing", "query:b"]) == [
+        {"answer": 1}, None, [1, 2]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_corpus_version_bump_drops_local_copy(monkeypatch):
+    from app.services.corpus_version import corpus_version_service
+
+    tenant_id = uuid4()
+    corpus_version_service._local.set(str(tenant_id), 3)
+    assert await corpus_version_service.get(tenant_id) == 3
+
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+    await corpus_version_service.bump(tenant_id)
+
+    assert await corpus_version_service.get(tenant_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_swr_entries_turn_stale_after_soft_ttl(monkeypatch):
+    service = CacheService()
+    monkeypatch.setattr(service, "_l1", L1Cache(max_bytes=10_000))
+    monkeypatch.setattr(service, "_enabled", False)
+
+    await service.set_swr("query:fresh", {"answer": "a"}, soft_ttl=60, hard_ttl=600)
+    await service.set_swr("query:stale", {"answer": "b"}, soft_ttl=0, hard_ttl=600)
+
+    assert await service.get_swr("query:fresh") == ({"answer": "a"}, False)
+    assert await service.get_swr("query:stale") == ({"answer": "b"}, True)
+    assert await service.get_swr("query:missing") == (None, False)
+
+
+def test_run_with_cache_closes_each_loops_pool(monkeypatch):
+    from app.services import cache as cache_module
+
+    closed = []
+
+    class FakeRedis:
+        async def aclose(self):
+            closed.append(self)
+
+    monkeypatch.setattr(cache_module.Redis, "from_url", lambda *args, **kwargs: FakeRedis())
+    monkeypatch.setattr(CacheService(), "_enabled", True)
+
+    async def job():
+        return cache_module.cache_service.client
+
+    # Like two Celery tasks, each with its own asyncio.run
+    first = cache_module.run_with_cache(job())
+    second = cache_module.run_with_cache(job())
+
+    assert first is not second
+    assert closed == [first, second]
@@ -0,0 +1,50 @@
+from uuid import uuid4
+
+import pytest
+
+from app.services.cache import CacheService
+from app.services.cache_warming import CacheWarmingService
+
+
+@pytest.mark.asyncio
+async def test_warm_tenant_reports_hit_ratio_and_respects_budget(monkeypatch):
+    async def cache_set(key, value, ttl):
+        return True
+
+    monkeypatch.setattr(CacheService(), "_enabled", True)
+    monkeypatch.setattr(CacheService(), "set", cache_set)
+
+    warming = CacheWarmingService()
+    warm = {"what are your hours?"}
+    computed = []
+    budget = iter([True, False])
+
+    async def top_queries(tenant_id, limit, since):
+        return [
+            {"query": "What are your hours?", "count": 9},
+            {"query": "what are your hours? ", "count": 3},
+            {"query": "Do you ship abroad?", "count": 5},
+            {"query": "Refund policy", "count": 2},
+        ]
+
+    async def is_cached(tenant_id, query, fresh_for):
+        return query in warm
+
+    async def precompute(tenant_id, query):
+        computed.append(query)
+
+    async def take_budget(tenant_id):
+        return next(budget)
+
+    monkeypatch.setattr(warming.analytics_repo, "get_top_queries", top_queries)
+    monkeypatch.setattr(warming.query_service, "is_answer_cached", is_cached)
+    monkeypatch.setattr(warming.query_service, "precompute_answer", precompute)
+    monkeypatch.setattr(warming, "_take_budget", take_budget)
+
+    stats = await warming.warm_tenant(uuid4())
+
+    assert stats["queries"] == 3
+    assert stats["already_warm"] == 1
+    assert computed == ["do you ship abroad?"]
+    assert stats["over_budget"] == 1
+    assert stats["warm_hit_ratio"] == 33.33
@@ -0,0 +1,54 @@
+from app.services.context_packer import estimate_tokens, pack_context
+from app.services.llm import LLMService
+
+
+def _chunk(doc_id, index, text, similarity=0.9):
+    return {"id": f"{doc_id}-{index}", "doc_id": doc_id, "chunk_index": index,
+            "page_num": 1, "text": text, "similarity": similarity}
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    first_overlap = "the overlapping sentence about refunds."
+    second_overlap = "another sentence shared by chunks."
+    chunks = [
+        _chunk("doc-a", 4, f"{first_overlap} Returns are accepted within 30 days. {second_overlap}"),
+        _chunk("doc-b", 0, "Unrelated shipping details."),
+        _chunk("doc-a", 3, f"Customers may return items. {first_overlap}", similarity=0.7),
+        _chunk("doc-a", 5, f"{second_overlap} Store credit is issued otherwise."),
+    ]
+
+    result = pack_context(chunks, token_budget=10_000)
+
+    # doc-a 3,4,5 become one passage, ranked by its best chunk (first)
+    assert [p["doc_id"] for p in result.passages] == ["doc-a", "doc-b"]
+    merged = result.passages[0]["text"]
+    assert merged.count(first_overlap) == 1
+    assert merged.count(second_overlap) == 1
+    assert merged.startswith("Customers may return items.")
+    assert merged.endswith("Store credit is issued otherwise.")
+    assert result.tokens_saved > 0
+
+
+def test_packing_respects_token_budget():
+    chunks = [
+        _chunk("doc-a", 0, "a" * 400),
+        _chunk("doc-b", 7, "b" * 400),
+        _chunk("doc-c", 2, "c" * 40),
+    ]
+
+    result = pack_context(chunks, token_budget=120)
+
+    # The second passage doesn't fit, the smaller third one still does
+    assert [p["doc_id"] for p in result.passages] == ["doc-a", "doc-c"]
+    assert result.tokens_after <= 120
+    assert result.tokens_after == sum(estimate_tokens(p["text"]) for p in result.passages)
+
+
+def test_build_prompt_uses_bot_token_budget():
+    llm = LLMService.__new__(LLMService)
+    llm.default_system_prompt = "Default"
+    chunks = [_chunk("doc-a", 0, "z" * 4000)]
+
+    messages = llm.build_prompt("q", chunks, {"context_token_budget": 100})
+
+    assert messages[1].content.count("z") == 400
@@ -0,0 +1,64 @@
+from uuid import uuid4
+
+import pytest
+
+from app.config import settings
+from app.workers import tasks
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    calls = []
+
+    async def process_document_async(doc_id, tenant_id, gcs_path):
+        calls.append("processed")
+
+    async def clear_tenant(self, tenant_id):
+        calls.append("semantic_cache_cleared")
+
+    async def bump(tenant_id):
+        calls.append("version_bumped")
+
+    monkeypatch.setattr(tasks, "_process_document_async", process_document_async)
+    monkeypatch.setattr(tasks.SemanticCacheRepository, "clear_tenant", clear_tenant)
+    monkeypatch.setattr(tasks.corpus_version_service, "bump", bump)
+    monkeypatch.setattr(settings, "CACHE_WARM_ENABLED", False)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_corpus_version_failure_does_not_fail_ingestion(ingestion, monkeypatch):
+    async def bump(tenant_id):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(tasks.corpus_version_service, "bump", bump)
+
+    await tasks._process_and_mark(str(uuid4()), str(uuid4()), "gs://bucket/doc.pdf")
+
+    assert ingestion == ["processed", "semantic_cache_cleared"]
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_failure_does_not_fail_ingestion(ingestion, monkeypatch):
+    async def clear_tenant(self, tenant_id):
+        raise RuntimeError("database error")
+
+    monkeypatch.setattr(tasks.SemanticCacheRepository, "clear_tenant", clear_tenant)
+
+    await tasks._process_and_mark(str(uuid4()), str(uuid4()), "gs://bucket/doc.pdf")
+
+    # The remaining invalidation still happens
+    assert ingestion == ["processed", "version_bumped"]
+
+
+@pytest.mark.asyncio
+async def test_warm_enqueue_failure_does_not_fail_ingestion(ingestion, monkeypatch):
+    def delay(tenant_id):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(settings, "CACHE_WARM_ENABLED", True)
+    monkeypatch.setattr(tasks.warm_tenant_cache, "delay", delay)
+
+    await tasks._process_and_mark(str(uuid4()), str(uuid4()), "gs://bucket/doc.pdf")
+
+    assert ingestion == ["processed", "semantic_cache_cleared", "version_bumped"]
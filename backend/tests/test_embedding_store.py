@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from app.services.cache import CacheService
+from app.services.embeddings import EmbeddingService
+
+
+@pytest.mark.asyncio
+async def test_embed_documents_falls_back_redis_store_provider(monkeypatch):
+    service = EmbeddingService()
+    redis = {}
+    store = {}
+    provider_calls = []
+
+    async def get_vectors(keys):
+        return [redis.get(key) for key in keys]
+
+    async def set_vectors(vectors, ttl):
+        redis.update({key: np.asarray(v, dtype=np.float32) for key, v in vectors.items()})
+        return True
+
+    async def store_get_many(hashes, model, dimensions):
+        return {h: store[h] for h in hashes if h in store}
+
+    async def store_put_many(embeddings, model, dimensions):
+        store.update({h: np.asarray(v, dtype=np.float32) for h, v in embeddings.items()})
+
+    class FakeProvider:
+        async def aembed_documents(self, texts, output_dimensionality):
+            provider_calls.append(list(texts))
+            return [[float(len(text)), 1.0] for text in texts]
+
+    monkeypatch.setattr(CacheService(), "get_vectors", get_vectors)
+    monkeypatch.setattr(CacheService(), "set_vectors", set_vectors)
+    monkeypatch.setattr(service.store, "get_many", store_get_many)
+    monkeypatch.setattr(service.store, "put_many", store_put_many)
+    monkeypatch.setattr(service, "embeddings", FakeProvider())
+
+    # Texts differing only in case are distinct; duplicates are embedded once
+    first = await service.embed_documents(["Alpha", "alpha", "Alpha"])
+    assert provider_calls == [["Alpha", "alpha"]]
+    assert first[0] == first[2] == [5.0, 1.0]
+    assert len(store) == 2
+
+    # Redis TTL expired: the durable store answers, nothing is re-embedded
+    redis.clear()
+    second = await service.embed_documents(["alpha", "Alpha", "beta"])
+    assert provider_calls == [["Alpha", "alpha"], ["beta"]]
+    assert second == [[5.0, 1.0], [5.0, 1.0], [4.0, 1.0]]
+    assert len(redis) == 3
@@ -0,0 +1,55 @@
+from uuid import uuid4
+
+import pytest
+
+from app.auth.key_cache import APIKeyCache
+from app.auth.types import APIKeyData
+from app.services.cache import CacheService, cache_service
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    store = {}
+
+    async def get(key):
+        return store.get(key)
+
+    async def set(key, value, ttl):
+        store[key] = value
+        return True
+
+    async def delete(key):
+        store.pop(key, None)
+        return True
+
+    monkeypatch.setattr(cache_service, "get", get)
+    monkeypatch.setattr(cache_service, "set", set)
+    monkeypatch.setattr(cache_service, "delete", delete)
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+    return store
+
+
+@pytest.mark.asyncio
+async def test_key_revoked_during_verification_is_not_cached(fake_redis):
+    cache = APIKeyCache()
+    key_data = APIKeyData(key_id=uuid4(), tenant_id=uuid4(), rate_limit_rpm=60)
+
+    # The database said the key was valid, then it was revoked before the write
+    await cache.invalidate(key_data.key_id)
+    await cache.set("wvr_key", key_data)
+
+    assert await cache.get("wvr_key") is None
+    assert cache._entry_key(cache.digest("wvr_key")) not in fake_redis
+
+
+@pytest.mark.asyncio
+async def test_key_id_index_follows_local_expiry(fake_redis):
+    cache = APIKeyCache()
+    cache._local.ttl = -1
+    key_data = APIKeyData(key_id=uuid4(), tenant_id=uuid4(), rate_limit_rpm=60)
+
+    await cache.set("wvr_key", key_data)
+    fake_redis.clear()
+    assert await cache.get("wvr_key") is None
+
+    assert cache._digests_by_key_id == {}
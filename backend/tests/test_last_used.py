@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+from app.config import settings
+from app.db import repositories
+from app.db.repositories import APIKeyRepository
+from app.services import last_used
+from app.services.last_used import LastUsedTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.current = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def now(self, tz=None):
+        return self.current
+
+    def advance(self, seconds: int = 1) -> datetime:
+        self.current += timedelta(seconds=seconds)
+        return self.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(last_used, "datetime", clock)
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_last_used_coalesces_uses_into_one_batched_write(monkeypatch, clock):
+    tracker = LastUsedTracker()
+    batches = []
+
+    async def update_last_used_batch(pending):
+        batches.append(dict(pending))
+
+    monkeypatch.setattr(tracker._api_key_repo, "update_last_used_batch", update_last_used_batch)
+
+    key_a, key_b = uuid4(), uuid4()
+    for _ in range(3):
+        clock.advance()
+        tracker.record(key_a)
+    tracker.record(key_b)
+
+    await tracker.flush()
+    await tracker.flush()
+
+    # One write carrying only the latest use per key; nothing left to send after
+    assert batches == [{key_a: clock.current, key_b: clock.current}]
+
+
+@pytest.mark.asyncio
+async def test_last_used_failed_flush_never_moves_a_timestamp_backwards(monkeypatch, clock):
+    tracker = LastUsedTracker()
+    key_id = uuid4()
+    batches = []
+
+    async def update_last_used_batch(pending):
+        batches.append(dict(pending))
+        if len(batches) == 1:
+            # The key is used again while the failing write is in flight
+            clock.advance()
+            tracker.record(key_id)
+            raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(tracker._api_key_repo, "update_last_used_batch", update_last_used_batch)
+
+    tracker.record(key_id)
+    first_use = clock.current
+
+    await tracker.flush()
+    await tracker.flush()
+
+    # The retried batch keeps the newer use rather than restoring the older one
+    assert batches == [{key_id: first_use}, {key_id: first_use + timedelta(seconds=1)}]
+
+
+@pytest.mark.asyncio
+async def test_last_used_failed_flush_is_retried(monkeypatch, clock):
+    tracker = LastUsedTracker()
+    key_id = uuid4()
+    attempts = []
+
+    async def update_last_used_batch(pending):
+        attempts.append(dict(pending))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(tracker._api_key_repo, "update_last_used_batch", update_last_used_batch)
+
+    tracker.record(key_id)
+    await tracker.flush()
+    await tracker.flush()
+
+    assert attempts == [{key_id: clock.current}, {key_id: clock.current}]
+
+
+@pytest.mark.asyncio
+async def test_last_used_stop_drains_the_buffer(monkeypatch):
+    monkeypatch.setattr(settings, "API_KEY_LAST_USED_FLUSH_SECONDS", 3600)
+    tracker = LastUsedTracker()
+    batches = []
+
+    async def update_last_used_batch(pending):
+        batches.append(set(pending))
+
+    monkeypatch.setattr(tracker._api_key_repo, "update_last_used_batch", update_last_used_batch)
+
+    await tracker.start()
+    key_id = uuid4()
+    tracker.record(key_id)
+    await tracker.stop()
+
+    assert batches == [{key_id}]
+
+
+@pytest.mark.asyncio
+async def test_last_used_batch_update_only_moves_timestamps_forward(monkeypatch):
+    statements = []
+
+    class FakeSession:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement, params=None):
+            statements.append((str(statement), params))
+
+        async def commit(self):
+            pass
+
+    monkeypatch.setattr(repositories, "AsyncSessionLocal", FakeSession)
+
+    key_id, used_at = uuid4(), datetime.now(timezone.utc)
+    await APIKeyRepository().update_last_used_batch({key_id: used_at})
+
+    # Flushes from several replicas may arrive out of order
+    [(sql, params)] = statements
+    assert "k.last_used_at < v.last_used_at" in sql
+    assert params == {"key_ids": [key_id], "timestamps": [used_at]}
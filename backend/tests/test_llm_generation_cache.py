@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.services.cache import cache_service
+from app.services.corpus_version import corpus_version_service
+from app.services.llm import LLMService, canonical_question
+
+
+class FakeChat:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content=f"answer {self.calls}")
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    store = {}
+    version = {"value": 1}
+
+    async def get(key):
+        return store.get(key)
+
+    async def set(key, value, ttl):
+        store[key] = value
+        return True
+
+    async def get_version(tenant_id):
+        return version["value"]
+
+    monkeypatch.setattr(cache_service, "get", get)
+    monkeypatch.setattr(cache_service, "set", set)
+    monkeypatch.setattr(corpus_version_service, "get", get_version)
+    return version
+
+
+def test_canonical_question():
+    assert canonical_question("  What is the  refund policy?? ") == "what is the refund policy"
+
+
+@pytest.mark.asyncio
+async def test_generation_is_reused_for_same_prompt_inputs(fake_cache):
+    llm = LLMService.__new__(LLMService)
+    llm.default_system_prompt = "Default"
+    llm.llm = FakeChat()
+    tenant_id = uuid4()
+    chunks = [{"id": "c1", "text": "Refunds within 30 days."}, {"id": "c2", "text": "Email support."}]
+
+    first = await llm.generate_answer("What is the refund policy?", chunks, None, tenant_id=tenant_id)
+    again = await llm.generate_answer("what is the  refund policy", chunks, None, tenant_id=tenant_id)
+    assert first == again == "answer 1"
+
+    # Different chunk order, system prompt or corpus version: new generation
+    assert await llm.generate_answer("What is the refund policy?", chunks[::-1], None, tenant_id=tenant_id) == "answer 2"
+    assert await llm.generate_answer(
+        "What is the refund policy?", chunks, {"system_prompt": "Be brief."}, tenant_id=tenant_id
+    ) == "answer 3"
+    fake_cache["value"] = 2
+    assert await llm.generate_answer("What is the refund policy?", chunks, None, tenant_id=tenant_id) == "answer 4"
+
+    # Without a tenant nothing is cached
+    assert await llm.generate_answer("What is the refund policy?", chunks, None) == "answer 5"
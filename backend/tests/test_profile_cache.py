@@ -0,0 +1,47 @@
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth import oauth
+from app.auth.profile_cache import invalidate_user_profile, profile_cache
+from app.db.repositories import ProfileRepository
+from app.services.cache import CacheService
+
+
+@pytest.mark.asyncio
+async def test_invalidating_a_profile_drops_the_cached_copy(monkeypatch):
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+
+    user_id = uuid4()
+    profile_cache.set(str(user_id), {"tenant_id": uuid4(), "role": "owner"})
+
+    await invalidate_user_profile(user_id)
+
+    assert profile_cache.get(str(user_id)) is None
+
+
+@pytest.mark.asyncio
+async def test_profile_is_usable_right_after_signup(monkeypatch):
+    user_id, tenant_id = uuid4(), uuid4()
+    profiles = {}
+
+    async def authenticate(token):
+        return {"id": user_id, "email": "user@example.com"}
+
+    async def get_by_id(self, requested_id):
+        return profiles.get(requested_id)
+
+    monkeypatch.setattr(oauth, "_authenticate", authenticate)
+    monkeypatch.setattr(ProfileRepository, "get_by_id", get_by_id)
+
+    # Before signup the user has no profile; that miss must not be cached
+    with pytest.raises(HTTPException) as exc:
+        await oauth.get_current_user(authorization="Bearer token")
+    assert exc.value.status_code == 404
+
+    profiles[user_id] = {"tenant_id": tenant_id, "role": "owner"}
+    user = await oauth.get_current_user(authorization="Bearer token")
+
+    assert user.tenant_id == tenant_id
+    profile_cache.delete(str(user_id))
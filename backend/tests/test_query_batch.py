@@ -0,0 +1,160 @@
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from app.services.cache import CacheService
+from app.services.query import QueryService
+
+
+@pytest.mark.asyncio
+async def test_query_batch_serves_cache_and_batches_misses(monkeypatch):
+    service = QueryService()
+    tenant_id = uuid4()
+    calls = {"embed": [], "retrieve": [], "llm": []}
+    cached_answer = {"answer": "cached", "sources": [], "confidence": "high", "latency_ms": 1}
+
+    async def answer_cache_key(tid, query):
+        return f"query:{query.lower().strip()}"
+
+    async def get_swr_many(keys, stale_margin=0):
+        return [(cached_answer, False) if key == "query:cached?" else (None, False) for key in keys]
+
+    async def set_swr(*args, **kwargs):
+        return True
+
+    async def get_bot_config(tid):
+        return {}
+
+    async def embed_query_vectors(texts):
+        calls["embed"].append(list(texts))
+        return [np.ones(4, dtype=np.float32) for _ in texts]
+
+    async def retrieve_context_batch(tenant_id, queries, query_embeddings):
+        calls["retrieve"].append(list(queries))
+        return [[{"id": "c1", "doc_id": "d1", "text": "t", "similarity": 0.9}] for _ in queries]
+
+    async def find_similar(tenant_id, query_embedding, threshold):
+        return None
+
+    async def generate_answer(query, chunks, bot_config, tenant_id=None, use_cache=True):
+        calls["llm"].append(query)
+        return f"answer to {query}"
+
+    async def store(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(service, "answer_cache_key", answer_cache_key)
+    monkeypatch.setattr(service, "get_bot_config", get_bot_config)
+    monkeypatch.setattr(CacheService(), "get_swr_many", get_swr_many)
+    monkeypatch.setattr(CacheService(), "set_swr", set_swr)
+    monkeypatch.setattr(service.retrieval_service.embedding_service, "embed_query_vectors", embed_query_vectors)
+    monkeypatch.setattr(service.retrieval_service, "retrieve_context_batch", retrieve_context_batch)
+    monkeypatch.setattr(service.semantic_cache_repo, "find_similar", find_similar)
+    monkeypatch.setattr(service.semantic_cache_repo, "store", store)
+    monkeypatch.setattr(service.llm_service, "generate_answer", generate_answer)
+
+    queries = ["Hours?", "cached?", "Refunds?", "hours?"]
+    results = [item async for item in service.query_batch(tenant_id, queries, uuid4())]
+
+    # Cached answers come back before anything is computed
+    assert results[0] == {"index": 1, "query": "cached?", **cached_answer}
+    by_index = {item["index"]: item for item in results}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[3]["answer"] == by_index[0]["answer"] == "answer to Hours?"
+
+    # One embedding call and one retrieval statement for all distinct misses
+    assert calls["embed"] == [["Hours?", "Refunds?"]]
+    assert calls["retrieve"] == [["Hours?", "Refunds?"]]
+    assert sorted(calls["llm"]) == ["Hours?", "Refunds?"]
+
+
+@pytest.mark.asyncio
+async def test_query_batch_reports_errors_when_retrieval_fails(monkeypatch):
+    service = QueryService()
+    cached_answer = {"answer": "cached", "sources": [], "confidence": "high", "latency_ms": 1}
+
+    async def answer_cache_key(tid, query):
+        return f"query:{query}"
+
+    async def get_swr_many(keys, stale_margin=0):
+        return [(cached_answer, False) if key == "query:cached?" else (None, False) for key in keys]
+
+    async def get_bot_config(tid):
+        return {}
+
+    async def embed_query_vectors(texts):
+        raise RuntimeError("provider unavailable")
+
+    monkeypatch.setattr(service, "answer_cache_key", answer_cache_key)
+    monkeypatch.setattr(service, "get_bot_config", get_bot_config)
+    monkeypatch.setattr(CacheService(), "get_swr_many", get_swr_many)
+    monkeypatch.setattr(service.retrieval_service.embedding_service, "embed_query_vectors", embed_query_vectors)
+
+    queries = ["cached?", "a?", "b?", "a?"]
+    results = [item async for item in service.query_batch(uuid4(), queries, uuid4())]
+
+    # The stream still ends cleanly with one line per question
+    assert results[0]["answer"] == "cached"
+    assert sorted(item["index"] for item in results[1:]) == [1, 2, 3]
+    assert all("error" in item for item in results[1:])
+
+
+@pytest.mark.asyncio
+async def test_query_batch_stops_answering_when_the_client_disconnects(monkeypatch):
+    import asyncio
+
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "QUERY_BATCH_LLM_CONCURRENCY", 1)
+    service = QueryService()
+    generated = []
+    cancelled = []
+
+    async def answer_cache_key(tid, query):
+        return f"query:{query}"
+
+    async def get_swr_many(keys, stale_margin=0):
+        return [(None, False) for _ in keys]
+
+    async def get_bot_config(tid):
+        return {}
+
+    async def embed_query_vectors(texts):
+        return [np.ones(4, dtype=np.float32) for _ in texts]
+
+    async def retrieve_context_batch(tenant_id, queries, query_embeddings):
+        return [[{"id": "c1", "doc_id": "d1", "text": "t", "similarity": 0.9}] for _ in queries]
+
+    async def find_similar(tenant_id, query_embedding, threshold):
+        return None
+
+    async def generate(ctx, context_chunks):
+        generated.append(ctx.query)
+        if ctx.query != "q0":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(ctx.query)
+                raise
+        return {"answer": ctx.query, "sources": [], "confidence": "high", "latency_ms": 1}
+
+    monkeypatch.setattr(service, "answer_cache_key", answer_cache_key)
+    monkeypatch.setattr(service, "get_bot_config", get_bot_config)
+    monkeypatch.setattr(CacheService(), "get_swr_many", get_swr_many)
+    monkeypatch.setattr(service.retrieval_service.embedding_service, "embed_query_vectors", embed_query_vectors)
+    monkeypatch.setattr(service.retrieval_service, "retrieve_context_batch", retrieve_context_batch)
+    monkeypatch.setattr(service.semantic_cache_repo, "find_similar", find_similar)
+    monkeypatch.setattr(service, "_generate", generate)
+
+    stream = service.query_batch(uuid4(), [f"q{i}" for i in range(5)], uuid4())
+    first = await stream.__anext__()
+    assert first["query"] == "q0"
+
+    # The client goes away after the first line
+    await stream.aclose()
+    await asyncio.sleep(0.05)
+
+    # Whatever was mid-generation was cancelled; nothing pending was started
+    assert len(generated) <= 2
+    assert cancelled == generated[1:]
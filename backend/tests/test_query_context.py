@@ -0,0 +1,180 @@
+import asyncio
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from app.services.cache import CacheService
+from app.services.query import QueryService
+
+
+@pytest.mark.asyncio
+async def test_answer_embeds_once_and_overlaps_keyword_search(monkeypatch):
+    service = QueryService()
+    events = []
+
+    async def embed_query_vector(text):
+        events.append("embed_start")
+        await asyncio.sleep(0.01)
+        events.append("embed_end")
+        return np.ones(4, dtype=np.float32)
+
+    async def search_keyword(tenant_id, query_text, top_k):
+        events.append("keyword_start")
+        return [{"id": "k1", "doc_id": "d1", "text": "kw", "similarity": 0.9}]
+
+    async def search_similar(tenant_id, query_embedding, top_k):
+        events.append("vector")
+        return [{"id": "v1", "doc_id": "d2", "text": "vec", "similarity": 0.9}]
+
+    async def get_bot(tenant_id):
+        return {"config": {"system_prompt": "Be brief."}}
+
+    async def find_similar(tenant_id, query_embedding, threshold):
+        return None
+
+    async def generate_answer(query, chunks, bot_config, tenant_id=None, use_cache=True):
+        assert bot_config == {"system_prompt": "Be brief."}
+        return "answer"
+
+    async def set_swr(*args, **kwargs):
+        return True
+
+    async def store(*args, **kwargs):
+        return None
+
+    embedding_service = service.retrieval_service.embedding_service
+    monkeypatch.setattr(embedding_service, "embed_query_vector", embed_query_vector)
+    monkeypatch.setattr(service.retrieval_service.chunk_repo, "search_keyword", search_keyword)
+    monkeypatch.setattr(service.retrieval_service.chunk_repo, "search_similar", search_similar)
+    monkeypatch.setattr(service.bot_repo, "get_by_tenant", get_bot)
+    monkeypatch.setattr(service.semantic_cache_repo, "find_similar", find_similar)
+    monkeypatch.setattr(service.semantic_cache_repo, "store", store)
+    monkeypatch.setattr(service.llm_service, "generate_answer", generate_answer)
+    monkeypatch.setattr(CacheService(), "set_swr", set_swr)
+
+    result = await service._answer(uuid4(), "hours?", "query:test", 0.0)
+
+    assert result["answer"] == "answer"
+    assert events.count("embed_start") == 1
+    # Keyword search ran while the embedding was being computed
+    assert events.index("keyword_start") < events.index("embed_end")
+    assert events[-1] == "vector"
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_hit_cancels_speculative_retrieval(monkeypatch):
+    service = QueryService()
+    vector_search_started = asyncio.Event()
+    vector_search_cancelled = asyncio.Event()
+
+    async def embed_query_vector(text):
+        return np.ones(4, dtype=np.float32)
+
+    async def search_keyword(tenant_id, query_text, top_k):
+        return []
+
+    async def search_similar(tenant_id, query_embedding, top_k):
+        vector_search_started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            vector_search_cancelled.set()
+            raise
+        return []
+
+    async def get_bot(tenant_id):
+        return None
+
+    async def find_similar(tenant_id, query_embedding, threshold):
+        # Retrieval is already running while the cache is checked
+        await vector_search_started.wait()
+        return {"answer": "cached", "sources": [], "similarity": 0.99}
+
+    async def set_swr(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(service.retrieval_service.embedding_service, "embed_query_vector", embed_query_vector)
+    monkeypatch.setattr(service.retrieval_service.chunk_repo, "search_keyword", search_keyword)
+    monkeypatch.setattr(service.retrieval_service.chunk_repo, "search_similar", search_similar)
+    monkeypatch.setattr(service.bot_repo, "get_by_tenant", get_bot)
+    monkeypatch.setattr(service.semantic_cache_repo, "find_similar", find_similar)
+    monkeypatch.setattr(CacheService(), "set_swr", set_swr)
+
+    result = await asyncio.wait_for(service._answer(uuid4(), "hours?", "query:test", 0.0), 1)
+    await asyncio.sleep(0)
+
+    assert result["answer"] == "cached"
+    assert vector_search_cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_refresh_regenerates_instead_of_reusing_cached_answers(monkeypatch):
+    service = QueryService()
+    generations = []
+
+    async def embed_query_vector(text):
+        return np.ones(4, dtype=np.float32)
+
+    async def search_keyword(tenant_id, query_text, top_k):
+        return []
+
+    async def search_similar(tenant_id, query_embedding, top_k):
+        return [{"id": "v1", "doc_id": "d1", "text": "new", "similarity": 0.9}]
+
+    async def get_bot(tenant_id):
+        return None
+
+    async def find_similar(tenant_id, query_embedding, threshold):
+        raise AssertionError("a refresh must not read the semantic cache")
+
+    async def generate_answer(query, chunks, bot_config, tenant_id=None, use_cache=True):
+        generations.append(use_cache)
+        return "fresh answer"
+
+    async def set_swr(*args, **kwargs):
+        return True
+
+    async def store(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(service.retrieval_service.embedding_service, "embed_query_vector", embed_query_vector)
+    monkeypatch.setattr(service.retrieval_service.chunk_repo, "search_keyword", search_keyword)
+    monkeypatch.setattr(service.retrieval_service.chunk_repo, "search_similar", search_similar)
+    monkeypatch.setattr(service.bot_repo, "get_by_tenant", get_bot)
+    monkeypatch.setattr(service.semantic_cache_repo, "find_similar", find_similar)
+    monkeypatch.setattr(service.semantic_cache_repo, "store", store)
+    monkeypatch.setattr(service.llm_service, "generate_answer", generate_answer)
+    monkeypatch.setattr(CacheService(), "set_swr", set_swr)
+
+    result = await service._recompute(uuid4(), "hours?", "query:test", 0.0)
+
+    assert result["answer"] == "fresh answer"
+    # Nor the generation cache
+    assert generations == [False]
+
+
+@pytest.mark.asyncio
+async def test_refresh_slots_are_reserved_when_scheduled(monkeypatch):
+    from app.config import settings
+    from app.services import query as query_module
+
+    monkeypatch.setattr(settings, "QUERY_REFRESH_MAX_CONCURRENT", 2)
+    service = QueryService()
+    release = asyncio.Event()
+    started = []
+
+    async def refresh(tenant_id, query, cache_key, quota_tenant_id):
+        started.append(query)
+        await release.wait()
+
+    monkeypatch.setattr(service, "_refresh", refresh)
+
+    # A burst of stale hits within one tick
+    for i in range(5):
+        service._schedule_refresh(uuid4(), f"q{i}", f"query:q{i}", uuid4())
+    assert len(query_module._background_refreshes) == 2
+
+    release.set()
+    await asyncio.gather(*query_module._background_refreshes)
+    assert started == ["q0", "q1"]
@@ -0,0 +1,75 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.config import settings
+from app.services.cache import CacheService
+from app.services.query_log import QueryLogConsumer, QueryLogQueue
+
+
+@pytest.mark.asyncio
+async def test_query_log_buffer_is_bounded_and_falls_back_to_direct_insert(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_LOG_BUFFER_MAX", 3)
+    monkeypatch.setattr(settings, "QUERY_LOG_BATCH_SIZE", 2)
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+
+    queue = QueryLogQueue()
+    batches = []
+
+    async def log_queries_batch(records):
+        batches.append([record["query"] for record in records])
+
+    monkeypatch.setattr(queue._query_log_repo, "log_queries_batch", log_queries_batch)
+
+    tenant_id = uuid4()
+    for i in range(5):
+        queue.record(tenant_id, uuid4(), f"q{i}", "answer", "high", 10, [{"doc_id": uuid4()}])
+
+    # Oldest records are dropped instead of growing without bound
+    await queue.flush()
+    assert batches == [["q2", "q3"], ["q4"]]
+
+
+@pytest.mark.asyncio
+async def test_query_log_keeps_records_when_write_fails(monkeypatch):
+    monkeypatch.setattr(CacheService(), "_enabled", False)
+    queue = QueryLogQueue()
+    attempts = []
+
+    async def log_queries_batch(records):
+        attempts.append(len(records))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(queue._query_log_repo, "log_queries_batch", log_queries_batch)
+
+    queue.record(uuid4(), None, "q", "answer", "low", 10, [])
+    await queue.flush()
+    await queue.flush()
+
+    assert attempts == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_query_log_consumer_keeps_draining_until_stopped(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_LOG_DRAIN_INTERVAL_SECONDS", 0.01)
+    consumer = QueryLogConsumer()
+    stopping = asyncio.Event()
+    results = [RuntimeError("redis blip"), 3, 0, 2, 0]
+    calls = []
+
+    async def drain():
+        calls.append(len(calls))
+        result = results[len(calls) - 1] if len(calls) <= len(results) else 0
+        if len(calls) == len(results):
+            stopping.set()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(consumer, "drain", drain)
+    await asyncio.wait_for(consumer.run(stopping), timeout=2)
+
+    # A failed pass doesn't end the loop
+    assert len(calls) == len(results)
@@ -0,0 +1,149 @@
+import time
+from uuid import uuid4
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+from app.auth.types import APIKeyData
+from app.config import settings
+from app.middleware.rate_limit import RATE_LIMIT_LEASE_LUA, LeasedRateLimiter, _gcra_key, enforce_rate_limits
+from app.services.cache import CacheService, cache_service
+from app.services.rate_limit import DailyLimitService
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(CacheService, "client", property(lambda self: client))
+    monkeypatch.setattr(CacheService(), "_enabled", True)
+    monkeypatch.setattr(CacheService(), "_script_shas", {})
+    monkeypatch.setattr(settings, "MAX_QUERIES_PER_DAY", 1000)
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_DAILY_SHARE", 0.01)
+    return client
+
+
+def _key_data(rpm: int = 600) -> APIKeyData:
+    return APIKeyData(key_id=uuid4(), tenant_id=uuid4(), rate_limit_rpm=rpm)
+
+
+async def _lease(key_data, want, refund=0, daily_cap=100):
+    keys = [_gcra_key(key_data), DailyLimitService._get_daily_key(key_data.tenant_id)]
+    args = [key_data.rate_limit_rpm, settings.MAX_QUERIES_PER_DAY, int(time.time()) + 3600, want, refund, daily_cap]
+    return await cache_service.run_script(RATE_LIMIT_LEASE_LUA, keys, args)
+
+
+async def _daily_used(redis, key_data) -> int:
+    return int(await redis.get(DailyLimitService._get_daily_key(key_data.tenant_id)) or 0)
+
+
+@pytest.mark.asyncio
+async def test_lease_script_grants_caps_and_refunds(redis):
+    key_data = _key_data(rpm=20)
+
+    granted, _, _, daily_used, reason = await _lease(key_data, 10)
+    assert (granted, daily_used, reason) == (10, 10, 0)
+
+    # Only 10 left this minute: a partial grant limited by the minute budget
+    granted, minute_remaining, _, _, reason = await _lease(key_data, 15)
+    assert (granted, minute_remaining, reason) == (10, 0, 1)
+
+    # Unused tokens come back to both budgets
+    granted, _, _, daily_used, _ = await _lease(key_data, 0, refund=5, daily_cap=0)
+    assert granted == 0
+    assert daily_used == 15
+
+    # The daily cap bounds a lease without being reported as a limit
+    granted, _, _, _, reason = await _lease(key_data, 5, daily_cap=2)
+    assert (granted, reason) == (2, 0)
+
+
+@pytest.mark.asyncio
+async def test_lease_script_reports_daily_limit(redis, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_QUERIES_PER_DAY", 3)
+    key_data = _key_data()
+
+    granted, _, _, daily_used, reason = await _lease(key_data, 10)
+    assert (granted, daily_used, reason) == (3, 3, 2)
+
+
+@pytest.mark.asyncio
+async def test_acquire_spends_lease_locally_and_returns_it_on_expiry(redis, monkeypatch):
+    limiter = LeasedRateLimiter()
+    key_data = _key_data()
+    quota_tenant_id = key_data.tenant_id
+
+    for _ in range(4):
+        await limiter.acquire(key_data, quota_tenant_id, cost=1, lease_size=10)
+    # One lease of min(10, 1% of 1000) tokens, three of them spent locally
+    assert await _daily_used(redis, key_data) == 10
+
+    lease = limiter._leases[(key_data.key_id, quota_tenant_id)]
+    assert lease.tokens == 6
+    lease.expires_at = 0.0
+    await limiter.release_expired()
+    assert await _daily_used(redis, key_data) == 4
+    assert not limiter._leases
+
+
+@pytest.mark.asyncio
+async def test_lease_takes_a_small_slice_of_a_small_daily_quota(redis, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_QUERIES_PER_DAY", 50)
+    limiter = LeasedRateLimiter()
+    key_data = _key_data()
+
+    await limiter.acquire(key_data, key_data.tenant_id, cost=1, lease_size=50)
+
+    # Other replicas still have the rest of the day's quota
+    assert await _daily_used(redis, key_data) == 1
+
+
+@pytest.mark.asyncio
+async def test_acquire_hands_back_a_partial_grant_and_raises(redis, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_QUERIES_PER_DAY", 3)
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_DAILY_SHARE", 1.0)
+    limiter = LeasedRateLimiter()
+    key_data = _key_data()
+
+    with pytest.raises(HTTPException) as exc:
+        await limiter.acquire(key_data, key_data.tenant_id, cost=5, lease_size=10)
+    assert exc.value.status_code == 429
+
+    # The 3 tokens granted were parked as an expired lease and are returned
+    await limiter.release_expired()
+    assert await _daily_used(redis, key_data) == 0
+
+
+@pytest.mark.asyncio
+async def test_gcra_cuts_off_bursts_over_the_minute_budget(redis):
+    key_data = _key_data(rpm=5)
+
+    for _ in range(5):
+        await enforce_rate_limits(key_data, key_data.tenant_id)
+
+    with pytest.raises(HTTPException) as exc:
+        await enforce_rate_limits(key_data, key_data.tenant_id)
+    assert exc.value.status_code == 429
+    # One request's worth (60s / 5) refills first
+    assert 1 <= int(exc.value.headers["Retry-After"]) <= 12
+
+
+@pytest.mark.asyncio
+async def test_gcra_daily_limit_is_checked_before_anything_is_consumed(redis, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_QUERIES_PER_DAY", 3)
+    key_data = _key_data(rpm=60)
+
+    for _ in range(2):
+        await enforce_rate_limits(key_data, key_data.tenant_id)
+    tat = await redis.get(_gcra_key(key_data))
+
+    # A cost-2 request over the daily quota consumes neither budget
+    with pytest.raises(HTTPException) as exc:
+        await enforce_rate_limits(key_data, key_data.tenant_id, cost=2)
+    assert exc.value.status_code == 429
+    assert exc.value.detail["error"] == "Daily query limit exceeded"
+    assert await _daily_used(redis, key_data) == 2
+    assert await redis.get(_gcra_key(key_data)) == tat
+
+    status = await enforce_rate_limits(key_data, key_data.tenant_id)
+    assert status.daily_usage["remaining"] == 0
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight, StreamFanout
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    results = await asyncio.gather(*(flights.do("key", work) for _ in range(10)))
+
+    assert calls == 1
+    assert [result for result, _ in results] == ["answer"] * 10
+    assert sum(1 for _, shared in results if not shared) == 1
+
+
+@pytest.mark.asyncio
+async def test_followers_see_leader_failure_and_key_is_released():
+    flights = SingleFlight("test")
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        flights.do("key", failing), flights.do("key", failing), return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def ok():
+        return 1
+
+    assert await flights.do("key", ok) == (1, False)
+
+
+@pytest.mark.asyncio
+async def test_stream_fanout_replays_to_late_subscribers():
+    fanout = StreamFanout("test")
+    produced = 0
+
+    async def source():
+        nonlocal produced
+        produced += 1
+        for token in ["a", "b", "c"]:
+            await asyncio.sleep(0.005)
+            yield token
+
+    async def read():
+        return [item async for item in fanout.subscribe("key", source)]
+
+    first = asyncio.create_task(read())
+    await asyncio.sleep(0.007)
+    second = asyncio.create_task(read())
+
+    assert await first == ["a", "b", "c"]
+    assert await second == ["a", "b", "c"]
+    assert produced == 1
+
+
+@pytest.mark.asyncio
+async def test_abandoned_work_is_cancelled_only_after_the_last_caller_leaves():
+    flight = SingleFlight("test-abandon")
+    release = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "done"
+
+    leader = asyncio.create_task(flight.do("k", work, cancel_when_abandoned=True))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+
+    follower.cancel()
+    await asyncio.sleep(0.01)
+    assert cancelled.is_set()
@@ -0,0 +1,56 @@
+import time
+import uuid
+
+import pytest
+from jose import jwt, JWTError
+
+from app.auth.supabase_jwt import SupabaseTokenVerifier, LocalVerificationUnavailable
+from app.config import settings
+
+SECRET = "test-jwt-secret"
+
+
+def make_token(secret=SECRET, **overrides):
+    verifier = SupabaseTokenVerifier()
+    claims = {
+        "sub": str(uuid.uuid4()),
+        "email": "owner@example.com",
+        "aud": "authenticated",
+        "iss": verifier.issuer,
+        "exp": int(time.time()) + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, secret, algorithm="HS256"), claims
+
+
+@pytest.mark.asyncio
+async def test_verify_hs256_token_locally(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    token, claims = make_token()
+    
+    user = await SupabaseTokenVerifier().verify(token)
+    
+    assert user == {"id": uuid.UUID(claims["sub"]), "email": "owner@example.com"}
+
+
+@pytest.mark.asyncio
+async def test_rejects_expired_and_foreign_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    verifier = SupabaseTokenVerifier()
+    
+    expired, _ = make_token(exp=int(time.time()) - 10)
+    wrong_audience, _ = make_token(aud="anon")
+    wrong_secret, _ = make_token(secret="someone-else")
+    
+    for token in (expired, wrong_audience, wrong_secret):
+        with pytest.raises(JWTError):
+            await verifier.verify(token)
+
+
+@pytest.mark.asyncio
+async def test_hs256_without_secret_is_not_verifiable_locally(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", None)
+    token, _ = make_token()
+    
+    with pytest.raises(LocalVerificationUnavailable):
+        await SupabaseTokenVerifier().verify(token)
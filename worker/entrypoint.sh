@@ -9,6 +9,12 @@ MAX_TASKS_PER_CHILD=${WORKER_MAX_TASKS_PER_CHILD:-10}
 SOFT_TIME_LIMIT=${WORKER_SOFT_TIME_LIMIT:-600}
 TIME_LIMIT=${WORKER_TIME_LIMIT:-720}
 WORKER_POOL=${WORKER_POOL:-prefork}
+# Embed Celery beat - enable on exactly one worker, or cache warming
+# (CACHE_WARM_ENABLED) never runs. Query logs don't depend on beat.
+BEAT_ARGS=""
+if [ "${WORKER_BEAT:-false}" = "true" ]; then
+    BEAT_ARGS="--beat --schedule=/tmp/celerybeat-schedule"
+fi
 
 # Avoid libpq/asyncpg probing ~/.postgresql client cert/key paths
 unset PGSSLKEY
@@ -23,8 +29,13 @@ echo "🏥 Starting health check server on port ${PORT:-8080}..."
 python3 /app/health_server.py &
 HEALTH_PID=$!
 
+# Writes the query log stream to bot_queries; runs on every worker
+echo "📝 Starting query log drain..."
+python3 -m app.workers.query_log_drain &
+DRAIN_PID=$!
+
 # Trap signals to ensure graceful shutdown
-trap "echo '🛑 Shutting down...'; kill $HEALTH_PID 2>/dev/null; exit 0" SIGTERM SIGINT
+trap "echo '🛑 Shutting down...'; kill $HEALTH_PID $DRAIN_PID 2>/dev/null; exit 0" SIGTERM SIGINT
 
 echo "🔨 Starting Celery worker..."
 if [ "$ENVIRONMENT" = "development" ]; then
@@ -38,7 +49,7 @@ if [ "$ENVIRONMENT" = "development" ]; then
       --soft-time-limit="${SOFT_TIME_LIMIT}" \
       --time-limit="${TIME_LIMIT}" \
       --without-gossip --without-mingle --without-heartbeat \
-      --autoreload
+      --autoreload ${BEAT_ARGS}
 else
     exec celery -A app.workers.tasks worker \
       --loglevel=info \
@@ -48,7 +59,7 @@ else
       --max-tasks-per-child="${MAX_TASKS_PER_CHILD}" \
       --soft-time-limit="${SOFT_TIME_LIMIT}" \
       --time-limit="${TIME_LIMIT}" \
-      --without-gossip --without-mingle --without-heartbeat
+      --without-gossip --without-mingle --without-heartbeat ${BEAT_ARGS}
 fi
 
 